@@ -1,13 +1,50 @@
-from trie import NodeTrie
+from trie import LETTER_BITS, NodeTrie
+from bytes_mode import as_byte_view
+from case_fold import fold_letters, fold_word, folded_classes
+from match_semantics import check_match_kind, ends_word, match_ranks, starts_word
+from match_sinks import StopSearch
+from stream import CHUNK_SIZE, iter_chunks
+from array import array
 from collections import deque
 import time
 
+# fraction of the patterns that can be removed from a live automaton before its trie is rebuilt
+CHURN_THRESHOLD = 0.25
+
 
 class AhoCorasick(NodeTrie):
     """
     Aho Corasick implementation that uses NodeTrie as its base class
     """
 
+    def __init__(self, letter=None, parent=None, depth=0):
+        """Constructor for an aho corasick root node"""
+        super().__init__(letter, parent, depth)
+        # dense tables produced by compile(), None until the automaton is compiled
+        self.letter_classes = None
+        self.transitions = None
+        self.output_starts = None
+        self.output_ids = None
+        self.words = None
+        self.depths = None
+        # order the words were added in, decides between matches of leftmost-first searches
+        self.priorities = {}
+        # state needed for incremental updates after create_failure_links
+        self.links_created = False
+        self.failure_children = None
+        self.removed_since_rebuild = 0
+        self.pending_rebuild = False
+        self.pending_compile = False
+
+    def add(self, word):
+        """
+        Add the lower case form of a word to the trie, dropping compiled tables as they no longer describe the trie
+        """
+        word = fold_word(word)
+        super().add(word)
+        self.priorities.setdefault(word, len(self.priorities))
+        self.transitions = None
+
     def create_failure_links(self):
         """
         construct a finite state machine by creating
@@ -39,60 +76,586 @@ class AhoCorasick(NodeTrie):
             failure_link_is_word = corasick_node.failure_link.word is not None
             corasick_node.dictionary_link = corasick_node.failure_link if failure_link_is_word else corasick_node.failure_link.dictionary_link
 
-    def find_all_matches(self, text):
+        self.links_created = True
+        self.failure_children = None
+
+    def index_failure_children(self):
         """
-        Traverse through the finite state machine following failure links and trie nodes to find substring_matches if any exist
+        build the reverse failure links (node -> nodes failing to it) used to repair links incrementally
+        """
+        self.failure_children = {}
+        nodes = list(self.children.values())
+        for corasick_node in nodes:
+            self.failure_children.setdefault(corasick_node.failure_link, set()).add(corasick_node)
+            nodes.extend(corasick_node.children.values())
+
+    def failure_descendants(self, corasick_node):
+        """
+        return the nodes whose failure link chain passes through corasick_node, parents before children
+        """
+        descendants = list(self.failure_children.get(corasick_node, ()))
+        for descendant in descendants:
+            descendants.extend(self.failure_children.get(descendant, ()))
+        return descendants
+
+    def refresh_dictionary_links(self, corasick_node):
+        """
+        recompute the dictionary links of the nodes failing through corasick_node after its word changed
+        """
+        for descendant in self.failure_descendants(corasick_node):
+            failure_link_is_word = descendant.failure_link.word is not None
+            descendant.dictionary_link = descendant.failure_link if failure_link_is_word else descendant.failure_link.dictionary_link
+
+    def set_failure_link(self, corasick_node, failure_link):
+        """
+        point a node to a new failure link and recompute the dictionary links that depend on it
+        """
+        if corasick_node.failure_link is not None:
+            self.failure_children[corasick_node.failure_link].discard(corasick_node)
+        corasick_node.failure_link = failure_link
+        self.failure_children.setdefault(failure_link, set()).add(corasick_node)
+        failure_link_is_word = failure_link.word is not None
+        corasick_node.dictionary_link = failure_link if failure_link_is_word else failure_link.dictionary_link
+        self.refresh_dictionary_links(corasick_node)
+
+    def link_new_node(self, new_node):
+        """
+        set the failure link of a node inserted into a live automaton and redirect the existing nodes
+        that now have the new node as their longest suffix
+        """
+        parent = new_node.parent
+        self.set_failure_link(new_node, self if parent.is_root() else new_node.get_failure_link())
+
+        # a node ending with the new node's string is the child by the same letter of a node ending with its parent's string
+        for suffix_node in self.failure_descendants(parent):
+            child = suffix_node.children.get(new_node.letter)
+            if child is None or child is new_node or child.failure_link is None:
+                continue
+            if child.failure_link.depth < new_node.depth:
+                self.set_failure_link(child, new_node)
+
+    def restore_trie(self):
+        """
+        rebuild the trie of an automaton loaded by automaton_store.load_automaton, which only has compiled tables,
+        so it can be updated like the automaton it was saved from, the tables are compiled again before the next search
+        """
+        if self.links_created or self.transitions is None:
+            return
+        self.size = 0
+        for word in sorted(self.words, key=lambda word: self.priorities.get(word, len(self.priorities))):
+            self.add(word)
+        self.create_failure_links()
+        self.pending_compile = True
+
+    def add_pattern(self, word):
+        """
+        Add a word to a live automaton, repairing only the failure and dictionary links it affects
+        """
+        word = fold_word(word)
+        self.restore_trie()
+        if not self.links_created:
+            self.add(word)
+            return
+        if self.failure_children is None:
+            self.index_failure_children()
+
+        corasick_node = self
+        new_nodes = []
+        for letter in word:
+            if letter not in corasick_node:
+                corasick_node.children[letter] = NodeTrie(letter, corasick_node, corasick_node.depth + 1)
+                new_nodes.append(corasick_node.children[letter])
+            corasick_node = corasick_node.children[letter]
+
+        # new nodes are linked from the shallowest, so their failure links are already in place when needed
+        for new_node in new_nodes:
+            self.link_new_node(new_node)
+
+        if corasick_node.word is None:
+            corasick_node.word = word
+            self.size += 1
+            self.refresh_dictionary_links(corasick_node)
+        self.drop_compiled_tables()
+
+    def remove_pattern(self, word):
+        """
+        Remove a word from a live automaton, its nodes stay as plain states until the churn threshold
+        schedules a rebuild, returns False if the word is not in the automaton
+        """
+        word = fold_word(word)
+        self.restore_trie()
+        corasick_node = self
+        for letter in word:
+            if letter not in corasick_node:
+                return False
+            corasick_node = corasick_node.children[letter]
+        if corasick_node.word is None:
+            return False
+
+        corasick_node.word = None
+        self.size -= 1
+        if self.links_created:
+            if self.failure_children is None:
+                self.index_failure_children()
+            self.refresh_dictionary_links(corasick_node)
+            self.removed_since_rebuild += 1
+            if self.removed_since_rebuild > CHURN_THRESHOLD * max(self.size, 1):
+                self.pending_rebuild = True
+        self.drop_compiled_tables()
+        return True
+
+    def drop_compiled_tables(self):
+        """
+        drop compiled tables after an update, they are compiled again before the next search
+        """
+        if self.transitions is not None:
+            self.transitions = None
+            self.pending_compile = True
+
+    def trie_words(self):
+        """
+        return the words of the trie nodes in bfs order, the order compile numbers them in
+        """
+        words = []
+        nodes = [self]
+        for corasick_node in nodes:
+            if corasick_node.word is not None:
+                words.append(corasick_node.word)
+            nodes.extend(corasick_node.children.values())
+        return words
+
+    def rebuild(self):
+        """
+        build the trie again from its words, dropping the states left behind by removed words
+        """
+        words = self.trie_words()
+        self.children = {}
+        self.size = 0
+        for word in words:
+            self.add(word)
+        self.create_failure_links()
+        self.removed_since_rebuild = 0
+        self.pending_rebuild = False
+
+    def refresh(self):
+        """
+        run the rebuild and compilation scheduled by incremental updates
+        """
+        if self.pending_rebuild:
+            self.rebuild()
+        if self.pending_compile:
+            self.compile()
+            self.pending_compile = False
+
+    def compile(self):
+        """
+        flatten the trie into a dense transition table with failure transitions already resolved,
+        the outputs of state s are words[output_ids[i]] for output_starts[s] <= i < output_starts[s + 1],
+        must be called after create_failure_links
+        """
+        # number the states in bfs order, so a node's failure link is always numbered before it
+        nodes = [self]
+        for corasick_node in nodes:
+            nodes.extend(corasick_node.children.values())
+        state_ids = {id(corasick_node): state for state, corasick_node in enumerate(nodes)}
+
+        # class 0 is reserved for letters that do not occur in any pattern
+        letter_classes = {}
+        for corasick_node in nodes:
+            if corasick_node.letter is not None and corasick_node.letter not in letter_classes:
+                letter_classes[corasick_node.letter] = len(letter_classes) + 1
+        width = len(letter_classes) + 1
+
+        transitions = array('l', [0]) * (len(nodes) * width)
+        output_starts = array('l', [0])
+        output_ids = array('l')
+        depths = array('l', [corasick_node.depth for corasick_node in nodes])
+        words = []
+        word_ids = {}
+        for state, corasick_node in enumerate(nodes):
+            row = state * width
+            for letter, letter_class in letter_classes.items():
+                if letter in corasick_node:
+                    transitions[row + letter_class] = state_ids[id(corasick_node.children[letter])]
+                elif not corasick_node.is_root():
+                    failure_row = state_ids[id(corasick_node.failure_link)] * width
+                    transitions[row + letter_class] = transitions[failure_row + letter_class]
+
+            # flatten the word of the node and its dictionary link chain into one run of output ids
+            if corasick_node.word is not None:
+                word_ids[id(corasick_node)] = len(words)
+                words.append(corasick_node.word)
+                output_ids.append(word_ids[id(corasick_node)])
+            output_searcher = corasick_node.dictionary_link
+            while output_searcher is not None:
+                output_ids.append(word_ids[id(output_searcher)])
+                output_searcher = output_searcher.dictionary_link
+            output_starts.append(len(output_ids))
+
+        self.letter_classes = letter_classes
+        self.transitions = transitions
+        self.output_starts = output_starts
+        self.output_ids = output_ids
+        self.words = words
+        self.depths = depths
+
+    def state_depths(self):
+        """
+        return the trie depth of every compiled state, the length of the longest suffix of the text read so far
+        that can still grow into a match, recovered by a bfs over the transitions of a loaded automaton
+        """
+        if self.depths is None:
+            width = len(self.letter_classes) + 1
+            depths = array('l', [-1]) * (len(self.transitions) // width)
+            depths[0] = 0
+            states = [0]
+            for state in states:
+                for next_state in self.transitions[state * width: (state + 1) * width]:
+                    if depths[next_state] == -1:
+                        depths[next_state] = depths[state] + 1
+                        states.append(next_state)
+            self.depths = depths
+        return self.depths
+
+    def compile_array_trie(self, array_trie):
+        """
+        build the tables of compile from a trie.ArrayTrie of lower case words instead of trie nodes, which are never
+        created, so a large pattern set is compiled in a fraction of the memory, the automaton has no trie nodes
+        like a loaded one, the words keep the order they were added to the ArrayTrie in
+        """
+        parents = array_trie.parents
+        letters = array_trie.letters
+        word_ids = array_trie.word_ids
+        edges = array_trie.edges
+        is_bytes = bool(array_trie.words) and isinstance(array_trie.words[0], bytes)
+        # number the states by depth, so a state's failure link is always numbered before it
+        nodes = array_trie.depth_order()
+        state_ids = array('l', [0]) * len(nodes)
+        for state, node in enumerate(nodes):
+            state_ids[node] = state
+
+        # class 0 is reserved for letters that do not occur in any pattern
+        letter_classes = {}
+        for code in letters[1:]:
+            if code not in letter_classes:
+                letter_classes[code] = len(letter_classes) + 1
+        width = len(letter_classes) + 1
+
+        transitions = array('l', [0]) * (len(nodes) * width)
+        failure_links = array('l', [0]) * len(nodes)
+        output_starts = array('l', [0])
+        output_ids = array('l')
+        words = []
+        for state, node in enumerate(nodes):
+            row = state * width
+            parent_state = state_ids[parents[node]] if state else 0
+            # the failure link of a state is where the failure link of its parent goes on the state's letter
+            if parent_state:
+                failure_links[state] = transitions[failure_links[parent_state] * width + letter_classes[letters[node]]]
+            failure_state = failure_links[state]
+            failure_row = failure_state * width
+            key = node << LETTER_BITS
+            for code, letter_class in letter_classes.items():
+                child = edges.get(key | code)
+                if child is not None:
+                    transitions[row + letter_class] = state_ids[child]
+                elif state:
+                    transitions[row + letter_class] = transitions[failure_row + letter_class]
+
+            # the outputs of a state are its own word followed by the outputs of its failure link
+            if word_ids[node] != -1:
+                output_ids.append(len(words))
+                words.append(array_trie.words[word_ids[node]])
+            if state:
+                output_ids.extend(output_ids[output_starts[failure_state]: output_starts[failure_state + 1]])
+            output_starts.append(len(output_ids))
+
+        self.letter_classes = {code if is_bytes else chr(code): letter_class
+                               for code, letter_class in letter_classes.items()}
+        self.transitions = transitions
+        self.output_starts = output_starts
+        self.output_ids = output_ids
+        self.words = words
+        self.depths = array('l', map(array_trie.depths.__getitem__, nodes))
+        self.priorities = {word: priority for priority, word in enumerate(array_trie.words)}
+        self.size = len(words)
+
+    def find_all_matches(self, text, stats=None):
+        """
+        Traverse through the finite state machine following failure links and trie nodes to find substring_matches if any exist,
+        operations are counted into stats when a search_stats.SearchStats is given
+        """
+        # forcing trie to be case insensitive, letters are folded as they are read
+        return self.scan(text, False, stats)
+
+    def find_all_matches_bytes(self, buffer, stats=None):
+        """
+        Search a bytes-like buffer such as an mmap without decoding it, reporting byte offsets,
+        the trie must be built from patterns encoded with bytes_mode.encode_patterns
+        """
+        # only ascii letters are folded, bytes of multi-byte characters are matched as they are
+        return self.scan(as_byte_view(buffer), True, stats)
+
+    def scan(self, letters, is_bytes=False, stats=None):
+        """
+        Run the automaton over a str, or over the bytes of a buffer when is_bytes is set,
+        folding the case of each letter as it is read, the trie nodes are walked instead of the compiled table
+        when operations are counted so the failure links followed can be counted
+        """
+        self.refresh()
+        if self.transitions is not None and (stats is None or not self.children):
+            # a loaded automaton has no nodes, its table already resolved every failure link
+            substring_matches = self.scan_compiled(letters, folded_classes(self.letter_classes, is_bytes))
+            if stats is not None:
+                stats.add('ac', letters=len(letters), outputs=len(substring_matches))
+            return substring_matches
+        if stats is not None:
+            return self.scan_with_stats(letters, is_bytes, stats)
+        return deque(self.walk([letters], is_bytes))
+
+    def walk(self, chunks, is_bytes=False):
+        """
+        Lazily yield the (word, offset) matches of chunks of letters by following the trie nodes and failure links,
+        carrying the node across chunk boundaries
         """
-        substring_matches = deque()
-        # forcing trie to be case insensitive
-        text = text.lower()
         position = 0
         corasick_node = self
-        for letter in text:
-            # traverse the trie if letter exists as a child
+        for chunk in chunks:
+            for letter in fold_letters(chunk, is_bytes):
+                # traverse the trie if letter exists as a child
+                if letter in corasick_node:
+                    corasick_node = corasick_node.children[letter]
+                else:
+                    # traverse the failure link of the trie
+                    while not corasick_node.is_root():
+                        corasick_node = corasick_node.failure_link
+                        if letter in corasick_node:
+                            corasick_node = corasick_node.children[letter]
+                            break
+
+                # if corasick_node is a word node add it as a match
+                if corasick_node.word is not None:
+                    yield corasick_node.word, position - len(corasick_node.word) + 1
+
+                output_searcher = corasick_node.dictionary_link
+                # if there is a substring that substring_matches
+                while output_searcher is not None:
+                    yield output_searcher.word, position - len(output_searcher.word) + 1
+                    output_searcher = output_searcher.dictionary_link
+                position += 1
+
+    def scan_with_stats(self, letters, is_bytes, stats):
+        """
+        Same as walk over one sequence of letters while counting the letters read, the failure links followed and
+        the matches reported by a node itself (outputs) or through its dictionary links (dictionary_outputs)
+        """
+        substring_matches = deque()
+        failure_hops = 0
+        dictionary_outputs = 0
+        corasick_node = self
+        for position, letter in enumerate(fold_letters(letters, is_bytes)):
             if letter in corasick_node:
                 corasick_node = corasick_node.children[letter]
             else:
-                # traverse the failure link of the trie
                 while not corasick_node.is_root():
                     corasick_node = corasick_node.failure_link
+                    failure_hops += 1
                     if letter in corasick_node:
                         corasick_node = corasick_node.children[letter]
                         break
 
-            # if corasick_node is a word node add it as a match
             if corasick_node.word is not None:
                 substring_matches.append((corasick_node.word, position - len(corasick_node.word) + 1))
 
             output_searcher = corasick_node.dictionary_link
-            # if there is a substring that substring_matches
             while output_searcher is not None:
+                dictionary_outputs += 1
                 substring_matches.append((output_searcher.word, position - len(output_searcher.word) + 1))
                 output_searcher = output_searcher.dictionary_link
-            position += 1
+
+        stats.add('ac', letters=len(letters), failure_hops=failure_hops,
+                  outputs=len(substring_matches) - dictionary_outputs, dictionary_outputs=dictionary_outputs)
         return substring_matches
 
+    def iter_compiled(self, chunks, letter_classes):
+        """
+        Lazily yield the (pattern id, offset) matches of chunks of letters taking exactly one table lookup per letter,
+        carrying the state across chunk boundaries, letter_classes maps a letter to the class of its lower case form,
+        every search of a compiled automaton runs this loop
+        """
+        transitions = self.transitions
+        output_starts = self.output_starts
+        output_ids = self.output_ids
+        # offset of a match = position of its last letter - (length of the word - 1)
+        last_letters = [len(word) - 1 for word in self.words]
+        width = len(self.letter_classes) + 1
+        state = 0
+        offset = 0
+        for chunk in chunks:
+            for position, letter in enumerate(chunk, offset):
+                state = transitions[state * width + letter_classes[letter]]
+                output = output_starts[state]
+                while output < output_starts[state + 1]:
+                    pattern_id = output_ids[output]
+                    yield pattern_id, position - last_letters[pattern_id]
+                    output += 1
+            offset += len(chunk)
 
-def test_aho_corasick(search_str, patterns, test_trie=False):
+    def find_all_matches_compiled(self, text):
+        """
+        Run the compiled automaton over the text, taking exactly one table lookup per letter
+        """
+        self.refresh()
+        return self.scan_compiled(text, folded_classes(self.letter_classes))
+
+    def scan_compiled(self, letters, letter_classes):
+        """
+        Run the compiled automaton over an indexable sequence of letters,
+        letter_classes maps a letter to the class of its lower case form
+        """
+        words = self.words
+        return deque((words[pattern_id], position)
+                     for pattern_id, position in self.iter_compiled([letters], letter_classes))
+
+    def search(self, text, sink):
+        """
+        Hand every (pattern id, offset) match of the text to a match_sinks sink and return its result,
+        pattern ids index self.words, the trie is compiled first when it is not
+        """
+        return self.search_letters(text, False, sink)
+
+    def search_bytes(self, buffer, sink):
+        """
+        Same as search over a bytes-like buffer, reporting byte offsets
+        """
+        return self.search_letters(as_byte_view(buffer), True, sink)
+
+    def search_letters(self, letters, is_bytes, sink):
+        """
+        Run the compiled automaton over a str or the bytes of a buffer without building a tuple per match
+        """
+        self.refresh()
+        if self.transitions is None:
+            self.compile()
+        add = sink.add
+        try:
+            for pattern_id, position in self.iter_compiled([letters], folded_classes(self.letter_classes, is_bytes)):
+                add(pattern_id, position)
+        except StopSearch:
+            pass
+        return sink.result()
+
+    def find_matches(self, text, match_kind='overlapping', whole_words=False):
+        """
+        Run the compiled automaton reporting (word, offset) matches of a match_semantics match kind,
+        only matches bounded by non word letters on both sides are considered when whole_words is set
+        """
+        check_match_kind(match_kind)
+        self.refresh()
+        if self.transitions is None:
+            self.compile()
+        letter_classes = folded_classes(self.letter_classes)
+        transitions = self.transitions
+        output_starts = self.output_starts
+        output_ids = self.output_ids
+        words = self.words
+        lengths = [len(word) for word in words]
+        width = len(self.letter_classes) + 1
+        size = len(text)
+        substring_matches = deque()
+
+        if match_kind == 'overlapping':
+            state = 0
+            for position, letter in enumerate(text):
+                state = transitions[state * width + letter_classes[letter]]
+                output = output_starts[state]
+                # outputs of a state are only walked when a word can end at this position
+                if output < output_starts[state + 1] and (not whole_words or ends_word(text, position + 1)):
+                    while output < output_starts[state + 1]:
+                        pattern_id = output_ids[output]
+                        start = position - lengths[pattern_id] + 1
+                        if not whole_words or starts_word(text, start):
+                            substring_matches.append((words[pattern_id], start))
+                        output += 1
+            return substring_matches
+
+        depths = self.state_depths()
+        ranks = match_ranks(words, match_kind, self.priorities)
+        # best (start, pattern id) match found so far, it is final once no partial match starts at or before it
+        best_start = -1
+        best_id = -1
+        state = 0
+        position = 0
+        while True:
+            if position < size:
+                state = transitions[state * width + letter_classes[text[position]]]
+                output = output_starts[state]
+                if output < output_starts[state + 1] and (not whole_words or ends_word(text, position + 1)):
+                    while output < output_starts[state + 1]:
+                        pattern_id = output_ids[output]
+                        start = position - lengths[pattern_id] + 1
+                        if (not whole_words or starts_word(text, start)) and (
+                                best_id == -1 or start < best_start or
+                                (start == best_start and ranks[pattern_id] > ranks[best_id])):
+                            best_start = start
+                            best_id = pattern_id
+                        output += 1
+                if best_id == -1 or best_start >= position - depths[state] + 1:
+                    position += 1
+                    continue
+            elif best_id == -1:
+                break
+
+            substring_matches.append((words[best_id], best_start))
+            # restart from the root right after the match so the next match cannot overlap it
+            position = best_start + lengths[best_id]
+            state = 0
+            best_id = -1
+        return substring_matches
+
+    def find_iter(self, source, chunk_size=CHUNK_SIZE):
+        """
+        Lazily yield (pattern, offset) matches from a str, a file object or an iterable of str chunks,
+        carrying the automaton state across chunk boundaries so only one chunk is held in memory
+        """
+        self.refresh()
+        chunks = iter_chunks(source, chunk_size)
+        if self.transitions is None:
+            yield from self.walk(chunks)
+            return
+        words = self.words
+        for pattern_id, position in self.iter_compiled(chunks, folded_classes(self.letter_classes)):
+            yield words[pattern_id], position
+
+
+def test_aho_corasick(search_str, patterns, test_trie=False, compiled=False, cache=None):
     """
-    Builds a trie with patterns and runs aho corasick algorithm on the search string
+    Builds a trie with patterns and runs aho corasick algorithm on the search string,
+    using the flat transition table when compiled is set, or a compiled automaton from cache when it is given
     """
-    aho_corasick = AhoCorasick()
-    for pattern in patterns:
-        aho_corasick.add(pattern)
-
-    print("\nTrie: Created")
-    print(aho_corasick)
-
-    if test_trie:
-        test_patterns = ["Hi", "Hit", "No", "North", "Yes"]
-        print(f"\nTrie: Testing Patterns")
-        for test_pattern in test_patterns:
-            print((test_pattern, aho_corasick.has_word(test_pattern)))
-
-    print("\nCreating failure links")
-    start_time = time.perf_counter()
-    aho_corasick.create_failure_links()
+    if cache is not None:
+        print("\nTrie: Fetching from cache")
+        start_time = time.perf_counter()
+        aho_corasick = cache.get('ac', patterns)
+    else:
+        aho_corasick = AhoCorasick()
+        for pattern in patterns:
+            aho_corasick.add(pattern)
+
+        print("\nTrie: Created")
+        print(aho_corasick)
+
+        if test_trie:
+            test_patterns = ["Hi", "Hit", "No", "North", "Yes"]
+            print(f"\nTrie: Testing Patterns")
+            for test_pattern in test_patterns:
+                print((test_pattern, aho_corasick.has_word(test_pattern)))
+
+        print("\nCreating failure links")
+        start_time = time.perf_counter()
+        aho_corasick.create_failure_links()
+        if compiled:
+            aho_corasick.compile()
     matches = aho_corasick.find_all_matches(search_str)
     end_time = time.perf_counter()
     print(f'\nSearch for multi-patterns in a string of length {len(search_str)}')
@@ -0,0 +1,216 @@
+import copy
+import hashlib
+import os
+import sys
+from collections import OrderedDict
+
+from aho_corasick import AhoCorasick
+from automaton_store import load_automaton, save_automaton
+from case_fold import fold_word
+from commentz_walter import CommentzWalter
+from match_semantics import pattern_priorities
+from rabin_karp import RabinKarp
+from trie import ArrayTrie
+from wu_manber import WuManber
+
+# default in-memory budget of a cache
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# pattern sets at least this large are compiled from an ArrayTrie, as their trie nodes would take several times
+# the memory of the compiled tables, the automaton then has no trie nodes like a loaded one
+ARRAY_TRIE_PATTERNS = 100000
+
+# tables an automaton may hold besides its trie nodes
+TABLE_ATTRIBUTES = ('transitions', 'output_starts', 'output_ids', 'shift1', 'shift2', 'bad_character', 'depths')
+
+
+def build_automaton(engine, patterns):
+    """
+    build a ready to search automaton of an engine (ac|cw|rk|rk-numpy|wm|auto) for the patterns
+    """
+    if engine in ('ac', 'cw') and len(patterns) >= ARRAY_TRIE_PATTERNS:
+        return build_from_array_trie(engine, patterns)
+    if engine == 'ac':
+        aho_corasick = AhoCorasick()
+        for pattern in patterns:
+            aho_corasick.add(pattern)
+        aho_corasick.create_failure_links()
+        aho_corasick.compile()
+        return aho_corasick
+    if engine == 'cw':
+        commentz_walter = CommentzWalter()
+        for pattern in patterns:
+            commentz_walter.add_word(pattern)
+        commentz_walter.create_failure_links()
+        return commentz_walter
+    if engine == 'rk':
+        rabin_karp = RabinKarp()
+        for pattern in patterns:
+            rabin_karp.add(pattern)
+        rabin_karp.create_index()
+        return rabin_karp
+    if engine == 'wm':
+        wu_manber = WuManber()
+        for pattern in patterns:
+            wu_manber.add(pattern)
+        wu_manber.create_index()
+        return wu_manber
+    if engine == 'rk-numpy':
+        # numpy is optional, only this engine needs it
+        from rabin_karp_numpy import NumpyRabinKarp
+        rabin_karp = NumpyRabinKarp()
+        for pattern in patterns:
+            rabin_karp.add(pattern)
+        rabin_karp.create_index()
+        return rabin_karp
+    if engine == 'auto':
+        # engine_selection builds its automata with this function
+        from engine_selection import AutoEngine
+        return AutoEngine(patterns)
+    raise ValueError(f"unknown engine {engine}, expected one of ac|cw|rk|rk-numpy|wm|auto")
+
+
+def build_from_array_trie(engine, patterns):
+    """
+    build an ac|cw automaton whose tables are compiled from an ArrayTrie of the patterns instead of trie nodes
+    """
+    array_trie = ArrayTrie()
+    automaton = AhoCorasick() if engine == 'ac' else CommentzWalter()
+    for pattern in patterns:
+        # commentz walter compares windows right to left, its trie holds the reversed patterns
+        array_trie.add(fold_word(pattern) if engine == 'ac' else fold_word(pattern)[::-1])
+    automaton.compile_array_trie(array_trie)
+    return automaton
+
+
+def fingerprint(engine, patterns):
+    """
+    stable hash of an engine and its set of lower case patterns, the same in every process whatever the order
+    and case of the patterns, the order deciding leftmost-first matches is kept by the automaton instead
+    """
+    digest = hashlib.sha256(engine.encode())
+    for pattern in sorted(set(map(fold_word, patterns))):
+        encoded = pattern if isinstance(pattern, bytes) else pattern.encode('utf-8')
+        # length prefix keeps the boundaries between patterns unambiguous
+        digest.update(len(encoded).to_bytes(8, 'little'))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+def with_priorities(automaton, patterns, priorities):
+    """
+    return the automaton when its patterns were added in the order of priorities, otherwise a shallow copy
+    sharing its tables whose leftmost-first matches follow priorities, a copy of an auto engine builds its
+    automata again from the patterns in their new order
+    """
+    if automaton.priorities == priorities:
+        return automaton
+    reordered = copy.copy(automaton)
+    reordered.priorities = priorities
+    if hasattr(automaton, 'automata'):
+        reordered.patterns = list(patterns)
+        reordered.automata = {}
+        reordered.chosen = None
+    return reordered
+
+
+def automaton_size(automaton):
+    """
+    estimate the no of bytes held by an automaton's tables, trie nodes and patterns
+    """
+    total_bytes = sys.getsizeof(automaton)
+    for attribute in TABLE_ATTRIBUTES:
+        table = getattr(automaton, attribute, None)
+        if table is not None:
+            total_bytes += memoryview(table).nbytes
+    if hasattr(automaton, 'automata'):
+        # an auto engine holds the automata it has built so far
+        total_bytes += sum(automaton_size(built) for built in automaton.automata.values())
+    elif isinstance(automaton, (RabinKarp, WuManber)):
+        total_bytes += sum(sys.getsizeof(pattern) for pattern in automaton.patterns)
+    elif automaton.children:
+        total_bytes += automaton.memory_usage()[1]
+    # a minimized commentz walter tells its words apart by their letter class paths
+    if getattr(automaton, 'path_ids', None) is not None:
+        total_bytes += sys.getsizeof(automaton.path_ids) + sum(map(sys.getsizeof, automaton.path_ids))
+    return total_bytes
+
+
+class AutomatonCache:
+    """
+    LRU cache of built automata keyed by the fingerprint of their pattern set,
+    bounded by a byte budget and optionally backed by a directory of saved automata,
+    patterns added in another order than the cached automaton's share its tables through with_priorities
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        # fingerprint -> (automaton, size), least recently used first
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def disk_path(self, key):
+        """
+        path of the saved automaton of a fingerprint in the on-disk tier
+        """
+        return os.path.join(self.directory, f"{key}.mpsa")
+
+    def get(self, engine, patterns):
+        """
+        return the cached automaton for the patterns, loading it from disk or building it on a miss
+        """
+        key = fingerprint(engine, patterns)
+        priorities = pattern_priorities(patterns)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return with_priorities(entry[0], patterns, priorities)
+
+        self.misses += 1
+        # rabin karp and wu manber have no compiled tables to save and auto engines build theirs lazily,
+        # they are only cached in memory
+        on_disk = self.directory is not None and engine in ('ac', 'cw')
+        if on_disk and os.path.exists(self.disk_path(key)):
+            automaton = load_automaton(self.disk_path(key))
+        else:
+            automaton = build_automaton(engine, patterns)
+            if on_disk:
+                os.makedirs(self.directory, exist_ok=True)
+                save_automaton(automaton, self.disk_path(key))
+        self.put(key, automaton)
+        return with_priorities(automaton, patterns, priorities)
+
+    def put(self, key, automaton):
+        """
+        add an automaton and evict the least recently used ones until the cache fits its budget
+        """
+        size = automaton_size(automaton)
+        # an automaton put again under its key replaces the one it was cached with
+        replaced = self.entries.pop(key, None)
+        if replaced is not None:
+            self.total_bytes -= replaced[1]
+        # an automaton larger than the whole budget is not kept
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (automaton, size)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+
+    def clear(self):
+        """
+        drop every automaton held in memory, saved automata stay on disk
+        """
+        self.entries.clear()
+        self.total_bytes = 0
+
+    def __len__(self):
+        """
+        return no of automata held in memory
+        """
+        return len(self.entries)
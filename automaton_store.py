@@ -0,0 +1,174 @@
+import struct
+import sys
+from array import array
+
+from aho_corasick import AhoCorasick
+from bytes_mode import as_byte_view, map_file
+from commentz_walter import CommentzWalter
+
+# file layout: header, one uint64 byte length per section, then the sections each padded to 8 bytes,
+# every section is an int64 array in native byte order except the last one which holds the encoded words
+MAGIC = b'MPSA'
+VERSION = 1
+HEADER = struct.Struct('<4sIIIQ')
+SECTION_LENGTH = struct.Struct('<Q')
+
+KIND_AHO_CORASICK = 1
+KIND_COMMENTZ_WALTER = 2
+KIND_SYNONYM_TABLE = 3
+
+# flags of the header
+FLAG_BYTES = 1
+FLAG_BIG_ENDIAN = 2
+# a minimized CommentzWalter, whose word ids are found from the letters of a match
+FLAG_MINIMIZED = 4
+# a last int section holds the order each word was added in, which decides leftmost-first matches
+FLAG_PRIORITIES = 8
+
+
+def padding(length):
+    """
+    no of bytes needed to align a section of length bytes to 8 bytes
+    """
+    return -length % 8
+
+
+def encode_words(words, is_bytes):
+    """
+    return (offsets of each word in the blob, blob of all the words encoded one after another)
+    """
+    encoded = [word if is_bytes else word.encode('utf-8') for word in words]
+    word_offsets = array('q', [0])
+    for word in encoded:
+        word_offsets.append(word_offsets[-1] + len(word))
+    return word_offsets, b''.join(encoded)
+
+
+def letter_codes(letter_classes, is_bytes):
+    """
+    return the code of each letter ordered by letter class
+    """
+    letters = sorted(letter_classes, key=letter_classes.get)
+    return array('q', letters if is_bytes else [ord(letter) for letter in letters])
+
+
+def save_automaton(automaton, path):
+    """
+    write the compiled tables of an AhoCorasick (after compile) or
+    a CommentzWalter (after create_failure_links) to a versioned binary file
+    """
+    if getattr(automaton, 'transitions', None) is None:
+        raise ValueError("the automaton must be compiled before it can be saved")
+
+    is_bytes = bool(automaton.words) and isinstance(automaton.words[0], bytes)
+    word_offsets, blob = encode_words(automaton.words, is_bytes)
+    letters = letter_codes(automaton.letter_classes, is_bytes)
+    if isinstance(automaton, CommentzWalter):
+        kind = KIND_COMMENTZ_WALTER
+        tables = [array('q', [automaton.min_depth, automaton.max_depth]), letters, automaton.transitions,
+                  automaton.shift1, automaton.shift2, automaton.output_ids, automaton.bad_character, word_offsets]
+    elif isinstance(automaton, AhoCorasick):
+        kind = KIND_AHO_CORASICK
+        tables = [letters, automaton.transitions, automaton.output_starts, automaton.output_ids, word_offsets]
+    else:
+        raise ValueError(f"cannot save an automaton of type {type(automaton).__name__}")
+    # words missing from the priorities rank after the others, as in match_semantics.match_ranks
+    priorities = automaton.priorities
+    tables.append(array('q', [priorities.get(word, len(priorities) + word_id)
+                              for word_id, word in enumerate(automaton.words)]))
+
+    flags = FLAG_PRIORITIES | (FLAG_BYTES if is_bytes else 0)
+    if getattr(automaton, 'path_ids', None) is not None:
+        flags |= FLAG_MINIMIZED
+    write_sections(path, kind, flags, tables, blob)
+
+
+def write_sections(path, kind, flags, tables, blob):
+    """
+    write int tables followed by a blob of encoded words to a file in the layout read by read_sections
+    """
+    sections = [array('q', table).tobytes() for table in tables] + [blob]
+    flags |= FLAG_BIG_ENDIAN if sys.byteorder == 'big' else 0
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, kind, flags, len(sections)))
+        for section in sections:
+            f.write(SECTION_LENGTH.pack(len(section)))
+        for section in sections:
+            f.write(section)
+            f.write(b'\0' * padding(len(section)))
+
+
+def read_sections(buffer):
+    """
+    parse the header of a saved automaton and return (kind, flags, int64 views of the tables, words blob)
+    """
+    byte_view = as_byte_view(buffer)
+    if len(byte_view) < HEADER.size:
+        raise ValueError("not a saved automaton, the file is too short")
+    magic, version, kind, flags, section_count = HEADER.unpack_from(byte_view)
+    if magic != MAGIC:
+        raise ValueError("not a saved automaton, the magic number does not match")
+    if version != VERSION:
+        raise ValueError(f"unsupported automaton version {version}, expected {VERSION}")
+    if bool(flags & FLAG_BIG_ENDIAN) != (sys.byteorder == 'big'):
+        raise ValueError("the automaton was saved on a machine with a different byte order")
+
+    offset = HEADER.size + section_count * SECTION_LENGTH.size
+    sections = []
+    for index in range(section_count):
+        length = SECTION_LENGTH.unpack_from(byte_view, HEADER.size + index * SECTION_LENGTH.size)[0]
+        sections.append(byte_view[offset: offset + length])
+        offset += length + padding(length)
+    # tables are read in place from the mapped file
+    tables = [section.cast('q') for section in sections[:-1]]
+    return kind, flags, tables, sections[-1]
+
+
+def decode_words(word_offsets, blob, is_bytes):
+    """
+    return the list of words stored in the blob
+    """
+    words = []
+    for index in range(len(word_offsets) - 1):
+        word = blob[word_offsets[index]: word_offsets[index + 1]]
+        words.append(bytes(word) if is_bytes else str(word, 'utf-8'))
+    return words
+
+
+def load_automaton(path):
+    """
+    memory-map a file written by save_automaton and return a searchable AhoCorasick|CommentzWalter
+    whose tables are read directly from the mapping, the returned automaton has no trie nodes
+    """
+    kind, flags, tables, blob = read_sections(map_file(path))
+    is_bytes = bool(flags & FLAG_BYTES)
+    # automata saved before the insertion order was kept fall back to the order of their words
+    priorities = tables.pop() if flags & FLAG_PRIORITIES else None
+
+    if kind == KIND_AHO_CORASICK:
+        letters, transitions, output_starts, output_ids, word_offsets = tables
+        automaton = AhoCorasick()
+        automaton.output_starts = output_starts
+    elif kind == KIND_COMMENTZ_WALTER:
+        params, letters, transitions, shift1, shift2, output_ids, bad_character, word_offsets = tables
+        automaton = CommentzWalter()
+        automaton.min_depth, automaton.max_depth = params
+        automaton.shift1 = shift1
+        automaton.shift2 = shift2
+        automaton.bad_character = bad_character
+        automaton.class_count = len(letters) + 1
+        automaton.depth_count = automaton.max_depth + 1
+    else:
+        raise ValueError(f"unknown automaton kind {kind}")
+
+    automaton.letter_classes = {letter if is_bytes else chr(letter): letter_class
+                                for letter_class, letter in enumerate(letters, 1)}
+    automaton.transitions = transitions
+    automaton.output_ids = output_ids
+    automaton.words = decode_words(word_offsets, blob, is_bytes)
+    automaton.size = len(automaton.words)
+    if priorities is not None:
+        automaton.priorities = dict(zip(automaton.words, priorities))
+    if flags & FLAG_MINIMIZED:
+        automaton.build_path_ids()
+    return automaton
@@ -0,0 +1,176 @@
+import argparse
+import gc
+import io
+import json
+import platform
+import random
+import string
+import time
+
+from automaton_cache import build_automaton
+from benchmark_history import DEFAULT_HISTORY_PATH, record_report
+from search_stats import SearchStats
+
+# engines benchmarked by default
+ENGINES = ('ac', 'cw', 'rk', 'wm')
+
+# default sweeps, the harness accepts up to 10M words and 100k patterns through the command line
+TEXT_SIZES = [1000, 10000, 100000]
+PATTERN_COUNTS = [10, 100, 1000]
+
+# smallest vocabulary the text and the patterns are drawn from
+VOCABULARY_SIZE = 50000
+
+
+def random_vocabulary(rng, size):
+    """
+    generate size distinct lower case words with lengths between 2 and 12 letters
+    """
+    vocabulary = set()
+    while len(vocabulary) < size:
+        vocabulary.add(''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 12))))
+    return sorted(vocabulary)
+
+
+def seeded_inputs(seed, n, m, vocabulary_size=VOCABULARY_SIZE):
+    """
+    return (search string of n words, m distinct patterns) that only depend on seed, n and m
+    """
+    rng = random.Random(f"{seed}-{n}-{m}")
+    vocabulary = random_vocabulary(rng, max(vocabulary_size, 2 * m))
+    search_str = ' '.join(rng.choices(vocabulary, k=n))
+    patterns = rng.sample(vocabulary, m)
+    return search_str, patterns
+
+
+def percentile(samples, fraction):
+    """
+    return the nearest-rank percentile of samples, fraction in [0, 1]
+    """
+    ordered = sorted(samples)
+    rank = max(int(round(fraction * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(samples):
+    """
+    return the median, percentiles, min, max and mean of timings in milliseconds
+    """
+    return {
+        'median_ms': percentile(samples, 0.5),
+        'p90_ms': percentile(samples, 0.9),
+        'p99_ms': percentile(samples, 0.99),
+        'min_ms': min(samples),
+        'max_ms': max(samples),
+        'mean_ms': sum(samples) / len(samples),
+        'samples_ms': samples,
+    }
+
+
+def timed(function, *args):
+    """
+    return (result, elapsed milliseconds) of function(*args) with the garbage collector paused
+    """
+    gc.collect()
+    gc.disable()
+    try:
+        start_time = time.perf_counter()
+        result = function(*args)
+        end_time = time.perf_counter()
+    finally:
+        gc.enable()
+    return result, (end_time - start_time) * 10 ** 3
+
+
+def emit_matches(matches):
+    """
+    write every match to an in-memory sink, the cost the test_* helpers pay when printing matches
+    """
+    sink = io.StringIO()
+    for match in matches:
+        sink.write(f"{match}\n")
+    return sink.tell()
+
+
+def benchmark_engine(engine, search_str, patterns, repeat=5, warmup=1):
+    """
+    time the build, search and match emission of an engine separately over warmup + repeat runs,
+    only the repeated runs are reported along with the operation counts of the search
+    """
+    timings = {'build': [], 'search': [], 'emission': []}
+    match_count = 0
+    for run in range(warmup + repeat):
+        automaton, build_time = timed(build_automaton, engine, patterns)
+        matches, search_time = timed(automaton.find_all_matches, search_str)
+        _, emission_time = timed(emit_matches, matches)
+        match_count = len(matches)
+        if run >= warmup:
+            timings['build'].append(build_time)
+            timings['search'].append(search_time)
+            timings['emission'].append(emission_time)
+
+    # operations are counted by one more search outside of the timed runs
+    stats = SearchStats()
+    automaton.find_all_matches(search_str, stats)
+
+    result = {'engine': engine, 'matches': match_count, 'stats': stats.summary()}
+    for phase, samples in timings.items():
+        result[phase] = summarize(samples)
+    return result
+
+
+def run_sweep(text_sizes=TEXT_SIZES, pattern_counts=PATTERN_COUNTS, engines=ENGINES, repeat=5, warmup=1, seed=0):
+    """
+    benchmark every engine on every (no of words, no of patterns) pair and return a json serializable report
+    """
+    runs = []
+    for n in text_sizes:
+        for m in pattern_counts:
+            search_str, patterns = seeded_inputs(seed, n, m)
+            for engine in engines:
+                print(f"Benchmarking {engine} on {n} words and {m} patterns")
+                result = benchmark_engine(engine, search_str, patterns, repeat, warmup)
+                result.update({'words': n, 'patterns': m, 'text_length': len(search_str)})
+                runs.append(result)
+    return {
+        'seed': seed,
+        'repeat': repeat,
+        'warmup': warmup,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'runs': runs,
+    }
+
+
+def parse_sizes(value):
+    """
+    parse a comma separated list of integers
+    """
+    return [int(size) for size in value.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark build, search and match emission of the engines")
+    parser.add_argument('--sizes', type=parse_sizes, default=TEXT_SIZES, help="no of words of the text")
+    parser.add_argument('--patterns', type=parse_sizes, default=PATTERN_COUNTS, help="no of patterns")
+    parser.add_argument('--engines', type=lambda value: value.split(','), default=list(ENGINES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='results/benchmark.json')
+    parser.add_argument('--history', nargs='?', const=DEFAULT_HISTORY_PATH,
+                        help="also record the runs in a sqlite history store")
+    args = parser.parse_args(argv)
+
+    report = run_sweep(args.sizes, args.patterns, args.engines, args.repeat, args.warmup, args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote benchmark results to {args.output}")
+    if args.history:
+        record_report(report, path=args.history)
+        print(f"Recorded benchmark results in {args.history}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
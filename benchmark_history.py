@@ -0,0 +1,262 @@
+import argparse
+import json
+import math
+import os
+import sqlite3
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+# sqlite file every benchmark run is appended to
+DEFAULT_HISTORY_PATH = 'results/benchmark_history.sqlite'
+
+# a slowdown is only reported when the median grew by more than this fraction
+DEFAULT_THRESHOLD = 0.05
+
+# significance level of the one sided Mann-Whitney U test
+DEFAULT_ALPHA = 0.05
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recorded_at TEXT NOT NULL,
+    commit_hash TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    corpus TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    m INTEGER NOT NULL,
+    phase TEXT NOT NULL,
+    median_ms REAL NOT NULL,
+    samples_ms TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS measurements_by_commit ON measurements (commit_hash, engine, corpus, n, m, phase);
+"""
+
+
+def current_commit():
+    """
+    return the short hash of the checked out commit, 'unknown' outside of a git checkout
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def connect(path=DEFAULT_HISTORY_PATH):
+    """
+    open the history store at path, creating it and its table when missing
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def median(samples):
+    """
+    return the median of a list of timings
+    """
+    ordered = sorted(samples)
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def record_samples(engine, corpus, n, m, phase, samples, commit=None, path=DEFAULT_HISTORY_PATH):
+    """
+    append the timings (in milliseconds) of one phase of a benchmark run to the history
+    """
+    with connect(path) as connection:
+        connection.execute(
+            "INSERT INTO measurements (recorded_at, commit_hash, engine, corpus, n, m, phase, median_ms, samples_ms) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (datetime.now(timezone.utc).isoformat(), commit or current_commit(), engine, corpus, n, m, phase,
+             median(samples), json.dumps(samples)))
+    connection.close()
+
+
+def record_report(report, corpus='random', commit=None, path=DEFAULT_HISTORY_PATH):
+    """
+    append every run of a report written by benchmark.run_sweep to the history
+    """
+    commit = commit or current_commit()
+    for run in report['runs']:
+        for phase in ('build', 'search', 'emission'):
+            record_samples(run['engine'], corpus, run['words'], run['patterns'], phase, run[phase]['samples_ms'],
+                           commit, path)
+
+
+def load_samples(commit, path=DEFAULT_HISTORY_PATH):
+    """
+    return {(engine, corpus, n, m, phase): samples} of every run recorded for a commit,
+    runs recorded more than once for a commit are pooled
+    """
+    connection = connect(path)
+    rows = connection.execute(
+        "SELECT engine, corpus, n, m, phase, samples_ms FROM measurements WHERE commit_hash = ? ORDER BY id",
+        (commit,)).fetchall()
+    connection.close()
+    samples = {}
+    for engine, corpus, n, m, phase, samples_ms in rows:
+        samples.setdefault((engine, corpus, n, m, phase), []).extend(json.loads(samples_ms))
+    return samples
+
+
+def latest_commits(path=DEFAULT_HISTORY_PATH, count=2):
+    """
+    return the last count commits recorded in the history, most recent last
+    """
+    connection = connect(path)
+    rows = connection.execute(
+        "SELECT commit_hash FROM measurements GROUP BY commit_hash ORDER BY MAX(id) DESC LIMIT ?", (count,)).fetchall()
+    connection.close()
+    return [row[0] for row in reversed(rows)]
+
+
+def mann_whitney_p_value(baseline, candidate):
+    """
+    one sided p-value of the Mann-Whitney U test that candidate timings are larger than baseline timings,
+    using the normal approximation with tie and continuity corrections
+    """
+    pooled = sorted([(sample, 0) for sample in baseline] + [(sample, 1) for sample in candidate])
+    ranks = [0.0] * len(pooled)
+    tie_correction = 0
+    start = 0
+    while start < len(pooled):
+        end = start
+        while end + 1 < len(pooled) and pooled[end + 1][0] == pooled[start][0]:
+            end += 1
+        # tied samples share the average of their ranks
+        for index in range(start, end + 1):
+            ranks[index] = (start + end) / 2 + 1
+        tie_count = end - start + 1
+        tie_correction += tie_count ** 3 - tie_count
+        start = end + 1
+
+    n1 = len(baseline)
+    n2 = len(candidate)
+    total = n1 + n2
+    u_candidate = sum(rank for rank, (_, group) in zip(ranks, pooled) if group == 1) - n2 * (n2 + 1) / 2
+    variance = n1 * n2 / 12 * ((total + 1) - tie_correction / (total * (total - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u_candidate - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def compare(baseline_commit, candidate_commit, path=DEFAULT_HISTORY_PATH, threshold=DEFAULT_THRESHOLD,
+            alpha=DEFAULT_ALPHA):
+    """
+    compare the runs two commits have in common and return a list of dicts describing each of them,
+    a run is a regression when its median slowed down by more than threshold and the slowdown is significant,
+    raises ValueError when either commit has no recorded runs
+    """
+    baseline = load_samples(baseline_commit, path)
+    candidate = load_samples(candidate_commit, path)
+    for commit, samples in ((baseline_commit, baseline), (candidate_commit, candidate)):
+        if not samples:
+            raise ValueError(f"no runs of commit {commit} are recorded in {path}")
+    comparisons = []
+    for key in sorted(baseline.keys() & candidate.keys()):
+        baseline_median = median(baseline[key])
+        candidate_median = median(candidate[key])
+        change = (candidate_median - baseline_median) / baseline_median if baseline_median else 0.0
+        p_value = mann_whitney_p_value(baseline[key], candidate[key])
+        engine, corpus, n, m, phase = key
+        comparisons.append({
+            'engine': engine, 'corpus': corpus, 'n': n, 'm': m, 'phase': phase,
+            'baseline_ms': baseline_median, 'candidate_ms': candidate_median,
+            'change': change, 'p_value': p_value,
+            'regression': change > threshold and p_value < alpha,
+        })
+    return comparisons
+
+
+def plot_trends(phase='search', path=DEFAULT_HISTORY_PATH, output_dir='results'):
+    """
+    plot the median time of a phase of every (engine, corpus, n, m) over the recorded runs,
+    one chart per corpus written next to the plot_metrics charts
+    """
+    import matplotlib.pyplot as plt
+
+    connection = connect(path)
+    rows = connection.execute(
+        "SELECT corpus, engine, n, m, commit_hash, median_ms FROM measurements WHERE phase = ? ORDER BY id",
+        (phase,)).fetchall()
+    connection.close()
+
+    trends = {}
+    for corpus, engine, n, m, commit, median_ms in rows:
+        trends.setdefault(corpus, {}).setdefault((engine, n, m), []).append((commit, median_ms))
+
+    chart_paths = []
+    for corpus, series in trends.items():
+        for (engine, n, m), points in sorted(series.items()):
+            plt.plot(range(len(points)), [median_ms for _, median_ms in points], '-o', label=f"{engine} n={n} m={m}")
+        plt.title(f"({corpus}) {phase} time over the recorded runs")
+        plt.xlabel('Run (oldest first)')
+        plt.ylabel('Median time (in milliseconds)')
+        plt.legend(loc='best', fontsize='small')
+        chart_path = os.path.join(output_dir, f"trend_{corpus}_{phase}.svg")
+        print("Wrote trend graph to %s" % chart_path)
+        plt.savefig(chart_path, bbox_inches='tight', format="svg")
+        plt.clf()
+        plt.close()
+        chart_paths.append(chart_path)
+    return chart_paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record benchmark runs and detect performance regressions")
+    parser.add_argument('--history', default=DEFAULT_HISTORY_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = commands.add_parser('record', help="record a json report written by benchmark.py")
+    record_parser.add_argument('report')
+    record_parser.add_argument('--corpus', default='random')
+    record_parser.add_argument('--commit')
+
+    compare_parser = commands.add_parser('compare', help="exit with 1 when the candidate is significantly slower")
+    compare_parser.add_argument('baseline', nargs='?')
+    compare_parser.add_argument('candidate', nargs='?')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    compare_parser.add_argument('--alpha', type=float, default=DEFAULT_ALPHA)
+
+    plot_parser = commands.add_parser('plot', help="plot the trend of a phase over the recorded runs")
+    plot_parser.add_argument('--phase', default='search')
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        with open(args.report) as f:
+            record_report(json.load(f), args.corpus, args.commit, args.history)
+        return 0
+    if args.command == 'plot':
+        plot_trends(args.phase, args.history)
+        return 0
+
+    # defaults to the two most recently recorded commits
+    recorded = latest_commits(args.history)
+    baseline = args.baseline or (recorded[0] if len(recorded) == 2 else None)
+    candidate = args.candidate or (recorded[-1] if recorded else None)
+    if baseline is None or baseline == candidate:
+        parser.error("two recorded commits are needed for a comparison")
+
+    try:
+        comparisons = compare(baseline, candidate, args.history, args.threshold, args.alpha)
+    except ValueError as error:
+        parser.error(str(error))
+    regressions = [comparison for comparison in comparisons if comparison['regression']]
+    for comparison in comparisons:
+        print("%s %-3s %-8s n=%-8d m=%-6d %-8s %10.3f ms -> %10.3f ms (%+.1f%%, p=%.4f)" % (
+            'REGRESSION' if comparison['regression'] else 'ok        ', comparison['engine'], comparison['corpus'],
+            comparison['n'], comparison['m'], comparison['phase'], comparison['baseline_ms'],
+            comparison['candidate_ms'], comparison['change'] * 100, comparison['p_value']))
+    print(f"{len(regressions)} of {len(comparisons)} runs of {candidate} are significantly slower than {baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
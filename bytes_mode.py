@@ -0,0 +1,47 @@
+import mmap
+import string
+from collections import deque
+
+# translation table that folds ascii upper case bytes to lower case, other bytes map to themselves
+ASCII_LOWER = bytes.maketrans(string.ascii_uppercase.encode(), string.ascii_lowercase.encode())
+
+
+def encode_patterns(patterns, encoding='utf-8'):
+    """
+    lower case and encode patterns so they can be added to an engine that searches bytes
+    """
+    return [pattern.lower().encode(encoding) for pattern in patterns]
+
+
+def as_byte_view(buffer):
+    """
+    return a zero-copy view of the unsigned bytes of a bytes-like buffer (bytes, bytearray, mmap, memoryview)
+    """
+    return memoryview(buffer).cast('B')
+
+
+def map_file(path):
+    """
+    memory-map a file for reading, so it can be searched without reading it into memory
+    """
+    with open(path, 'rb') as f:
+        # an empty file cannot be mapped
+        if f.seek(0, 2) == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def to_char_offsets(buffer, matches, encoding='utf-8'):
+    """
+    convert (pattern bytes, byte offset) matches from a bytes search into (pattern, character offset) matches,
+    decoding only the text between consecutive match offsets
+    """
+    byte_view = as_byte_view(buffer)
+    char_offsets = {}
+    byte_offset = 0
+    char_offset = 0
+    for offset in sorted({match[1] for match in matches}):
+        char_offset += len(str(byte_view[byte_offset:offset], encoding))
+        byte_offset = offset
+        char_offsets[offset] = char_offset
+    return deque((word.decode(encoding), char_offsets[offset]) for word, offset in matches)
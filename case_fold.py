@@ -0,0 +1,109 @@
+import sys
+
+from bytes_mode import ASCII_LOWER
+
+
+class CaseFold(dict):
+    """
+    letter -> lower case letter map filled the first time a letter is read, so a text can be folded
+    letter by letter while it is searched instead of lower casing a copy of it, letters whose
+    lower case form is longer than one letter are kept as they are so offsets stay those of the text
+    """
+
+    def __missing__(self, letter):
+        folded = letter.lower()
+        if len(folded) != 1:
+            folded = letter
+        self[letter] = folded
+        return folded
+
+
+# shared by every search, it holds at most one entry per distinct letter ever read
+CASE_FOLD = CaseFold()
+
+
+class CaseFoldCodes(dict):
+    """
+    letter -> code of its lower case form, the codes a text is hashed with
+    """
+
+    def __missing__(self, letter):
+        code = ord(CASE_FOLD[letter])
+        self[letter] = code
+        return code
+
+
+CASE_FOLD_CODES = CaseFoldCodes()
+
+# lower case letter -> the other letters folded to it, built the first time case_variants is called
+_case_variants = None
+
+
+def case_variants(letter):
+    """
+    return every letter that CASE_FOLD folds to the same letter as the given one, including itself
+    """
+    global _case_variants
+    if _case_variants is None:
+        # one pass over every code point, as letters such as the kelvin sign also fold to ascii letters
+        _case_variants = {}
+        for other in map(chr, range(sys.maxunicode + 1)):
+            folded = other.lower()
+            if folded != other and len(folded) == 1:
+                _case_variants.setdefault(folded, [folded]).append(other)
+    return _case_variants.get(CASE_FOLD[letter], [CASE_FOLD[letter]])
+
+
+class CaseFoldedClasses(dict):
+    """
+    letter -> letter class map of an automaton, a letter missing from it takes the class of its lower case form
+    """
+
+    def __missing__(self, letter):
+        letter_class = self.get(CASE_FOLD[letter], 0)
+        self[letter] = letter_class
+        return letter_class
+
+
+def fold_word(word):
+    """
+    return the lower case form of a pattern folded letter by letter like the letters of a text,
+    only the ascii letters of a bytes pattern are folded
+    """
+    if isinstance(word, bytes):
+        return word.translate(ASCII_LOWER)
+    return ''.join(map(CASE_FOLD.__getitem__, word))
+
+
+def folded_classes(letter_classes, is_bytes=False):
+    """
+    return a map from a letter of the text to the class of its lower case form, when is_bytes is set
+    the map is a list indexed by byte and only ascii letters are folded
+    """
+    if is_bytes:
+        return [letter_classes.get(ASCII_LOWER[byte], 0) for byte in range(256)]
+    return CaseFoldedClasses(letter_classes)
+
+
+def fold_letters(letters, is_bytes=False):
+    """
+    lazily yield the lower case form of each letter of a str, or of each byte when is_bytes is set
+    """
+    return map((ASCII_LOWER if is_bytes else CASE_FOLD).__getitem__, letters)
+
+
+def fold_codes(text):
+    """
+    lazily yield the code of the lower case form of each letter of a str
+    """
+    return map(CASE_FOLD_CODES.__getitem__, text)
+
+
+def startswith_folded(text, pattern, position):
+    """
+    return True when the letters of text from position match a lower case pattern once folded
+    """
+    if text.startswith(pattern, position):
+        return True
+    # letter by letter like the pattern, str.lower would turn a final capital sigma into a final small sigma
+    return fold_word(text[position: position + len(pattern)]) == pattern
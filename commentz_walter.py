@@ -1,19 +1,69 @@
 import time
-from trie import NodeTrie
+from trie import LETTER_BITS, LETTER_MASK, NodeTrie, letter_code
+from bytes_mode import as_byte_view
+from case_fold import fold_word, folded_classes
+from match_semantics import check_match_kind, ends_word, match_ranks, starts_word
+from match_sinks import StopSearch
+from stream import CHUNK_SIZE, iter_chunks
+from array import array
 from collections import deque
 
 
+class MatchIds(dict):
+    """
+    letters of a match -> id of the word matched by a minimized automaton, filled the first time a spelling is
+    matched during a search, the word is found by the letter classes of the letters
+    """
+
+    def __init__(self, path_ids, letter_classes):
+        super().__init__()
+        self.path_ids = path_ids
+        self.letter_classes = letter_classes
+
+    def __missing__(self, letters):
+        word_id = self.path_ids[''.join(map(chr, map(self.letter_classes.__getitem__, letters)))]
+        self[letters] = word_id
+        return word_id
+
+
+class ByteMatchIds(MatchIds):
+    """
+    Same as MatchIds for the memoryview slices of a bytes search, which are keyed by a copy of their bytes
+    """
+
+    def __getitem__(self, letters):
+        return super().__getitem__(letters.tobytes())
+
+
 class CommentzWalter(NodeTrie):
     """
     Commentz Walter implementation that uses NodeTrie as its base class
     """
 
+    def __init__(self, letter=None, parent=None, depth=0):
+        """Constructor for a commentz walter root node"""
+        super().__init__(letter, parent, depth)
+        # length of the longest pattern, bounds how far back a window can be compared
+        self.max_depth = 0
+        # order the words were added in, decides between matches of leftmost-first searches
+        self.priorities = {}
+        # letter class path -> word id once minimize has merged the states ending different words, None before
+        self.path_ids = None
+
     def add_word(self, word):
         """
-        Reverse the word and add it to the node trie
+        Reverse the lower case form of the word and add it to the node trie
         """
+        word = fold_word(word)
+        self.priorities.setdefault(word, len(self.priorities))
         word = word[::-1]
         super().add(word)
+        self.index_letters(word)
+
+    def index_letters(self, word):
+        """
+        update the letter table, min_depth and max_depth with the letters of a reversed word
+        """
         position = 1
 
         # Initialize letter table for the letters of the word
@@ -28,6 +78,9 @@ class CommentzWalter(NodeTrie):
         elif len(word) < self.min_depth:
             self.min_depth = len(word)
 
+        if len(word) > self.max_depth:
+            self.max_depth = len(word)
+
     def has_word(self, word):
         """
         Override NodeTrie's has_word to use the reverse of that node for performing a lookup
@@ -36,6 +89,9 @@ class CommentzWalter(NodeTrie):
         return super().has_word(word)
 
     def set_shift_values(self):
+        """
+        set shift1 = min(min_depth, min_diff_s1) and shift2 = min(parent's shift2, min_diff_s2) of every node
+        """
         fifo_queue = deque()
         self.s1 = 1
         self.s2 = self.min_depth
@@ -50,13 +106,13 @@ class CommentzWalter(NodeTrie):
             if walter_node.failure_link_cw is None:
                 walter_node.s1 = self.min_depth
             else:
-                walter_node.s1 = walter_node.min_diff_s1
+                walter_node.s1 = min(walter_node.min_diff_s1, self.min_depth)
 
             # set shift2
             if walter_node.dictionary_link_cw is None:
                 walter_node.s2 = walter_node.parent.s2
             else:
-                walter_node.s2 = walter_node.min_diff_s2
+                walter_node.s2 = min(walter_node.min_diff_s2, walter_node.parent.s2)
 
             for letter in walter_node.children:
                 fifo_queue.append(walter_node.children[letter])
@@ -65,9 +121,11 @@ class CommentzWalter(NodeTrie):
         """
         construct a finite state machine by creating
         failure links between trie nodes for faster transition similar to ahocorasick
-        set shift values for comment waltzer
+        set shift values for comment waltzer and compile them into lookup tables
         """
         fifo_queue = deque()
+        # nodes in bfs order, so a node's failure link is always visited before it
+        walter_nodes = []
 
         # perform bfs from the root of the trie and set their failure links
         for letter in self.children:
@@ -80,6 +138,7 @@ class CommentzWalter(NodeTrie):
 
         while fifo_queue:
             walter_node = fifo_queue.popleft()
+            walter_nodes.append(walter_node)
             for letter in walter_node.children:
                 child = walter_node.children[letter]
                 fifo_queue.append(child)
@@ -89,22 +148,236 @@ class CommentzWalter(NodeTrie):
             walter_node.failure_link = suffix_node
             failure_link_is_word = walter_node.failure_link.word is not None
             walter_node.dictionary_link = walter_node.failure_link if failure_link_is_word else walter_node.failure_link.dictionary_link
-            if walter_node.dictionary_link is not None:
-                pass
 
-            # Set reverse failure links and dictionary links for walter_node
+            # Set reverse failure links for walter_node
             walter_suffix_diff = walter_node.depth - suffix_node.depth
-            is_set2 = walter_node.word is not None
             if suffix_node.min_diff_s1 == -1 or suffix_node.min_diff_s1 > walter_suffix_diff:
                 suffix_node.min_diff_s1 = walter_suffix_diff
                 suffix_node.failure_link_cw = walter_node
-            if is_set2:
-                if suffix_node.min_diff_s2 == -1 or suffix_node.min_diff_s2 > walter_suffix_diff:
-                    suffix_node.min_diff_s2 = walter_suffix_diff
-                    suffix_node.dictionary_link_cw = walter_node
+
+        # Set reverse dictionary links to the shallowest word having the node as a suffix,
+        # deeper nodes are visited first so the links of their own suffixes are already final
+        for walter_node in reversed(walter_nodes):
+            nearest_word = walter_node if walter_node.word is not None else walter_node.dictionary_link_cw
+            if nearest_word is None:
+                continue
+            suffix_node = walter_node.failure_link
+            walter_suffix_diff = nearest_word.depth - suffix_node.depth
+            if suffix_node.min_diff_s2 == -1 or suffix_node.min_diff_s2 > walter_suffix_diff:
+                suffix_node.min_diff_s2 = walter_suffix_diff
+                suffix_node.dictionary_link_cw = nearest_word
 
         # initialize shift values
         self.set_shift_values()
+        self.compile_shift_tables()
+
+    def compile_shift_tables(self):
+        """
+        flatten the trie into lookup tables so the search loop only reads tables:
+        transitions indexed by (state, letter class), per state shift1, shift2 and output word id (-1 for none)
+        and a bad character table indexed by (letter class, depth)
+        """
+        # number the states in bfs order, state 0 is the root
+        nodes = [self]
+        for walter_node in nodes:
+            nodes.extend(walter_node.children.values())
+        state_ids = {id(walter_node): state for state, walter_node in enumerate(nodes)}
+
+        # class 0 is reserved for letters that do not occur in any pattern
+        letter_classes = {letter: letter_class for letter_class, letter in enumerate(self.letter_lookup_table, 1)}
+        class_count = len(letter_classes) + 1
+
+        # a transition to state 0 means the letter has no child, as no node transitions back to the root
+        transitions = array('l', [0]) * (len(nodes) * class_count)
+        shift1 = array('l', [0]) * len(nodes)
+        shift2 = array('l', [0]) * len(nodes)
+        output_ids = array('l', [-1]) * len(nodes)
+        words = []
+        for state, walter_node in enumerate(nodes):
+            for letter, child in walter_node.children.items():
+                transitions[state * class_count + letter_classes[letter]] = state_ids[id(child)]
+            shift1[state] = walter_node.s1
+            shift2[state] = walter_node.s2
+            # keep the word in its original order, so a match needs no reversal
+            if walter_node.word is not None:
+                output_ids[state] = len(words)
+                words.append(walter_node.word[::-1])
+
+        self.set_tables(letter_classes, transitions, shift1, shift2, output_ids, words)
+
+    def set_tables(self, letter_classes, transitions, shift1, shift2, output_ids, words):
+        """
+        keep the compiled tables of the trie and build the bad character table from the letter table
+        """
+        class_count = len(letter_classes) + 1
+        depth_count = self.max_depth + 1
+        # shift needed to align the mismatched letter with its nearest occurrence in the trie
+        bad_character = array('l', [0]) * (class_count * depth_count)
+        letter_depths = [self.min_depth + 1] * class_count
+        for letter, letter_class in letter_classes.items():
+            letter_depths[letter_class] = self.get_letter_min_depth(letter)
+        for letter_class, letter_depth in enumerate(letter_depths):
+            for j in range(depth_count):
+                bad_character[letter_class * depth_count + j] = letter_depth - j - 1
+
+        self.letter_classes = letter_classes
+        self.class_count = class_count
+        self.depth_count = depth_count
+        self.transitions = transitions
+        self.shift1 = shift1
+        self.shift2 = shift2
+        self.output_ids = output_ids
+        self.words = words
+        self.bad_character = bad_character
+        self.path_ids = None
+        self.size = len(words)
+
+    def compile_array_trie(self, array_trie):
+        """
+        build the tables of create_failure_links from a trie.ArrayTrie of the reversed lower case words instead of
+        trie nodes, which are never created, so a large pattern set is compiled in a fraction of the memory,
+        the failure links and the reverse failure and dictionary links only live in arrays while the shifts are set
+        """
+        parents = array_trie.parents
+        letters = array_trie.letters
+        depths = array_trie.depths
+        word_ids = array_trie.word_ids
+        edges = array_trie.edges
+        for word in array_trie.words:
+            self.index_letters(word)
+        self.priorities = {word[::-1]: priority for priority, word in enumerate(array_trie.words)}
+        # parents are numbered before their children and the suffixes of a node before it
+        nodes = array_trie.depth_order()
+        node_count = len(nodes)
+
+        # failure link of each node, the longest proper suffix of its reversed word that is a node too
+        failure_links = array('l', [0]) * node_count
+        for node in nodes:
+            if depths[node] < 2:
+                continue
+            code = letters[node]
+            suffix_node = failure_links[parents[node]]
+            while suffix_node and (suffix_node << LETTER_BITS | code) not in edges:
+                suffix_node = failure_links[suffix_node]
+            failure_links[node] = edges.get(suffix_node << LETTER_BITS | code, 0)
+
+        # min_diff_s1 and min_diff_s2 of each node, -1 when it has no reverse failure or dictionary link
+        min_diff_s1 = array('l', [-1]) * node_count
+        min_diff_s2 = array('l', [-1]) * node_count
+        for node in nodes:
+            if depths[node] < 2:
+                continue
+            suffix_node = failure_links[node]
+            walter_suffix_diff = depths[node] - depths[suffix_node]
+            if min_diff_s1[suffix_node] == -1 or min_diff_s1[suffix_node] > walter_suffix_diff:
+                min_diff_s1[suffix_node] = walter_suffix_diff
+        # deeper nodes are visited first so the links of their own suffixes are already final
+        for node in reversed(nodes):
+            if depths[node] < 2:
+                break
+            if word_ids[node] != -1:
+                nearest_depth = depths[node]
+            elif min_diff_s2[node] != -1:
+                nearest_depth = depths[node] + min_diff_s2[node]
+            else:
+                continue
+            suffix_node = failure_links[node]
+            walter_suffix_diff = nearest_depth - depths[suffix_node]
+            if min_diff_s2[suffix_node] == -1 or min_diff_s2[suffix_node] > walter_suffix_diff:
+                min_diff_s2[suffix_node] = walter_suffix_diff
+
+        # number the states by depth, state 0 is the root
+        state_ids = array('l', [0]) * node_count
+        for state, node in enumerate(nodes):
+            state_ids[node] = state
+        letter_classes = {letter: letter_class for letter_class, letter in enumerate(self.letter_lookup_table, 1)}
+        code_classes = {letter_code(letter): letter_class for letter, letter_class in letter_classes.items()}
+        class_count = len(letter_classes) + 1
+
+        transitions = array('l', [0]) * (node_count * class_count)
+        for key, child in edges.items():
+            row = state_ids[key >> LETTER_BITS] * class_count
+            transitions[row + code_classes[key & LETTER_MASK]] = state_ids[child]
+        shift1 = array('l', [1]) * node_count
+        shift2 = array('l', [self.min_depth]) * node_count
+        output_ids = array('l', [-1]) * node_count
+        words = []
+        for state, node in enumerate(nodes):
+            if state:
+                shift1[state] = self.min_depth if min_diff_s1[node] == -1 else min(min_diff_s1[node], self.min_depth)
+                parent_shift2 = shift2[state_ids[parents[node]]]
+                shift2[state] = parent_shift2 if min_diff_s2[node] == -1 else min(min_diff_s2[node], parent_shift2)
+            # keep the word in its original order, so a match needs no reversal
+            if word_ids[node] != -1:
+                output_ids[state] = len(words)
+                words.append(array_trie.words[word_ids[node]][::-1])
+        self.set_tables(letter_classes, transitions, shift1, shift2, output_ids, words)
+
+    def minimize(self):
+        """
+        merge the compiled states of equivalent subtrees of the reversed trie, those with the same shift1, shift2,
+        word flag and merged children, and release the trie nodes like a loaded automaton,
+        words are then told apart by the letter classes of the matched letters, see MatchIds
+        return (no of states before, no of states after)
+        """
+        class_count = self.class_count
+        state_count = len(self.shift1)
+        # bfs numbering puts every child after its parent, so children are merged before their parents
+        representatives = array('l', [0]) * state_count
+        register = {}
+        for state in range(state_count - 1, -1, -1):
+            row = tuple(map(representatives.__getitem__,
+                            self.transitions[state * class_count: (state + 1) * class_count]))
+            signature = (self.shift1[state], self.shift2[state], self.output_ids[state] >= 0, row)
+            representatives[state] = register.setdefault(signature, state)
+
+        # renumber the kept states in bfs order so the root stays state 0
+        new_ids = {}
+        for state in range(state_count):
+            if representatives[state] == state:
+                new_ids[state] = len(new_ids)
+        transitions = array('l', [0]) * (len(new_ids) * class_count)
+        shift1 = array('l', [0]) * len(new_ids)
+        shift2 = array('l', [0]) * len(new_ids)
+        output_ids = array('l', [-1]) * len(new_ids)
+        for state, new_state in new_ids.items():
+            row = self.transitions[state * class_count: (state + 1) * class_count]
+            for letter_class, child in enumerate(row):
+                if child:
+                    transitions[new_state * class_count + letter_class] = new_ids[representatives[child]]
+            shift1[new_state] = self.shift1[state]
+            shift2[new_state] = self.shift2[state]
+            output_ids[new_state] = 0 if self.output_ids[state] >= 0 else -1
+
+        self.transitions = transitions
+        self.shift1 = shift1
+        self.shift2 = shift2
+        self.output_ids = output_ids
+        self.build_path_ids()
+        # the root's reverse links point into the trie too
+        self.children = {}
+        self.failure_link_cw = None
+        self.dictionary_link_cw = None
+        return state_count, len(new_ids)
+
+    def build_path_ids(self):
+        """
+        index the word ids of a minimized automaton by the letter classes of their letters
+        """
+        letter_classes = self.letter_classes
+        self.path_ids = {''.join(chr(letter_classes[letter]) for letter in word): word_id
+                         for word_id, word in enumerate(self.words)}
+
+    def match_ids(self, letter_classes):
+        """
+        return a MatchIds of a minimized automaton for one search, None when every state knows its word id,
+        the letter classes of a bytes search are a list indexed by byte
+        """
+        if self.path_ids is None:
+            return None
+        if isinstance(letter_classes, list):
+            return ByteMatchIds(self.path_ids, letter_classes)
+        return MatchIds(self.path_ids, letter_classes)
 
     def get_letter_min_depth(self, letter):
         """
@@ -116,65 +389,272 @@ class CommentzWalter(NodeTrie):
 
         return min_depth
 
-    def get_walter_node_shift(self, walter_node, j):
+    def iter_matches(self, chunks, letter_classes):
+        """
+        Lazily yield the (pattern id, offset) matches of chunks of letters by comparing windows right to left using
+        the compiled tables, keeping only the current chunk and the last max_depth letters before the window in memory,
+        letter_classes maps a letter to the class of its lower case form, every search without stats runs this loop
+        """
+        transitions = self.transitions
+        shift1 = self.shift1
+        shift2 = self.shift2
+        output_ids = self.output_ids
+        match_ids = self.match_ids(letter_classes)
+        bad_character = self.bad_character
+        class_count = self.class_count
+        depth_count = self.depth_count
+        idx = self.min_depth - 1
+        # buffer holds the letters from the absolute position buffer_start onwards
+        buffer = None
+        buffer_start = 0
+        for chunk in chunks:
+            if buffer is None:
+                buffer = chunk
+            else:
+                keep_from = min(max(idx - self.max_depth - buffer_start, 0), len(buffer))
+                buffer_start += keep_from
+                buffer = buffer[keep_from:] + chunk
+            buffer_end = buffer_start + len(buffer)
+
+            while idx < buffer_end:
+                # start from the root
+                state = 0
+                j = 0
+                shift = 0
+                while j <= idx:
+                    letter_class = letter_classes[buffer[idx - j - buffer_start]]
+                    next_state = transitions[state * class_count + letter_class]
+                    if next_state == 0:
+                        shift = bad_character[letter_class * depth_count + j]
+                        break
+                    state = next_state
+                    j += 1
+                    if output_ids[state] >= 0:
+                        yield (output_ids[state] if match_ids is None else
+                               match_ids[buffer[idx - j + 1 - buffer_start: idx + 1 - buffer_start]]), idx - j + 1
+
+                # shift = min(max(shift1, bad character shift), shift2), without a mismatch the bad character shift is 0
+                if shift < shift1[state]:
+                    shift = shift1[state]
+                if shift > shift2[state]:
+                    shift = shift2[state]
+                idx += shift
+
+    def scan(self, letters, letter_classes, stats=None):
         """
-        get shift value of a cw node from position depth j
+        Compare windows of an indexable sequence of letters right to left and return the (word, offset) matches,
+        running the instrumented copy of the loop only when stats are given
         """
-        if walter_node.letter is None:
-            max_of_s1_and_letter = walter_node.s1
-        else:
-            max_of_s1_and_letter = max(self.get_letter_min_depth(walter_node.letter) - j - 1, walter_node.s1)
-        return min(max_of_s1_and_letter, walter_node.s2)
+        if stats is not None:
+            return self.scan_with_stats(letters, letter_classes, stats)
+        words = self.words
+        return deque((words[pattern_id], start) for pattern_id, start in self.iter_matches([letters], letter_classes))
 
-    def find_all_matches(self, text):
+    def scan_with_stats(self, letters, letter_classes, stats):
         """
-        Traverse through the trie nodes to find substring_matches if any exist
+        Same as scan while counting the windows compared, the letters compared,
+        the sum of the shifts and of the trie depths reached and the deepest depth reached
         """
+        transitions = self.transitions
+        shift1 = self.shift1
+        shift2 = self.shift2
+        output_ids = self.output_ids
+        match_ids = self.match_ids(letter_classes)
+        words = self.words
+        bad_character = self.bad_character
+        class_count = self.class_count
+        depth_count = self.depth_count
         idx = self.min_depth - 1
-        text = text.lower()
+        size = len(letters)
         substring_matches = deque()
+        windows = 0
+        mismatches = 0
+        depth_total = 0
+        max_depth = 0
 
-        while idx < len(text):
-            # start from the root
-            walter_node = self
+        while idx < size:
+            state = 0
             j = 0
-            search_letter = text[idx - j]
-            while (search_letter in walter_node) and (idx - j >= 0):
-                walter_node = walter_node.children[search_letter]
+            shift = 0
+            windows += 1
+            while j <= idx:
+                letter_class = letter_classes[letters[idx - j]]
+                next_state = transitions[state * class_count + letter_class]
+                if next_state == 0:
+                    shift = bad_character[letter_class * depth_count + j]
+                    mismatches += 1
+                    break
+                state = next_state
                 j += 1
-                if walter_node.word is not None:
-                    substring_matches.append((walter_node.word[::-1], idx - j + 1))
+                if output_ids[state] >= 0:
+                    pattern_id = output_ids[state] if match_ids is None else match_ids[letters[idx - j + 1: idx + 1]]
+                    substring_matches.append((words[pattern_id], idx - j + 1))
+
+            if shift < shift1[state]:
+                shift = shift1[state]
+            if shift > shift2[state]:
+                shift = shift2[state]
+            idx += shift
+            depth_total += j
+            if j > max_depth:
+                max_depth = j
+
+        # every comparison either reaches one level deeper or is the mismatch ending a window
+        stats.add('cw', windows=windows, comparisons=depth_total + mismatches, shift_total=idx - self.min_depth + 1,
+                  depth_total=depth_total)
+        stats.maximum('max_depth', max_depth)
+        return substring_matches
+
+    def find_all_matches(self, text, stats=None):
+        """
+        Traverse through the trie nodes to find substring_matches if any exist,
+        operations are counted into stats when a search_stats.SearchStats is given
+        """
+        # forcing matches to be case insensitive, letters are folded as they are compared
+        return self.scan(text, folded_classes(self.letter_classes), stats)
+
+    def find_all_matches_bytes(self, buffer, stats=None):
+        """
+        Search a bytes-like buffer such as an mmap without decoding it, reporting byte offsets,
+        the trie must be built from patterns encoded with bytes_mode.encode_patterns
+        """
+        # only ascii letters are folded, bytes of multi-byte characters are matched as they are
+        return self.scan(as_byte_view(buffer), folded_classes(self.letter_classes, True), stats)
 
-                search_letter = text[idx - j]
+    def search(self, text, sink):
+        """
+        Hand every (pattern id, offset) match of the text to a match_sinks sink and return its result,
+        pattern ids index self.words
+        """
+        return self.search_letters(text, folded_classes(self.letter_classes), sink)
 
-            if j > idx:
-                j = idx
+    def search_bytes(self, buffer, sink):
+        """
+        Same as search over a bytes-like buffer, reporting byte offsets
+        """
+        return self.search_letters(as_byte_view(buffer), folded_classes(self.letter_classes, True), sink)
 
-            idx += self.get_walter_node_shift(walter_node, j)
+    def search_letters(self, letters, letter_classes, sink):
+        """
+        Same as scan without building a tuple per match
+        """
+        add = sink.add
+        try:
+            for pattern_id, start in self.iter_matches([letters], letter_classes):
+                add(pattern_id, start)
+        except StopSearch:
+            pass
+        return sink.result()
+
+    def find_matches(self, text, match_kind='overlapping', whole_words=False):
+        """
+        Compare windows of the text reporting (word, offset) matches of a match_semantics match kind,
+        only matches bounded by non word letters on both sides are considered when whole_words is set
+        """
+        check_match_kind(match_kind)
+        letter_classes = folded_classes(self.letter_classes)
+        transitions = self.transitions
+        shift1 = self.shift1
+        shift2 = self.shift2
+        output_ids = self.output_ids
+        match_ids = self.match_ids(letter_classes)
+        bad_character = self.bad_character
+        class_count = self.class_count
+        depth_count = self.depth_count
+        words = self.words
+        lengths = [len(word) for word in words]
+        leftmost = match_kind != 'overlapping'
+        ranks = match_ranks(words, match_kind, self.priorities) if leftmost else None
+        size = len(text)
+        substring_matches = deque()
 
+        # best (start, pattern id) match found so far, it is final once no later window can hold a match
+        # starting at or before it, as a window ending at idx only holds matches starting after idx - max_depth
+        best_start = -1
+        best_id = -1
+        # matches of a leftmost kind cannot start before the end of the last one reported
+        next_start = 0
+        idx = self.min_depth - 1
+        while True:
+            if best_id != -1 and (idx >= size or best_start <= idx - self.max_depth):
+                substring_matches.append((words[best_id], best_start))
+                next_start = best_start + lengths[best_id]
+                best_id = -1
+                # compare the windows again from the first one that can hold a match starting after it
+                idx = next_start + self.min_depth - 1
+            if idx >= size:
+                break
+
+            # outputs of the window are only considered when a word can end at its last letter
+            can_end = not whole_words or ends_word(text, idx + 1)
+            state = 0
+            j = 0
+            shift = 0
+            while j <= idx:
+                letter_class = letter_classes[text[idx - j]]
+                next_state = transitions[state * class_count + letter_class]
+                if next_state == 0:
+                    shift = bad_character[letter_class * depth_count + j]
+                    break
+                state = next_state
+                j += 1
+                if output_ids[state] >= 0 and can_end:
+                    start = idx - j + 1
+                    if start < next_start or (whole_words and not starts_word(text, start)):
+                        continue
+                    pattern_id = output_ids[state] if match_ids is None else match_ids[text[start: idx + 1]]
+                    if not leftmost:
+                        substring_matches.append((words[pattern_id], start))
+                    elif best_id == -1 or start < best_start or (
+                            start == best_start and ranks[pattern_id] > ranks[best_id]):
+                        best_start = start
+                        best_id = pattern_id
+
+            # shift = min(max(shift1, bad character shift), shift2), without a mismatch the bad character shift is 0
+            if shift < shift1[state]:
+                shift = shift1[state]
+            if shift > shift2[state]:
+                shift = shift2[state]
+            idx += shift
         return substring_matches
 
+    def find_iter(self, source, chunk_size=CHUNK_SIZE):
+        """
+        Lazily yield (pattern, offset) matches from a str, a file object or an iterable of str chunks,
+        keeping only the current chunk and the last max_depth letters before the window in memory
+        """
+        words = self.words
+        chunks = iter_chunks(source, chunk_size)
+        for pattern_id, start in self.iter_matches(chunks, folded_classes(self.letter_classes)):
+            yield words[pattern_id], start
+
 
-def test_commentz_walter(search_str, patterns, test_trie=False):
+def test_commentz_walter(search_str, patterns, test_trie=False, cache=None):
     """
-    Builds a trie with patterns and runs commentz walter algorithm on the search string
+    Builds a trie with patterns and runs commentz walter algorithm on the search string,
+    or uses the automaton from cache when it is given
     """
-    commentz_walter = CommentzWalter()
-    for pattern in patterns:
-        commentz_walter.add_word(pattern)
-
-    print("\nTrie: Created")
-    print(commentz_walter)
-
-    if test_trie:
-        test_patterns = ["Hi", "Hit", "No", "North", "Yesn't"]
-        print(f"\nTrie: Testing Patterns")
-        for test_pattern in test_patterns:
-            print((test_pattern, commentz_walter.has_word(test_pattern)))
-
-    print("\nCreating failure links")
-    start_time = time.perf_counter()
-    commentz_walter.create_failure_links()
+    if cache is not None:
+        print("\nTrie: Fetching from cache")
+        start_time = time.perf_counter()
+        commentz_walter = cache.get('cw', patterns)
+    else:
+        commentz_walter = CommentzWalter()
+        for pattern in patterns:
+            commentz_walter.add_word(pattern)
+
+        print("\nTrie: Created")
+        print(commentz_walter)
+
+        if test_trie:
+            test_patterns = ["Hi", "Hit", "No", "North", "Yesn't"]
+            print(f"\nTrie: Testing Patterns")
+            for test_pattern in test_patterns:
+                print((test_pattern, commentz_walter.has_word(test_pattern)))
+
+        print("\nCreating failure links")
+        start_time = time.perf_counter()
+        commentz_walter.create_failure_links()
     matches = commentz_walter.find_all_matches(search_str)
     end_time = time.perf_counter()
 
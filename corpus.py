@@ -1,25 +1,33 @@
-import nltk
-
-# one-time download corpus using nltk
-try:
-    nltk.data.find('words')
-    nltk.data.find('punkt')
-    nltk.data.find('stopwords')
-    nltk.data.find('gutenberg')
-    nltk.data.find('brown')
-    nltk.data.find('webtext')
-
-except:
-    nltk.download('words')
-    nltk.download('punkt')
-    nltk.download('stopwords')
-    nltk.download('gutenberg')
-    nltk.download('brown')
-    nltk.download('webtext')
-
-from nltk.corpus import words
+from functools import lru_cache
 from random import sample, randint
 
+# nltk data used by the benchmarks and where nltk stores it, downloaded on first use
+NLTK_RESOURCES = {
+    'words': 'corpora/words',
+    'punkt': 'tokenizers/punkt',
+    'stopwords': 'corpora/stopwords',
+    'gutenberg': 'corpora/gutenberg',
+    'brown': 'corpora/brown',
+    'webtext': 'corpora/webtext',
+    'wordnet': 'corpora/wordnet',
+}
+
+
+@lru_cache(maxsize=None)
+def nltk_corpus(name):
+    """
+    import nltk on first use, one-time download the named corpus if it is missing and return its reader
+    """
+    import nltk
+
+    try:
+        nltk.data.find(NLTK_RESOURCES[name])
+    except LookupError:
+        nltk.download(name)
+
+    from nltk import corpus
+    return getattr(corpus, name)
+
 
 def corpus_word_list(corpus_words, n):
     """
@@ -28,7 +36,7 @@ def corpus_word_list(corpus_words, n):
     if len(corpus_words) < n:
         n = len(corpus_words)
     if corpus_words is None:
-        corpus_words = words.words()
+        corpus_words = nltk_corpus('words').words()
     return sample(corpus_words, n)
 
 
@@ -49,5 +57,5 @@ def randomized_text_patterns(word_list, n):
     """
     from_corpus_number = randint(n // 2, n)
     from_corpus_list = set(corpus_word_list(word_list, from_corpus_number))
-    another_random_corpus_list = set(corpus_word_list(words.words(), n - from_corpus_number))
+    another_random_corpus_list = set(corpus_word_list(nltk_corpus('words').words(), n - from_corpus_number))
     return list(from_corpus_list.union(another_random_corpus_list))
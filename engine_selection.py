@@ -0,0 +1,275 @@
+import argparse
+import importlib.util
+import json
+import math
+import os
+import random
+
+from automaton_cache import build_automaton
+from match_semantics import pattern_priorities
+
+# the vectorized rabin karp is a candidate when numpy can be imported, numpy itself is only loaded to build it
+if importlib.util.find_spec('numpy') is not None:
+    CANDIDATE_ENGINES = ('ac', 'cw', 'rk', 'wm', 'rk-numpy')
+else:
+    CANDIDATE_ENGINES = ('ac', 'cw', 'rk', 'wm')
+
+# file engine_selection.py saves a model calibrated on this host to, next to the module rather than in the
+# current directory, default_model loads it when it exists
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', 'cost_model.json')
+
+# coefficients of a model calibrated on a 2020s x86-64 desktop, used until a model is calibrated on this host,
+# they rank the engines well enough although the predicted milliseconds differ from host to host
+DEFAULT_COEFFICIENTS = {
+    'ac': {'build': [0.1293, 0.007004], 'search': [0.0001004, 3.805e-06]},
+    'cw': {'build': [0.1376, 0.001631], 'search': [7.814e-05, 0.0003654]},
+    'rk': {'build': [0.04216, 0.0002197], 'search': [0.0001507, 0.0001861]},
+    'wm': {'build': [0.03993, 0.0003765], 'search': [8.513e-05, 3.003e-06]},
+    'rk-numpy': {'build': [11.63, 0.0], 'search': [0.0, 1.207e-05]},
+}
+
+# calibration grid, kept small so the model calibrates in a few seconds
+CALIBRATION_WORDS = [1000, 10000]
+CALIBRATION_PATTERNS = [10, 300]
+CALIBRATION_MIN_LENGTHS = [2, 6]
+
+
+def pattern_features(patterns):
+    """
+    return the features of a pattern set the cost model depends on
+    """
+    lengths = [len(pattern) for pattern in patterns]
+    return {
+        'patterns': len(patterns),
+        'letters': sum(lengths),
+        'min_length': min(lengths),
+        'alphabet': len(set().union(*patterns)),
+        # rabin karp rolls one hash per power of two bucket, its vectorized variant one per distinct length
+        'buckets': len({length.bit_length() for length in lengths}),
+        'lengths': len(set(lengths)),
+    }
+
+
+def search_terms(engine, features, text_size):
+    """
+    return the terms of an engine's search cost, the model fits one coefficient per term
+    """
+    if engine == 'ac':
+        # one table lookup per letter, slower as the table outgrows the cpu caches
+        return [text_size, text_size * math.log2(features['letters'] + 1)]
+    if engine == 'cw':
+        # windows advance by at most min_length letters, each is compared right to left
+        return [text_size, text_size / features['min_length']]
+    if engine == 'wm':
+        # windows advance by at most min_length - B + 1 letters, shifts shrink as the pattern blocks cover more blocks
+        return [text_size, text_size * features['patterns'] / features['min_length']]
+    if engine == 'rk':
+        return [text_size, text_size * features['buckets']]
+    return [text_size, text_size * features['lengths']]
+
+
+def build_terms(features):
+    """
+    return the terms of an engine's build cost
+    """
+    return [1, features['letters']]
+
+
+def least_squares(rows, targets):
+    """
+    return the non negative coefficients c minimizing sum((row . c - target)^2), by solving the normal equations
+    """
+    size = len(rows[0])
+    matrix = [[sum(row[i] * row[j] for row in rows) for j in range(size)] +
+              [sum(row[i] * target for row, target in zip(rows, targets))] for i in range(size)]
+    for column in range(size):
+        pivot = max(range(column, size), key=lambda row: abs(matrix[row][column]))
+        matrix[column], matrix[pivot] = matrix[pivot], matrix[column]
+        if matrix[column][column] == 0:
+            continue
+        for row in range(size):
+            if row != column:
+                factor = matrix[row][column] / matrix[column][column]
+                matrix[row] = [value - factor * pivot_value for value, pivot_value in zip(matrix[row], matrix[column])]
+    coefficients = [matrix[i][size] / matrix[i][i] if matrix[i][i] else 0.0 for i in range(size)]
+    # a negative cost per term is noise of a small calibration, it is dropped
+    return [max(coefficient, 0.0) for coefficient in coefficients]
+
+
+def calibration_inputs(seed, words, pattern_count, min_length):
+    """
+    return (search string, patterns) of a calibration run with patterns of at least min_length letters
+    """
+    # benchmark is not installed with the engines, calibration is run from a checkout of the repository
+    from benchmark import random_vocabulary
+    rng = random.Random(f"{seed}-{words}-{pattern_count}-{min_length}")
+    vocabulary = [word for word in random_vocabulary(rng, max(5000, 4 * pattern_count)) if len(word) >= min_length]
+    search_str = ' '.join(rng.choices(vocabulary, k=words))
+    return search_str, rng.sample(vocabulary, pattern_count)
+
+
+class CostModel:
+    """
+    Predicts the build and search time in milliseconds of each engine from the features of a pattern set
+    and the length of the text, with coefficients fitted to benchmark runs on this host
+    """
+
+    def __init__(self, coefficients):
+        """
+        coefficients maps an engine to {'build': [...], 'search': [...]}
+        """
+        self.coefficients = coefficients
+
+    @classmethod
+    def calibrate(cls, engines=CANDIDATE_ENGINES, words=CALIBRATION_WORDS, pattern_counts=CALIBRATION_PATTERNS,
+                  min_lengths=CALIBRATION_MIN_LENGTHS, seed=0):
+        """
+        time building and searching with every engine over a grid of inputs and fit the coefficients
+        """
+        from benchmark import timed
+        samples = {engine: {'build': ([], []), 'search': ([], [])} for engine in engines}
+        for pattern_count in pattern_counts:
+            for min_length in min_lengths:
+                for word_count in words:
+                    search_str, patterns = calibration_inputs(seed, word_count, pattern_count, min_length)
+                    features = pattern_features(patterns)
+                    for engine in engines:
+                        automaton, build_time = timed(build_automaton, engine, patterns)
+                        # the faster of two searches, the first one also warms the caches
+                        search_time = min(timed(automaton.find_all_matches, search_str)[1] for _ in range(2))
+                        samples[engine]['build'][0].append(build_terms(features))
+                        samples[engine]['build'][1].append(build_time)
+                        samples[engine]['search'][0].append(search_terms(engine, features, len(search_str)))
+                        samples[engine]['search'][1].append(search_time)
+
+        return cls({engine: {phase: least_squares(*samples[engine][phase]) for phase in ('build', 'search')}
+                    for engine in engines})
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_PATH):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def save(self, path=DEFAULT_MODEL_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.coefficients, f, indent=2)
+
+    def predict(self, engine, features, text_size, built=False):
+        """
+        return the predicted milliseconds to search a text of text_size letters, including the build unless built
+        """
+        coefficients = self.coefficients[engine]
+        terms = search_terms(engine, features, text_size)
+        search_time = sum(c * term for c, term in zip(coefficients['search'], terms))
+        if built:
+            return search_time
+        return search_time + sum(c * term for c, term in zip(coefficients['build'], build_terms(features)))
+
+    def choose(self, features, text_size, built=()):
+        """
+        return (engine with the lowest predicted time, {engine: predicted milliseconds}),
+        engines in built are already built so only their search is predicted
+        """
+        predictions = {engine: self.predict(engine, features, text_size, engine in built)
+                       for engine in self.coefficients}
+        return min(predictions, key=predictions.get), predictions
+
+
+# model shared by auto engines created without one
+_default_model = None
+
+
+def default_model():
+    """
+    return the model calibrated on this host by running engine_selection.py, saved at DEFAULT_MODEL_PATH,
+    or the one of DEFAULT_COEFFICIENTS when there is none, a model is never calibrated implicitly
+    """
+    global _default_model
+    if _default_model is None:
+        if os.path.exists(DEFAULT_MODEL_PATH):
+            _default_model = CostModel.load(DEFAULT_MODEL_PATH)
+        else:
+            _default_model = CostModel({engine: DEFAULT_COEFFICIENTS[engine] for engine in CANDIDATE_ENGINES})
+    return _default_model
+
+
+class AutoEngine:
+    """
+    Engine that picks the engine a CostModel predicts to be the fastest for its patterns and each text,
+    the chosen automata are built on first use and kept for later searches, without a model the one of
+    default_model is used
+    """
+
+    def __init__(self, patterns, model=None):
+        self.patterns = list(patterns)
+        self.features = pattern_features(self.patterns)
+        # the automata are built from the patterns in this order, it decides between leftmost-first matches
+        self.priorities = pattern_priorities(self.patterns)
+        self.model = model or default_model()
+        # engine -> built automaton
+        self.automata = {}
+        self.chosen = None
+
+    def choose(self, text_size):
+        """
+        return (chosen engine, {engine: predicted milliseconds}) for a text of text_size letters
+        """
+        return self.model.choose(self.features, text_size, self.automata)
+
+    def automaton_for(self, text_size, stats=None):
+        """
+        return the automaton of the engine chosen for a text size, recording the choice and prediction in stats
+        """
+        engine, predictions = self.choose(text_size)
+        if stats is not None:
+            stats.note(auto_choice=engine, predicted_ms=predictions[engine], predictions_ms=predictions)
+        if engine not in self.automata:
+            self.automata[engine] = build_automaton(engine, self.patterns)
+        self.chosen = self.automata[engine]
+        return self.chosen
+
+    @property
+    def words(self):
+        """
+        words of the automaton chosen for the last search, the pattern ids a sink receives index them,
+        the patterns before the first search
+        """
+        if self.chosen is None:
+            return self.patterns
+        return self.chosen.words
+
+    def find_all_matches(self, text, stats=None):
+        """
+        finds and returns the matches of the chosen engine, in the order that engine reports them
+        """
+        return self.automaton_for(len(text), stats).find_all_matches(text, stats)
+
+    def find_all_matches_bytes(self, buffer, stats=None):
+        return self.automaton_for(len(buffer), stats).find_all_matches_bytes(buffer, stats)
+
+    def find_matches(self, text, match_kind='overlapping', whole_words=False):
+        return self.automaton_for(len(text)).find_matches(text, match_kind, whole_words)
+
+    def search(self, text, sink):
+        return self.automaton_for(len(text)).search(text, sink)
+
+    def search_bytes(self, buffer, sink):
+        return self.automaton_for(len(buffer)).search_bytes(buffer, sink)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate the cost model of the auto engine on this host")
+    parser.add_argument('--output', default=DEFAULT_MODEL_PATH)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    model = CostModel.calibrate(seed=args.seed)
+    model.save(args.output)
+    print(f"Wrote cost model to {args.output}")
+    print(json.dumps(model.coefficients, indent=2))
+
+
+if __name__ == "__main__":
+    main()
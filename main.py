@@ -1,55 +1,70 @@
+import os
+import random
 import string
 import itertools
-import matplotlib.pyplot as plt
-from nltk.corpus import gutenberg
-from nltk.corpus import stopwords
-from nltk.corpus import webtext
-from nltk.corpus import words
-from nltk.corpus import brown
 
 from aho_corasick import test_aho_corasick
+from automaton_cache import AutomatonCache
+from benchmark_history import plot_trends, record_samples
 from commentz_walter import test_commentz_walter
-from corpus import corpus_word_list, randomized_text_patterns, novel_random_text_patterns
+from corpus import corpus_word_list, nltk_corpus, randomized_text_patterns, novel_random_text_patterns
+from engine_selection import AutoEngine
 from rabin_karp import test_rabin_karp
+from search_stats import SearchStats
+from synonym_table import DEFAULT_TABLE_PATH, SynonymTable
 from synonyms import get_all_patterns
+from wu_manber import test_wu_manber
 
 # store running time for each algorithm based on their instance size
 METRICS = {
     'cw': [],
     'ac': [],
-    'rk': []
+    'rk': [],
+    'wm': []
 }
 
-THEORETICAL_METRICS = {
+# thousands of operations counted by an instrumented search for each algorithm based on their instance size
+OPERATION_METRICS = {
     'cw': [],
     'ac': [],
-    'rk': []
+    'rk': [],
+    'wm': []
 }
 
+# automata built for a pattern set are reused by later runs with the same synonym expansion
+AUTOMATON_CACHE = AutomatonCache()
+
+# synonyms are read from the precomputed table when it has been built with `python synonym_table.py`
+SYNONYM_TABLE = SynonymTable() if os.path.exists(DEFAULT_TABLE_PATH) else None
+
 # no of words that can be present in a search_string
 INSTANCE_SIZES = [100, 1000, 10000]
 
 ALG_DICT = {
     'cw': 'Commentz-Walter',
     'ac': 'Aho-Corasick',
-    'rk': 'Rabin-Karp'
+    'rk': 'Rabin-Karp',
+    'wm': 'Wu-Manber'
 }
 
 
-def run_algorithms(n=100, m=5, corpus="random"):
+def run_algorithms(n=100, m=5, corpus="random", seed=None):
     """
     Benchmark all algorithms for 'n' instance size, and 'm' patterns
-     using a corpus that is either random|book|webtext|news
+     using a corpus that is either random|book|webtext|news,
+     the sampled text and patterns are reproducible when a seed is given
      """
     global METRICS
+    if seed is not None:
+        random.seed(seed)
     if corpus == "random":
         print(f"Constructing a random corpus of text with {n} words...")
-        search_word_list = corpus_word_list(words.words(), n)
+        search_word_list = corpus_word_list(nltk_corpus('words').words(), n)
         search_str = ' '.join(search_word_list)
         patterns = randomized_text_patterns(search_word_list, m)
     elif corpus == "gutenburg":
         print(f"Retrieving a corpus of text from a novel having {n} words...")
-        tokens = gutenberg.words('austen-emma.txt')
+        tokens = nltk_corpus('gutenberg').words('austen-emma.txt')
         novel_words = clean_text(tokens)
         # take n sample of words from corpus word list
         search_word_list = corpus_word_list(novel_words, n)  # retrieve from novel
@@ -57,7 +72,7 @@ def run_algorithms(n=100, m=5, corpus="random"):
         # get m sample of words to use as patterns
         patterns = novel_random_text_patterns(search_word_list, m)
     elif corpus == "webtext":
-        tokens = webtext.words('firefox.txt')
+        tokens = nltk_corpus('webtext').words('firefox.txt')
         webtext_words = clean_text(tokens)
         search_word_list = corpus_word_list(webtext_words, n)  # retrieve from novel
         search_str = ' '.join(corpus_word_list(list(tokens), n))
@@ -65,7 +80,7 @@ def run_algorithms(n=100, m=5, corpus="random"):
         # get m sample of words to use as patterns
         patterns = novel_random_text_patterns(search_word_list, m)
     elif corpus == "news":
-        tokens = brown.words(categories='news')
+        tokens = nltk_corpus('brown').words(categories='news')
         news_text_words = clean_text(tokens)
         search_word_list = corpus_word_list(news_text_words, n)  # retrieve from novel
         search_str = ' '.join(corpus_word_list(list(tokens), n))
@@ -75,7 +90,7 @@ def run_algorithms(n=100, m=5, corpus="random"):
     before_syn_num = len(patterns)
     print("Number of patterns before getting synonyms: ", before_syn_num)
     print(patterns)
-    patterns = get_all_patterns(patterns)
+    patterns = get_all_patterns(patterns, SYNONYM_TABLE)
     print(
         f"{len(patterns) - before_syn_num} synonym patterns were added.\nTotally {len(patterns)} are going to be searched for.")
     print(patterns)
@@ -84,24 +99,54 @@ def run_algorithms(n=100, m=5, corpus="random"):
     print("-" * 20)
     print("\n\n\nBenchmarking COMMENTZ-WALTER")
     print("search string:", search_str)
-    METRICS['cw'].append(test_commentz_walter(search_str, patterns)[0])
-    THEORETICAL_METRICS['cw'].append((len(search_str) * len(max(patterns, key=len))) / 1000)  # O(mn)
+    METRICS['cw'].append(test_commentz_walter(search_str, patterns, cache=AUTOMATON_CACHE)[0])
+    record_samples('cw', corpus, n, m, 'total', [METRICS['cw'][-1]])
+    OPERATION_METRICS['cw'].append(count_operations('cw', search_str, patterns))
 
     print("-" * 20)
     print("\n\n\nBenchmarking AHO-CORASICK")
     print("search string:", search_str)
-    ac_metrics = test_aho_corasick(search_str, patterns)
+    ac_metrics = test_aho_corasick(search_str, patterns, cache=AUTOMATON_CACHE)
     METRICS['ac'].append(ac_metrics[0])
-    THEORETICAL_METRICS['ac'].append((
-                                             len(search_str) + ac_metrics[0] + sum(
-                                         len(pattern) for pattern in patterns)) / 1000)  # O(n + m + k)
+    record_samples('ac', corpus, n, m, 'total', [METRICS['ac'][-1]])
+    OPERATION_METRICS['ac'].append(count_operations('ac', search_str, patterns))
 
     print("-" * 20)
     print("\n\n\nBenchmarking RABIN-KARP")
     print("search string:", search_str)
-    METRICS['rk'].append(test_rabin_karp(search_str, patterns)[0])
+    METRICS['rk'].append(test_rabin_karp(search_str, patterns, cache=AUTOMATON_CACHE)[0])
+    record_samples('rk', corpus, n, m, 'total', [METRICS['rk'][-1]])
+    print("-" * 20)
+    OPERATION_METRICS['rk'].append(count_operations('rk', search_str, patterns))
+
+    print("\n\n\nBenchmarking WU-MANBER")
+    print("search string:", search_str)
+    METRICS['wm'].append(test_wu_manber(search_str, patterns, cache=AUTOMATON_CACHE)[0])
+    record_samples('wm', corpus, n, m, 'total', [METRICS['wm'][-1]])
     print("-" * 20)
-    THEORETICAL_METRICS['rk'].append((len(search_str)*m + len(min(patterns, key=len))) / 1000)  # O(nm + k)
+    OPERATION_METRICS['wm'].append(count_operations('wm', search_str, patterns))
+    report_auto_choice(search_str, patterns)
+
+
+def report_auto_choice(search_str, patterns):
+    """
+    Print the engine the auto engine's cost model picks for this run next to the engine measured fastest
+    """
+    choice, predictions = AutoEngine(patterns).choose(len(search_str))
+    fastest = min(METRICS, key=lambda engine: METRICS[engine][-1])
+    print(f"Auto engine picks {ALG_DICT.get(choice, choice)} (predicted {predictions[choice]:.3f} ms),"
+          f" measured fastest is {ALG_DICT[fastest]} ({METRICS[fastest][-1]:.3f} ms)")
+
+
+def count_operations(engine, search_str, patterns):
+    """
+    Repeat the search of an engine with its operation counters on, outside of the timed region,
+     and return the no of operations in thousands
+     """
+    stats = SearchStats()
+    AUTOMATON_CACHE.get(engine, patterns).find_all_matches(search_str, stats)
+    print("Operations:", stats)
+    return stats.operations() / 1000
 
 
 def clean_text(tokens):
@@ -117,7 +162,7 @@ def clean_text(tokens):
     # only include words that have alphabets
     cleaned_words = [word for word in stripped if word.isalpha()]
     # remove stop words
-    stop_words = set(stopwords.words('english'))
+    stop_words = set(nltk_corpus('stopwords').words('english'))
     cleaned_words = [w for w in cleaned_words if not w in stop_words]
     return cleaned_words
 
@@ -127,16 +172,19 @@ def plot_metrics(random_label='Random words', csv_name='result'):
     Plot a multiline graph using metrics for each algorithm on all input sizes,
      and export the graph to an output file
      """
+    import matplotlib.pyplot as plt
+
     write_results_csv(csv_name)
     plt.plot(INSTANCE_SIZES, METRICS['cw'], '-o', label="Commentz-Walter", color="chocolate")
     plt.plot(INSTANCE_SIZES, METRICS['ac'], '-o', label="Aho-Corasick", color="green")
     plt.plot(INSTANCE_SIZES, METRICS['rk'], '-o', label="Rabin-Karp", color="blue")
+    plt.plot(INSTANCE_SIZES, METRICS['wm'], '-o', label="Wu-Manber", color="purple")
     plt.xlim(0, INSTANCE_SIZES[-1])
-    y_limit = int(max(max(METRICS['cw']), max(METRICS['ac']), max(METRICS['rk'])))
+    y_limit = int(max(max(METRICS['cw']), max(METRICS['ac']), max(METRICS['rk']), max(METRICS['wm'])))
     plt.ylim(0, y_limit)
     plt.xticks(range(0, INSTANCE_SIZES[-1] + 2000, 1000))
     plt.yticks(range(0, y_limit + 20, 20))
-    plt.title(f"({random_label}) Running times of Commentz-Walter, Aho-Corasick and Rabin-Karp")
+    plt.title(f"({random_label}) Running times of Commentz-Walter, Aho-Corasick, Rabin-Karp and Wu-Manber")
     plt.xlabel('Corpus size (in number of words)')
     plt.ylabel('Time (in milliseconds)')
     plt.legend(loc='best')
@@ -165,20 +213,24 @@ def reset_metrics():
     METRICS = {
         'cw': [],
         'ac': [],
-        'rk': []
+        'rk': [],
+        'wm': []
     }
 
 
 def plot_comparison_metrics(alg):
+    import matplotlib.pyplot as plt
+
     plt.plot(INSTANCE_SIZES, METRICS[alg], '-o', label=f"Experimental {ALG_DICT[alg]}", color="blue")
-    plt.plot(INSTANCE_SIZES, THEORETICAL_METRICS[alg], '--bo', label=f"Theoretical {ALG_DICT[alg]}", color="red")
+    plt.plot(INSTANCE_SIZES, OPERATION_METRICS[alg], '--bo', label=f"Measured operations (thousands) {ALG_DICT[alg]}",
+             color="red")
     plt.xlim(0, INSTANCE_SIZES[-1])
-    y_limit = int(max(max(METRICS[alg]), max(THEORETICAL_METRICS[alg])))
+    y_limit = int(max(max(METRICS[alg]), max(OPERATION_METRICS[alg])))
     plt.ylim(0, y_limit)
     plt.xticks(range(0, INSTANCE_SIZES[-1] + 2000, 1000))
     if alg == 'ac':
         plt.yticks(range(0, y_limit + 20, 20))
-    plt.title(f"{ALG_DICT[alg]} Theoretical guarantee vs Experimental running time")
+    plt.title(f"{ALG_DICT[alg]} Measured operations vs Experimental running time")
     plt.xlabel('Corpus size (in number of words)')
     plt.ylabel('Time (in milliseconds)')
     plt.legend(loc='best')
@@ -196,6 +248,7 @@ if __name__ == "__main__":
     plot_comparison_metrics('ac')
     plot_comparison_metrics('cw')
     plot_comparison_metrics('rk')
+    plot_comparison_metrics('wm')
     # on an excerpt from a novel
     # reset metrics
 
@@ -214,3 +267,5 @@ if __name__ == "__main__":
     for instance_size in INSTANCE_SIZES:
         run_algorithms(corpus="webtext", n=instance_size)
     plot_metrics(random_label='Webtext corpus', csv_name='real_sources_webtext_results')
+    # trends of every corpus over the runs recorded in the benchmark history
+    plot_trends(phase='total')
@@ -0,0 +1,76 @@
+from case_fold import fold_word
+
+# overlapping reports every match, the leftmost kinds report non-overlapping matches chosen from left to right,
+# preferring the longest pattern (leftmost-longest) or the pattern added first (leftmost-first) at a position
+MATCH_KINDS = ('overlapping', 'leftmost-longest', 'leftmost-first')
+
+
+class WordLetters(dict):
+    """
+    letter -> True when the letter can be part of a word, filled the first time a letter is read
+    """
+
+    def __missing__(self, letter):
+        is_word_letter = letter.isalnum() or letter == '_'
+        self[letter] = is_word_letter
+        return is_word_letter
+
+
+# shared by every search, it holds at most one entry per distinct letter ever read
+WORD_LETTERS = WordLetters()
+
+
+def check_match_kind(match_kind):
+    """
+    raise a ValueError for an unknown match kind
+    """
+    if match_kind not in MATCH_KINDS:
+        raise ValueError(f"unknown match kind {match_kind}, expected one of {'|'.join(MATCH_KINDS)}")
+
+
+def starts_word(text, start):
+    """
+    return True when no word letter precedes position start of the text
+    """
+    return start == 0 or not WORD_LETTERS[text[start - 1]]
+
+
+def ends_word(text, end):
+    """
+    return True when no word letter follows a match ending before position end of the text
+    """
+    return end >= len(text) or not WORD_LETTERS[text[end]]
+
+
+def match_ranks(words, match_kind, priorities):
+    """
+    return the rank of each pattern id, the highest rank wins among matches starting at the same position,
+    priorities maps a word to the order it was added in, words missing from it rank after the others
+    """
+    if match_kind == 'leftmost-longest':
+        return [len(word) for word in words]
+    return [-priorities.get(word, len(priorities) + pattern_id) for pattern_id, word in enumerate(words)]
+
+
+def pattern_priorities(patterns):
+    """
+    return the order each lower case pattern was first added in, which decides between leftmost-first matches
+    """
+    priorities = {}
+    for pattern in patterns:
+        priorities.setdefault(fold_word(pattern), len(priorities))
+    return priorities
+
+
+def select_leftmost(found, lengths, ranks):
+    """
+    return the non-overlapping (start, pattern id) matches chosen from left to right among found,
+    at a position the match of the highest rank wins
+    """
+    selected = []
+    next_start = 0
+    for start, pattern_id in sorted(found, key=lambda match: (match[0], -ranks[match[1]])):
+        if start >= next_start:
+            selected.append((start, pattern_id))
+            next_start = start + lengths[pattern_id]
+    return selected
@@ -0,0 +1,358 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from automaton_cache import build_automaton
+from automaton_store import load_automaton, save_automaton
+from parallel import document_search
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# a batch is sent to the pool once it holds this many searches or its first search waited this many seconds
+MAX_BATCH_SIZE = 64
+MAX_BATCH_DELAY = 0.002
+
+# no of latencies kept per automaton for the stats request
+LATENCY_WINDOW = 1000
+
+# engines whose automata can be saved and mapped by the worker processes
+ENGINES = ('ac', 'cw')
+
+# (path of the saved file, automaton) mapped by a worker process for each name,
+# so a reloaded automaton replaces the one it was loaded over
+_worker_automata = {}
+
+
+def build_and_save(engine, patterns, path):
+    """
+    build the automaton of an engine (ac|cw) for the patterns and save it to path
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"unknown engine {engine}, expected one of {'|'.join(ENGINES)}")
+    save_automaton(build_automaton(engine, patterns), path)
+    return path
+
+
+def search_saved(name, path, texts, sink):
+    """
+    search texts with the automaton saved at path, which is mapped once per worker process
+    and kept under its name until the name is reloaded
+    """
+    saved_path, automaton = _worker_automata.get(name, (None, None))
+    if saved_path != path:
+        automaton = load_automaton(path)
+        _worker_automata[name] = (path, automaton)
+    search = document_search(automaton, sink)
+    return [search(text) for text in texts]
+
+
+def json_result(result):
+    """
+    return a json serializable form of a search result, id arrays become lists
+    """
+    return result.tolist() if hasattr(result, 'tolist') else result
+
+
+class MatchServer:
+    """
+    Asyncio server keeping named automata saved to memory-mappable files that every worker of a process pool
+    maps once, concurrent searches are grouped into micro-batches before they are sent to the pool.
+    Requests and responses are json objects, one per line:
+        {"op": "load", "name": ..., "engine": "ac"|"cw", "patterns": [...]} or {"op": "load", "name": ..., "path": ...}
+        {"op": "search", "name": ..., "text": ..., "sink": null|"ids"|"count"|"exists"}
+        {"op": "list"} and {"op": "stats"}
+    each response echoes the request's "id" and reports its latency in milliseconds
+    """
+
+    def __init__(self, workers=None, directory=None, max_batch_size=MAX_BATCH_SIZE, max_batch_delay=MAX_BATCH_DELAY):
+        """
+        workers=0 searches on a single thread of the server process instead of a process pool
+        """
+        # a temporary directory is removed on close, a given one is left to its owner
+        self.owns_directory = directory is None
+        self.directory = directory or tempfile.mkdtemp(prefix='match_server_')
+        if workers == 0:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+        else:
+            self.executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+        # name -> path of the saved automaton, a reload saves a new file so workers never see a stale one
+        self.automata = {}
+        self.versions = 0
+        self.latencies = {}
+        self.queue = None
+        self.batcher = None
+        # batches running in the pool, referenced until they are done so they are not garbage collected
+        self.batches = set()
+
+    async def load(self, name, engine=None, patterns=None, path=None):
+        """
+        make an automaton searchable under name, built from patterns in the pool or read from a saved file
+        """
+        if path is None:
+            self.versions += 1
+            path = os.path.join(self.directory, f"{self.versions}.mpsa")
+            await asyncio.get_running_loop().run_in_executor(self.executor, build_and_save, engine, patterns, path)
+        elif not os.path.exists(path):
+            raise ValueError(f"no saved automaton at {path}")
+        self.automata[name] = path
+        self.latencies.setdefault(name, deque(maxlen=LATENCY_WINDOW))
+
+    async def search(self, name, text, sink=None):
+        """
+        queue a search for the next micro-batch and wait for its result
+        """
+        if name not in self.automata:
+            raise ValueError(f"no automaton named {name}")
+        if self.batcher is None:
+            self.queue = asyncio.Queue()
+            self.batcher = asyncio.ensure_future(self.batch_searches())
+        result = asyncio.get_running_loop().create_future()
+        await self.queue.put((name, self.automata[name], sink, text, result))
+        return await result
+
+    async def batch_searches(self):
+        """
+        collect queued searches into batches of at most max_batch_size searches or max_batch_delay seconds,
+        each batch is run in the pool without waiting for the previous one
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_batch_delay
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # searches of a batch are grouped by automaton and sink
+            groups = {}
+            for name, path, sink, text, result in batch:
+                groups.setdefault((name, path, sink), []).append((text, result))
+            for (name, path, sink), searches in groups.items():
+                task = asyncio.ensure_future(self.run_batch(name, path, sink, searches))
+                self.batches.add(task)
+                task.add_done_callback(self.batches.discard)
+
+    async def run_batch(self, name, path, sink, searches):
+        """
+        search a batch of texts with one automaton in the pool and resolve the future of each search
+        """
+        texts = [text for text, _ in searches]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, search_saved, name, path, texts, sink)
+        except Exception as error:
+            for _, result in searches:
+                if not result.done():
+                    result.set_exception(error)
+            return
+        for (_, result), matches in zip(searches, results):
+            if not result.done():
+                result.set_result(matches)
+
+    def stats(self):
+        """
+        return the no of searches and their median and p99 latency in milliseconds for every automaton
+        """
+        stats = {}
+        for name, latencies in self.latencies.items():
+            ordered = sorted(latencies)
+            stats[name] = {
+                'searches': len(ordered),
+                'median_ms': ordered[len(ordered) // 2] if ordered else None,
+                'p99_ms': ordered[min(int(len(ordered) * 0.99), len(ordered) - 1)] if ordered else None,
+            }
+        return stats
+
+    async def handle_request(self, request, received_at):
+        """
+        run one request and return its response
+        """
+        op = request.get('op')
+        response = {'id': request.get('id')}
+        try:
+            if op == 'load':
+                await self.load(request['name'], request.get('engine', 'ac'), request.get('patterns'),
+                                request.get('path'))
+            elif op == 'search':
+                response['result'] = json_result(
+                    await self.search(request['name'], request['text'], request.get('sink')))
+            elif op == 'list':
+                response['result'] = sorted(self.automata)
+            elif op == 'stats':
+                response['result'] = self.stats()
+            else:
+                raise ValueError(f"unknown op {op}, expected one of load|search|list|stats")
+        except Exception as error:
+            # the error is reported to the client instead of leaving it waiting for a response
+            response['error'] = f"{type(error).__name__}: {error}"
+        response['latency_ms'] = (time.perf_counter() - received_at) * 10 ** 3
+        if op == 'search' and 'error' not in response:
+            self.latencies[request['name']].append(response['latency_ms'])
+        return response
+
+    async def handle_connection(self, reader, writer):
+        """
+        read requests line by line and write each response as soon as it is ready,
+        so a client can stream requests without waiting for the previous responses
+        """
+        write_lock = asyncio.Lock()
+        pending = set()
+
+        async def respond(request, received_at):
+            response = await self.handle_request(request, received_at)
+            async with write_lock:
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            received_at = time.perf_counter()
+            try:
+                request = json.loads(line)
+            except ValueError:
+                request = {'op': None}
+            task = asyncio.ensure_future(respond(request, received_at))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+
+        if pending:
+            await asyncio.gather(*pending)
+        writer.close()
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """
+        start listening and return the asyncio server
+        """
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self):
+        """
+        stop the batcher and the pool, and remove the temporary directory of the saved automata
+        """
+        if self.batcher is not None:
+            self.batcher.cancel()
+        for task in self.batches:
+            task.cancel()
+        self.executor.shutdown()
+        if self.owns_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def start_background_server(host=DEFAULT_HOST, port=0, **options):
+    """
+    run a MatchServer on an event loop in a daemon thread, return (port it listens on, function stopping it)
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    match_server = MatchServer(**options)
+    server = asyncio.run_coroutine_threadsafe(match_server.start(host, port), loop).result()
+
+    def stop():
+        async def shutdown():
+            server.close()
+            await server.wait_closed()
+            match_server.close()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+    return server.sockets[0].getsockname()[1], stop
+
+
+class MatchClient:
+    """
+    Blocking client of a MatchServer, requests sent together are pipelined over one connection
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.connection = socket.create_connection((host, port))
+        self.reader = self.connection.makefile('rb')
+        self.next_id = 0
+
+    def call_many(self, requests):
+        """
+        send every request before reading the responses, return the responses in the order of the requests
+        """
+        ids = []
+        lines = []
+        for request in requests:
+            self.next_id += 1
+            ids.append(self.next_id)
+            lines.append(json.dumps(dict(request, id=self.next_id)).encode('utf-8') + b'\n')
+        self.connection.sendall(b''.join(lines))
+        responses = {}
+        while len(responses) < len(ids):
+            response = json.loads(self.reader.readline())
+            responses[response['id']] = response
+        return [responses[request_id] for request_id in ids]
+
+    def call(self, op, **fields):
+        """
+        send one request and return its response
+        """
+        return self.call_many([dict(fields, op=op)])[0]
+
+    def close(self):
+        self.reader.close()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def parse_load(value):
+    """
+    parse NAME=ENGINE:PATTERNS_FILE (one pattern per line) or NAME=PATH of a saved automaton
+    """
+    name, _, source = value.partition('=')
+    engine, _, patterns_path = source.partition(':')
+    if engine in ENGINES and patterns_path:
+        with open(patterns_path) as f:
+            return {'name': name, 'engine': engine, 'patterns': [line.strip() for line in f if line.strip()]}
+    return {'name': name, 'path': source}
+
+
+async def serve(host, port, workers, loads):
+    match_server = MatchServer(workers)
+    for load in loads:
+        await match_server.load(**load)
+    server = await match_server.start(host, port)
+    print(f"Serving {len(match_server.automata)} automata on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve prebuilt automata to local clients")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--load', type=parse_load, action='append', default=[],
+                        help="NAME=ENGINE:PATTERNS_FILE or NAME=SAVED_AUTOMATON_PATH")
+    args = parser.parse_args(argv)
+    asyncio.run(serve(args.host, args.port, args.workers, args.load))
+
+
+if __name__ == "__main__":
+    main()
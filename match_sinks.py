@@ -0,0 +1,104 @@
+from array import array
+
+
+class StopSearch(Exception):
+    """
+    Raised by a sink to end a search early, the search then returns the sink's result
+    """
+
+
+class MatchSink:
+    """
+    Receives the matches of an engine's search(text, sink) as (pattern id, offset) pairs,
+    a pattern id indexes the automaton's words (patterns for Rabin-Karp)
+    """
+
+    def add(self, pattern_id, position):
+        """
+        receive one match, raise StopSearch to end the search
+        """
+        raise NotImplementedError
+
+    def result(self):
+        """
+        return what the search returns once the text is searched or the search was stopped
+        """
+        raise NotImplementedError
+
+
+class IdArraySink(MatchSink):
+    """
+    Keeps the matches in one array('q') of pattern id, offset pairs instead of a tuple per match
+    """
+
+    def __init__(self):
+        self.pairs = array('q')
+
+    def add(self, pattern_id, position):
+        self.pairs.append(pattern_id)
+        self.pairs.append(position)
+
+    def result(self):
+        return self.pairs
+
+
+class CountSink(MatchSink):
+    """
+    Only counts the matches
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def add(self, pattern_id, position):
+        self.count += 1
+
+    def result(self):
+        return self.count
+
+
+class ExistsSink(MatchSink):
+    """
+    Stops the search at the first match and tells whether there was one
+    """
+
+    def __init__(self):
+        self.found = False
+
+    def add(self, pattern_id, position):
+        self.found = True
+        raise StopSearch
+
+    def result(self):
+        return self.found
+
+
+# sinks selected by name
+SINKS = {
+    'ids': IdArraySink,
+    'count': CountSink,
+    'exists': ExistsSink,
+}
+
+
+def sink_factory(sink):
+    """
+    return a function building a fresh sink for every search given one of the names ids|count|exists,
+    a MatchSink class or a function returning a MatchSink, an instance is rejected as every search would share it
+    """
+    if isinstance(sink, MatchSink):
+        raise TypeError("a sink instance would collect the matches of every search, pass its class or a name")
+    if isinstance(sink, str):
+        if sink not in SINKS:
+            raise ValueError(f"unknown sink {sink}, expected one of {'|'.join(SINKS)} or a MatchSink class")
+        return SINKS[sink]
+    if not callable(sink):
+        raise TypeError(f"expected a sink name, a MatchSink class or a function returning one, got {sink!r}")
+    return sink
+
+
+def pairs_to_matches(pairs, words):
+    """
+    return the (word, offset) matches of an array of pattern id, offset pairs
+    """
+    return [(words[pairs[index]], pairs[index + 1]) for index in range(0, len(pairs), 2)]
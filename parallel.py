@@ -0,0 +1,170 @@
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+from automaton_cache import build_automaton
+from match_sinks import sink_factory
+
+# search function of the automaton built once in each worker process
+_worker_search = None
+
+# no of documents handed to a worker at a time
+BATCH_SIZE = 256
+
+# no of batches each worker may have queued before search_many stops reading documents
+BATCHES_PER_WORKER = 2
+
+
+def build_search(engine, patterns):
+    """
+    build the automaton of an engine (ac|cw|rk|wm) for the patterns and return a function that searches a text
+    """
+    return build_automaton(engine, patterns).find_all_matches
+
+
+def document_search(automaton, sink=None):
+    """
+    return a function searching one document with an automaton, returning its list of (word, position) matches
+    or the result of a fresh match_sinks sink per document when sink is given, see match_sinks.sink_factory
+    """
+    if sink is None:
+        return lambda document: list(automaton.find_all_matches(document))
+    new_sink = sink_factory(sink)
+    return lambda document: automaton.search(document, new_sink())
+
+
+def match_order(engine):
+    """
+    return the sort key that puts (word, position) matches in the order the serial search of an engine emits them
+    """
+    if engine == 'ac':
+        # by end position, longest match of a node first followed by its dictionary links
+        return lambda match: (match[1] + len(match[0]), -len(match[0]))
+    if engine == 'cw':
+        # by end position, the window is compared right to left so shorter matches come first
+        return lambda match: (match[1] + len(match[0]), len(match[0]))
+    # rabin karp and wu manber report matches by position, a stable sort keeps the pattern order of a position
+    return lambda match: match[1]
+
+
+def init_worker(engine, patterns):
+    """
+    build the automaton once per worker process
+    """
+    global _worker_search
+    _worker_search = build_search(engine, patterns)
+
+
+def init_document_worker(engine, patterns, sink):
+    """
+    build the automaton once per worker process to search whole documents
+    """
+    global _worker_search
+    _worker_search = document_search(build_automaton(engine, patterns), sink)
+
+
+def search_documents(search, documents):
+    """
+    search a batch of documents, returning one result per document
+    """
+    return [search(document) for document in documents]
+
+
+def search_batch(documents):
+    """
+    search a batch of documents with the automaton of a worker process
+    """
+    return search_documents(_worker_search, documents)
+
+
+def search_shard(shard_start, owned_size, shard_text):
+    """
+    search a shard and keep the matches starting in the part of the shard it owns,
+    matches starting in the overlap belong to the next shard
+    """
+    return [(word, shard_start + position) for word, position in _worker_search(shard_text)
+            if position < owned_size]
+
+
+def split_shards(text_size, shards, overlap):
+    """
+    return (start, owned size, end) of each shard, where consecutive shards overlap by overlap letters
+    """
+    owned_size = -(-text_size // shards)
+    return [(start, min(owned_size, text_size - start), min(start + owned_size + overlap, text_size))
+            for start in range(0, text_size, owned_size)]
+
+
+def parallel_find_all_matches(text, patterns, engine='ac', shards=None, workers=None):
+    """
+    split text into shards that overlap by (longest pattern - 1) letters, search them with an engine (ac|cw|rk|wm)
+    in a process pool and merge the matches into the order of the serial search
+    """
+    workers = workers or os.cpu_count()
+    shards = shards or workers
+    overlap = len(max(patterns, key=len)) - 1
+    if shards <= 1 or len(text) <= shards * (overlap + 1):
+        return list(build_search(engine, patterns)(text))
+
+    substring_matches = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(engine, patterns)) as executor:
+        futures = [executor.submit(search_shard, start, owned_size, text[start:end])
+                   for start, owned_size, end in split_shards(len(text), shards, overlap)]
+        for future in futures:
+            substring_matches.extend(future.result())
+
+    substring_matches.sort(key=match_order(engine))
+    return substring_matches
+
+
+def gil_disabled():
+    """
+    return True when running on a free-threaded python build with the GIL disabled
+    """
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def search_many(documents, patterns, engine='ac', workers=None, batch_size=BATCH_SIZE, sink=None, use_threads=None):
+    """
+    lazily yield the result of searching each document of an iterable with one automaton per worker, in input order,
+    documents are read in batches and only BATCHES_PER_WORKER batches per worker are queued at a time,
+    a thread pool sharing one automaton is used on free-threaded builds unless use_threads says otherwise,
+    sink is a sink name, a MatchSink class or a function returning a MatchSink, as every document gets a fresh sink
+    """
+    if sink is not None:
+        # raise for a sink instance before any worker is started
+        sink_factory(sink)
+    workers = workers or os.cpu_count()
+    documents = iter(documents)
+    if workers <= 1:
+        search = document_search(build_automaton(engine, patterns), sink)
+        for document in documents:
+            yield search(document)
+        return
+
+    if use_threads is None:
+        use_threads = gil_disabled()
+    if use_threads:
+        search = document_search(build_automaton(engine, patterns), sink)
+        executor = ThreadPoolExecutor(max_workers=workers)
+        submit_batch = lambda batch: executor.submit(search_documents, search, batch)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_document_worker,
+                                       initargs=(engine, patterns, sink))
+        submit_batch = lambda batch: executor.submit(search_batch, batch)
+
+    with executor:
+        pending = deque()
+        while True:
+            batch = list(islice(documents, batch_size))
+            if batch:
+                pending.append(submit_batch(batch))
+            # wait for the oldest batch once enough are queued, or drain them when the documents run out
+            while pending and (not batch or len(pending) >= workers * BATCHES_PER_WORKER):
+                yield from pending.popleft().result()
+            if not batch:
+                return
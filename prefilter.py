@@ -0,0 +1,179 @@
+import itertools
+from collections import Counter, deque
+
+from bytes_mode import ASCII_LOWER, as_byte_view
+from case_fold import CASE_FOLD, case_variants, fold_word
+
+# the letter and bigram frequencies of a text are estimated from this many evenly spaced samples of this many letters
+PROFILE_SAMPLES = 8
+PROFILE_SAMPLE_SIZE = 8192
+
+# most case variants of the anchors searched with find, each is one pass over the text
+MAX_ANCHOR_VARIANTS = 32
+
+# the automaton's search of each window costs about as much as reading this many more letters
+REGION_COST = 64
+
+# estimated and actual letters read in the windows, as a share of the text, above which the whole text is searched
+MAX_COVERAGE = 0.5
+
+
+def text_profile(text, is_bytes=False):
+    """
+    return (Counter of case folded letters and bigrams, no of letters sampled) over evenly spaced samples of a text,
+    bytes are returned as one letter bytes objects
+    """
+    step = max(len(text) // PROFILE_SAMPLES, PROFILE_SAMPLE_SIZE)
+    profile = Counter()
+    sampled = 0
+    for start in range(0, len(text), step):
+        sample = text[start: start + PROFILE_SAMPLE_SIZE]
+        if is_bytes:
+            sample = sample.tobytes().translate(ASCII_LOWER).decode('latin-1')
+        # Counter counts the letters and the pairs of consecutive letters in C
+        counts = Counter(sample)
+        counts.update(map(''.join, zip(sample, sample[1:])))
+        profile.update(counts)
+        sampled += len(sample)
+    if not is_bytes:
+        folded = Counter()
+        for anchor, count in profile.items():
+            folded[''.join(map(CASE_FOLD.__getitem__, anchor))] += count
+        profile = folded
+    return profile, sampled
+
+
+def anchor_variants(anchor, is_bytes=False):
+    """
+    return every spelling of an anchor in the text that folds to it
+    """
+    if is_bytes:
+        # only ascii letters are folded in bytes
+        letters = [{anchor[i: i + 1], anchor[i: i + 1].upper()} for i in range(len(anchor))]
+        return [b''.join(variant) for variant in itertools.product(*letters)]
+    return [''.join(variant) for variant in itertools.product(*map(case_variants, anchor))]
+
+
+class Prefilter:
+    """
+    Optional stage before an automaton's search: the rarest letter or bigram of every pattern in a frequency profile
+    of the text is picked as its anchor, the anchors are found with the C speed str.find or bytes.find and the
+    automaton only reads the windows around them that can hold a match, matches are those of the automaton
+    searching the whole text, in the same order
+    """
+
+    def __init__(self, automaton, patterns=None):
+        """
+        patterns default to the automaton's words, read from the trie of an AhoCorasick that is not compiled
+        """
+        if patterns is None:
+            patterns = getattr(automaton, 'words', None)
+        if patterns is None and hasattr(automaton, 'trie_words'):
+            patterns = automaton.trie_words()
+        if patterns is None:
+            raise ValueError("the automaton has no words yet, build it before it is prefiltered")
+        self.automaton = automaton
+        self.patterns = [fold_word(pattern) for pattern in patterns]
+
+    def anchors(self, text, is_bytes=False):
+        """
+        return {anchor: (letters a match can start before it, letters a match can end after it)},
+        None when the anchors are too frequent for the prefilter to pay off
+        """
+        if not self.patterns or not len(text):
+            return None
+        profile, sampled = text_profile(text, is_bytes)
+        anchors = {}
+        coverage = 0.0
+        for pattern in self.patterns:
+            folded = pattern.decode('latin-1') if is_bytes else pattern
+            candidates = [(offset, folded[offset: offset + 1]) for offset in range(len(folded))]
+            candidates += [(offset, folded[offset: offset + 2]) for offset in range(len(folded) - 1)]
+            if is_bytes:
+                candidates = [(offset, anchor.encode('latin-1')) for offset, anchor in candidates]
+            # among equally rare anchors the one with the fewest case variants takes the fewest finds
+            offset, anchor = min(candidates, key=lambda candidate: (
+                profile[candidate[1].decode('latin-1') if is_bytes else candidate[1]],
+                len(anchor_variants(candidate[1], is_bytes))))
+            before, after = anchors.get(anchor, (0, 0))
+            anchors[anchor] = (max(before, offset), max(after, len(folded) - offset))
+        for anchor, (before, after) in anchors.items():
+            key = anchor.decode('latin-1') if is_bytes else anchor
+            coverage += profile[key] / sampled * (before + after + REGION_COST)
+        variants = sum(len(anchor_variants(anchor, is_bytes)) for anchor in anchors)
+        if variants > MAX_ANCHOR_VARIANTS or coverage > MAX_COVERAGE:
+            return None
+        return anchors
+
+    def regions(self, text, is_bytes=False, haystack=None):
+        """
+        return the sorted, disjoint [start, end] windows of a text that can hold a match,
+        None when the whole text should be searched, the anchors are found in haystack (defaults to text)
+        which must have a find method when text is a memoryview of bytes
+        """
+        anchors = self.anchors(text, is_bytes)
+        if anchors is None:
+            return None
+        haystack = text if haystack is None else haystack
+        find = haystack.find
+        size = len(text)
+        windows = []
+        for anchor, (before, after) in anchors.items():
+            for variant in anchor_variants(anchor, is_bytes):
+                position = find(variant)
+                while position != -1:
+                    windows.append((max(position - before, 0), min(position + after, size)))
+                    position = find(variant, position + 1)
+
+        windows.sort()
+        regions = []
+        covered = 0
+        for start, end in windows:
+            if regions and start <= regions[-1][1]:
+                if end > regions[-1][1]:
+                    covered += end - regions[-1][1]
+                    regions[-1][1] = end
+            else:
+                regions.append([start, end])
+                covered += end - start
+        if covered + len(regions) * REGION_COST > size * MAX_COVERAGE:
+            return None
+        return regions
+
+    def find_all_matches(self, text, stats=None):
+        """
+        finds and returns the (matched text, position) matches of the automaton, which only reads the regions
+        around the anchors, operations are counted into stats when a search_stats.SearchStats is given
+        """
+        regions = self.regions(text)
+        if stats is not None:
+            stats.note(prefilter_regions=None if regions is None else len(regions),
+                       prefilter_letters=len(text) if regions is None else sum(end - start for start, end in regions))
+        if regions is None:
+            return self.automaton.find_all_matches(text, stats)
+        substring_matches = deque()
+        for start, end in regions:
+            substring_matches.extend((word, position + start)
+                                     for word, position in self.automaton.find_all_matches(text[start:end], stats))
+        return substring_matches
+
+    def find_all_matches_bytes(self, buffer, stats=None):
+        """
+        finds and returns the (pattern, byte offset) matches of the automaton in a bytes-like buffer such as an mmap,
+        the patterns must be encoded with bytes_mode.encode_patterns
+        """
+        byte_view = as_byte_view(buffer)
+        # bytes, bytearray and mmap have a C find, other buffers are searched through a bytes copy
+        regions = self.regions(byte_view, True, buffer if hasattr(buffer, 'find') else byte_view.tobytes())
+        if stats is not None:
+            stats.note(prefilter_regions=None if regions is None else len(regions),
+                       prefilter_letters=len(byte_view) if regions is None else
+                       sum(end - start for start, end in regions))
+        if regions is None:
+            return self.automaton.find_all_matches_bytes(byte_view, stats)
+        substring_matches = deque()
+        for start, end in regions:
+            substring_matches.extend(
+                (pattern, position + start)
+                for pattern, position in self.automaton.find_all_matches_bytes(byte_view[start:end], stats))
+        return substring_matches
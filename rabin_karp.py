@@ -1,76 +1,256 @@
 import time
 from collections import deque
 
+from bytes_mode import ASCII_LOWER, as_byte_view
+from case_fold import fold_codes, fold_word, startswith_folded
+from match_semantics import check_match_kind, ends_word, match_ranks, select_leftmost, starts_word
+from match_sinks import StopSearch
+
+# modulus (a mersenne prime below 2**64) and base of the rolling hash
+HASH_MODULUS = (1 << 61) - 1
+HASH_BASE = 257
+
+
+def hash_codes(codes):
+    """
+    calculates and returns the polynomial hash of a sequence of letter codes
+    """
+    total = 0
+    for code in codes:
+        total = (total * HASH_BASE + code) % HASH_MODULUS
+    return total
+
 
 class RabinKarp:
     """
-    class to implement Rabin-Karp Algorithm
+    class to implement a multi-pattern Rabin-Karp Algorithm,
+    patterns are grouped into length buckets [2^b, 2^(b+1)) and each bucket rolls one hash over windows
+    of its shortest length, indexing the patterns by the hash of their prefix of that length
     """
 
-    def __init__(self, pattern, size):
-        self.pattern = pattern
-        self.size = size
-        self.base = 3
-        self.hash = self.hash_pattern()
-        self.start = 0
-        self.end = size
+    def __init__(self):
+        self.patterns = []
+        self.pattern_ids = {}
+        # order the patterns were added in, decides between matches of leftmost-first searches
+        self.priorities = {}
+        # sorted (window size, {prefix hash: [pattern ids]}) pairs, None until create_index is called
+        self.buckets = None
 
-    def hash_pattern(self):
+    def add(self, pattern):
         """
-        calculates and returns the hash value of the given pattern
+        Add the lower case form of a str pattern,
+        or a bytes pattern from bytes_mode.encode_patterns when searching bytes
         """
-        total = 0
-        y = [ord(x) for x in list(self.pattern)]
-        for i in range(self.size):
-            total += y[i] * self.base ** i
-        return total
+        pattern = fold_word(pattern)
+        if not pattern or pattern in self.pattern_ids:
+            return
+        self.pattern_ids[pattern] = len(self.patterns)
+        self.priorities[pattern] = len(self.priorities)
+        self.patterns.append(pattern)
+        self.buckets = None
 
-    def rolling_hash(self):
+    def create_index(self):
         """
-        method to compute the next hash value from the previous hash value
-        helps in reducing the complexity from O(mn) to O(m+n)
-        where m is the size of string to match and n is the size of text
+        build the hash -> candidate pattern ids index of every length bucket
         """
-        if self.end < len(self.pattern):
-            self.hash -= ord(self.pattern[self.start])
-            self.hash = int(self.hash / self.base)
-            self.hash += ord(self.pattern[self.end]) * self.base ** (self.size - 1)
-            self.start += 1
-            self.end += 1
+        buckets = {}
+        for pattern_id, pattern in enumerate(self.patterns):
+            window = 1 << (len(pattern).bit_length() - 1)
+            prefix = pattern[:window]
+            prefix_hash = hash_codes(prefix if isinstance(prefix, bytes) else map(ord, prefix))
+            buckets.setdefault(window, {}).setdefault(prefix_hash, []).append(pattern_id)
+        self.buckets = sorted(buckets.items())
 
+    def window_candidates(self, codes, size):
+        """
+        yield (position, candidate pattern ids) for every window whose hash is in the index,
+        codes is a function returning a fresh iterator over the case folded letter codes of a text of length size
+        """
+        if self.buckets is None:
+            self.create_index()
 
-def string_matching(text, matcher):
-    """
-    finds and returns the substring_matches given a text document and list of patterns to match
-    """
+        for window, index in self.buckets:
+            if size < window:
+                break
+            # weight of the letter leaving the window
+            high_weight = pow(HASH_BASE, window - 1, HASH_MODULUS)
+            entering = codes()
+            text_hash = 0
+            for _ in range(window):
+                text_hash = (text_hash * HASH_BASE + next(entering)) % HASH_MODULUS
 
-    substring_matches = deque()
-    matcher_set = dict()
+            candidates = index.get(text_hash)
+            if candidates is not None:
+                yield 0, candidates
+            # helps in reducing the complexity from O(mn) to O(m+n)
+            for position, (old, new) in enumerate(zip(codes(), entering), 1):
+                text_hash = ((text_hash - old * high_weight) * HASH_BASE + new) % HASH_MODULUS
+                candidates = index.get(text_hash)
+                if candidates is not None:
+                    yield position, candidates
 
-    # stores length of the pattern. length of all the patterns should be same
-    m = min([len(x) for x in matcher])
+    def window_count(self, size):
+        """
+        return no of windows hashed over a text of length size, one per position of every bucket
+        """
+        if self.buckets is None:
+            self.create_index()
+        return sum(size - bucket[0] + 1 for bucket in self.buckets if size >= bucket[0])
+
+    def add_stats(self, stats, size, candidate_windows, match_count):
+        """
+        count the windows hashed, the windows whose hash hit the index, the candidate patterns verified
+        and the verifications that failed, either on a pattern sharing the hashed prefix or on a hash collision
+        """
+        verifications = sum(len(candidates) for _, candidates in candidate_windows)
+        stats.add('rk', windows=self.window_count(size), hash_hits=len(candidate_windows),
+                  verifications=verifications, false_positives=verifications - match_count)
 
-    # to store hash values for each string pattern
-    for sub in matcher:
-        temp = RabinKarp(sub, m)
-        matcher_set[sub] = temp.hash
+    def find_all_matches(self, text, stats=None):
+        """
+        finds and returns the (matched text, position) substring_matches ordered by position and pattern,
+        operations are counted into stats when a search_stats.SearchStats is given
+        """
+        # forcing matches to be case insensitive, letters are folded as they are hashed and verified
+        patterns = self.patterns
+        found = []
+        candidate_windows = self.window_candidates(lambda: fold_codes(text), len(text))
+        if stats is not None:
+            candidate_windows = list(candidate_windows)
+        for position, candidates in candidate_windows:
+            for pattern_id in candidates:
+                if startswith_folded(text, patterns[pattern_id], position):
+                    found.append((position, pattern_id))
 
-    text_obj = RabinKarp(text.lower(), m)
+        if stats is not None:
+            self.add_stats(stats, len(text), candidate_windows, len(found))
+        found.sort()
+        return deque((text[i: i + len(patterns[pattern_id])], i) for i, pattern_id in found)
 
-    # check if the pattern belongs in text
-    for i in range(len(text) - m + 1):
-        if text_obj.hash in matcher_set.values():
-            for pat in matcher:
-                if text[i: i + len(pat)].lower() == pat:
-                    substring_matches.append((text[i: i + len(pat)], i))
-        text_obj.rolling_hash()
+    @property
+    def words(self):
+        """
+        patterns indexed by the pattern ids handed to a sink
+        """
+        return self.patterns
 
-    return substring_matches
+    def text_candidates(self, text):
+        """
+        yield (position, candidate pattern ids) for every window of a str whose case folded hash is in the index
+        """
+        return self.window_candidates(lambda: fold_codes(text), len(text))
 
+    def search(self, text, sink):
+        """
+        Hand every (pattern id, offset) match of the text to a match_sinks sink and return its result,
+        matches are handed over bucket by bucket so they are not ordered by offset
+        """
+        patterns = self.patterns
+        add = sink.add
+        try:
+            for position, candidates in self.text_candidates(text):
+                for pattern_id in candidates:
+                    if startswith_folded(text, patterns[pattern_id], position):
+                        add(pattern_id, position)
+        except StopSearch:
+            pass
+        return sink.result()
 
-def test_rabin_karp(search_str, patterns):
+    def find_matches(self, text, match_kind='overlapping', whole_words=False):
+        """
+        finds and returns the (matched text, position) matches of a match_semantics match kind ordered by position,
+        when whole_words is set a candidate window is only verified if it is bounded by non word letters
+        """
+        check_match_kind(match_kind)
+        patterns = self.patterns
+        found = []
+        for position, candidates in self.text_candidates(text):
+            if whole_words and not starts_word(text, position):
+                continue
+            for pattern_id in candidates:
+                pattern = patterns[pattern_id]
+                if whole_words and not ends_word(text, position + len(pattern)):
+                    continue
+                if startswith_folded(text, pattern, position):
+                    found.append((position, pattern_id))
+
+        found.sort()
+        if match_kind != 'overlapping':
+            found = select_leftmost(found, [len(pattern) for pattern in patterns],
+                                    match_ranks(patterns, match_kind, self.priorities))
+        return deque((text[i: i + len(patterns[pattern_id])], i) for i, pattern_id in found)
+
+    def search_bytes(self, buffer, sink):
+        """
+        Same as search over a bytes-like buffer, reporting byte offsets
+        """
+        byte_view = as_byte_view(buffer)
+        patterns = self.patterns
+        add = sink.add
+        try:
+            for position, candidates in self.window_candidates(lambda: map(ASCII_LOWER.__getitem__, byte_view),
+                                                               len(byte_view)):
+                for pattern_id in candidates:
+                    pattern = patterns[pattern_id]
+                    if bytes(byte_view[position: position + len(pattern)]).translate(ASCII_LOWER) == pattern:
+                        add(pattern_id, position)
+        except StopSearch:
+            pass
+        return sink.result()
+
+    def find_all_matches_bytes(self, buffer, stats=None):
+        """
+        finds and returns the (pattern, byte offset) matches in a bytes-like buffer such as an mmap,
+        the patterns must be encoded with bytes_mode.encode_patterns
+        """
+        byte_view = as_byte_view(buffer)
+        patterns = self.patterns
+        found = []
+        candidate_windows = self.window_candidates(lambda: map(ASCII_LOWER.__getitem__, byte_view), len(byte_view))
+        if stats is not None:
+            candidate_windows = list(candidate_windows)
+        for position, candidates in candidate_windows:
+            for pattern_id in candidates:
+                pattern = patterns[pattern_id]
+                if bytes(byte_view[position: position + len(pattern)]).translate(ASCII_LOWER) == pattern:
+                    found.append((position, pattern_id))
+
+        if stats is not None:
+            self.add_stats(stats, len(byte_view), candidate_windows, len(found))
+        found.sort()
+        return deque((patterns[pattern_id], i) for i, pattern_id in found)
+
+
+def string_matching(text, matcher):
+    """
+    finds and returns the substring_matches given a text document and list of patterns to match
+    """
+    rabin_karp = RabinKarp()
+    for pat in matcher:
+        rabin_karp.add(pat)
+    return rabin_karp.find_all_matches(text)
+
+
+def string_matching_bytes(buffer, matcher):
+    """
+    finds and returns the (pattern, byte offset) matches in a bytes-like buffer such as an mmap,
+    the patterns must be encoded with bytes_mode.encode_patterns
+    """
+    rabin_karp = RabinKarp()
+    for pat in matcher:
+        rabin_karp.add(pat)
+    return rabin_karp.find_all_matches_bytes(buffer)
+
+
+def test_rabin_karp(search_str, patterns, cache=None):
+    """
+    runs rabin karp on the search string, reusing the indexed patterns from cache when it is given
+    """
     start_time = time.perf_counter()
-    match_tuples = string_matching(search_str, patterns)
+    if cache is not None:
+        match_tuples = cache.get('rk', patterns).find_all_matches(search_str)
+    else:
+        match_tuples = string_matching(search_str, patterns)
     end_time = time.perf_counter()
     print(f'\nSearch for multi-patterns in a string of length {len(search_str)}')
     print(f"Matches: {len(match_tuples)} found in {end_time - start_time:0.8f} second(s)")
@@ -0,0 +1,189 @@
+from collections import deque
+
+import numpy as np
+
+from bytes_mode import ASCII_LOWER, as_byte_view
+from case_fold import CASE_FOLD, startswith_folded
+from match_sinks import StopSearch
+from rabin_karp import RabinKarp
+
+# odd base so that it has an inverse modulo 2**64, the hash wraps around like uint64 arithmetic
+VECTOR_HASH_BASE = 1000003
+VECTOR_HASH_MASK = (1 << 64) - 1
+VECTOR_HASH_BASE_INVERSE = pow(VECTOR_HASH_BASE, -1, 1 << 64)
+
+# low bits of a hash used to index the per-length bitmap that prefilters window hashes
+FILTER_BITS = 20
+FILTER_MASK = np.uint64((1 << FILTER_BITS) - 1)
+
+# numpy lookup table that folds ascii upper case bytes to lower case
+ASCII_LOWER_TABLE = np.frombuffer(ASCII_LOWER, dtype=np.uint8)
+
+
+def hash_codes(codes):
+    """
+    calculates and returns sum(code[j] * base^-j) mod 2**64, the hash every window is normalized to
+    """
+    total = 0
+    weight = 1
+    for code in codes:
+        total = (total + code * weight) & VECTOR_HASH_MASK
+        weight = (weight * VECTOR_HASH_BASE_INVERSE) & VECTOR_HASH_MASK
+    return total
+
+
+def folded_codes(text):
+    """
+    return the uint64 array of the lower case code of each letter of a str, ascii letters are folded
+    in one vectorized pass and every distinct other letter is folded once
+    """
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    codes[(codes >= ord('A')) & (codes <= ord('Z'))] += ord('a') - ord('A')
+    non_ascii = np.flatnonzero(codes > 127)
+    if len(non_ascii):
+        letters, inverse = np.unique(codes[non_ascii], return_inverse=True)
+        folded = np.array([ord(CASE_FOLD[chr(letter)]) for letter in letters.tolist()], dtype=np.uint64)
+        codes[non_ascii] = folded[inverse]
+    return codes
+
+
+def powers(base, size):
+    """
+    return the uint64 array [1, base, base^2, ..., base^(size - 1)] mod 2**64
+    """
+    weights = np.full(size, base, dtype=np.uint64)
+    weights[0] = 1
+    return np.cumprod(weights, dtype=np.uint64)
+
+
+class NumpyRabinKarp(RabinKarp):
+    """
+    Rabin-Karp that computes the hash of every window of every pattern length in one vectorized pass
+    using polynomial prefix hashes, only windows whose hash is a pattern hash are verified in python
+    """
+
+    def create_index(self):
+        """
+        build a bitmap over the low hash bits, a sorted array of pattern hashes
+        and a hash -> candidate pattern ids index for every pattern length
+        """
+        lengths = {}
+        for pattern_id, pattern in enumerate(self.patterns):
+            pattern_hash = hash_codes(pattern if isinstance(pattern, bytes) else map(ord, pattern))
+            lengths.setdefault(len(pattern), {}).setdefault(pattern_hash, []).append(pattern_id)
+
+        self.buckets = []
+        for length, index in sorted(lengths.items()):
+            pattern_hashes = np.array(sorted(index), dtype=np.uint64)
+            hash_filter = np.zeros(1 << FILTER_BITS, dtype=np.bool_)
+            hash_filter[pattern_hashes & FILTER_MASK] = True
+            self.buckets.append((length, hash_filter, pattern_hashes, index))
+
+    def window_candidates(self, codes):
+        """
+        yield (position, candidate pattern ids) for every window whose hash is in the index,
+        codes is a uint64 array of the case folded letter codes of the text
+        """
+        if self.buckets is None:
+            self.create_index()
+
+        size = len(codes)
+        if size == 0:
+            return
+        # prefix[i] = sum(code[k] * base^-k for k < i), so a window starting at i normalizes to
+        # (prefix[i + length] - prefix[i]) * base^i
+        prefix = np.zeros(size + 1, dtype=np.uint64)
+        np.cumsum(codes * powers(VECTOR_HASH_BASE_INVERSE, size), dtype=np.uint64, out=prefix[1:])
+        weights = powers(VECTOR_HASH_BASE, size)
+
+        for length, hash_filter, pattern_hashes, index in self.buckets:
+            if size < length:
+                break
+            window_hashes = (prefix[length:] - prefix[:-length]) * weights[:size - length + 1]
+            # the bitmap discards most windows, the survivors are binary searched in the sorted pattern hashes
+            positions = np.flatnonzero(hash_filter[window_hashes & FILTER_MASK])
+            slots = np.searchsorted(pattern_hashes, window_hashes[positions])
+            slots[slots == len(pattern_hashes)] = 0
+            positions = positions[pattern_hashes[slots] == window_hashes[positions]]
+            for position, window_hash in zip(positions.tolist(), window_hashes[positions].tolist()):
+                yield position, index[window_hash]
+
+    def find_all_matches(self, text, stats=None):
+        """
+        finds and returns the (matched text, position) substring_matches ordered by position and pattern,
+        operations are counted into stats when a search_stats.SearchStats is given
+        """
+        # forcing matches to be case insensitive, the codes are folded instead of a lower cased copy of the text
+        patterns = self.patterns
+        found = []
+        candidate_windows = self.window_candidates(folded_codes(text))
+        if stats is not None:
+            candidate_windows = list(candidate_windows)
+        for position, candidates in candidate_windows:
+            for pattern_id in candidates:
+                if startswith_folded(text, patterns[pattern_id], position):
+                    found.append((position, pattern_id))
+
+        if stats is not None:
+            self.add_stats(stats, len(text), candidate_windows, len(found))
+
+        found.sort()
+        return deque((text[i: i + len(patterns[pattern_id])], i) for i, pattern_id in found)
+
+    def find_all_matches_bytes(self, buffer, stats=None):
+        """
+        finds and returns the (pattern, byte offset) matches in a bytes-like buffer such as an mmap,
+        the patterns must be encoded with bytes_mode.encode_patterns
+        """
+        byte_view = as_byte_view(buffer)
+        codes = ASCII_LOWER_TABLE[np.frombuffer(byte_view, dtype=np.uint8)].astype(np.uint64)
+        patterns = self.patterns
+        found = []
+        candidate_windows = self.window_candidates(codes)
+        if stats is not None:
+            candidate_windows = list(candidate_windows)
+        for position, candidates in candidate_windows:
+            for pattern_id in candidates:
+                pattern = patterns[pattern_id]
+                if bytes(byte_view[position: position + len(pattern)]).translate(ASCII_LOWER) == pattern:
+                    found.append((position, pattern_id))
+
+        if stats is not None:
+            self.add_stats(stats, len(byte_view), candidate_windows, len(found))
+
+        found.sort()
+        return deque((patterns[pattern_id], i) for i, pattern_id in found)
+
+    def text_candidates(self, text):
+        """
+        yield (position, candidate pattern ids) for every window of a str whose case folded hash is in the index
+        """
+        return self.window_candidates(folded_codes(text))
+
+    def search_bytes(self, buffer, sink):
+        """
+        Same as search over a bytes-like buffer, reporting byte offsets
+        """
+        byte_view = as_byte_view(buffer)
+        codes = ASCII_LOWER_TABLE[np.frombuffer(byte_view, dtype=np.uint8)].astype(np.uint64)
+        patterns = self.patterns
+        add = sink.add
+        try:
+            for position, candidates in self.window_candidates(codes):
+                for pattern_id in candidates:
+                    pattern = patterns[pattern_id]
+                    if bytes(byte_view[position: position + len(pattern)]).translate(ASCII_LOWER) == pattern:
+                        add(pattern_id, position)
+        except StopSearch:
+            pass
+        return sink.result()
+
+
+def string_matching_numpy(text, matcher):
+    """
+    finds and returns the substring_matches given a text document and list of patterns to match
+    """
+    rabin_karp = NumpyRabinKarp()
+    for pat in matcher:
+        rabin_karp.add(pat)
+    return rabin_karp.find_all_matches(text)
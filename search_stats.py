@@ -0,0 +1,78 @@
+from collections import Counter
+
+# counters whose sum is the no of operations an engine performed, in the units of its hot loop
+OPERATION_COUNTERS = {
+    'ac': ('letters', 'failure_hops', 'outputs', 'dictionary_outputs'),
+    'cw': ('windows', 'comparisons'),
+    'rk': ('windows', 'verifications'),
+    'wm': ('windows', 'verifications'),
+}
+
+
+class SearchStats:
+    """
+    Operation counters of one or more searches, filled by passing an instance as the stats argument of
+    an engine's find_all_matches, searches without it run the uninstrumented loops
+    """
+
+    def __init__(self):
+        self.engine = None
+        self.counters = Counter()
+        # details of a search that are not counters, such as the choice of an auto engine
+        self.details = {}
+
+    def add(self, engine, **counts):
+        """
+        add the counts of a search performed by an engine (ac|cw|rk|wm)
+        """
+        self.engine = engine
+        self.counters.update(counts)
+
+    def note(self, **details):
+        """
+        record details of a search, they are reported by summary next to the counters
+        """
+        self.details.update(details)
+
+    def maximum(self, name, value):
+        """
+        keep the largest value seen for a counter
+        """
+        self.counters[name] = max(self.counters[name], value)
+
+    def __getitem__(self, name):
+        return self.counters[name]
+
+    def ratio(self, numerator, denominator):
+        """
+        return counter numerator divided by counter denominator, 0 when the denominator is 0
+        """
+        return self.counters[numerator] / self.counters[denominator] if self.counters[denominator] else 0.0
+
+    def operations(self):
+        """
+        return the no of operations of the engine's hot loop, the measured counterpart of its complexity bound
+        """
+        return sum(self.counters[name] for name in OPERATION_COUNTERS.get(self.engine, ()))
+
+    def summary(self):
+        """
+        return the counters and the ratios derived from them as a dict
+        """
+        summary = dict(self.counters, engine=self.engine, operations=self.operations(), **self.details)
+        if self.engine == 'ac':
+            summary['failure_hops_per_letter'] = self.ratio('failure_hops', 'letters')
+        elif self.engine == 'cw':
+            summary['average_shift'] = self.ratio('shift_total', 'windows')
+            summary['comparisons_per_window'] = self.ratio('comparisons', 'windows')
+            summary['average_depth'] = self.ratio('depth_total', 'windows')
+        elif self.engine == 'rk':
+            summary['false_positive_rate'] = self.ratio('false_positives', 'verifications')
+        elif self.engine == 'wm':
+            summary['average_shift'] = self.ratio('shift_total', 'windows')
+            summary['false_positive_rate'] = self.ratio('false_positives', 'verifications')
+        return summary
+
+    def __str__(self):
+        return ', '.join(f"{name}={value:.3f}" if isinstance(value, float) else f"{name}={value}"
+                         for name, value in self.summary().items())
@@ -0,0 +1,19 @@
+# no of characters read from a file object per chunk when streaming
+CHUNK_SIZE = 1 << 16
+
+
+def iter_chunks(source, chunk_size=CHUNK_SIZE):
+    """
+    yield chunks of text from a str, a file object opened in text mode or an iterable of str chunks
+    """
+    if isinstance(source, str):
+        yield source
+    elif hasattr(source, 'read'):
+        chunk = source.read(chunk_size)
+        while chunk:
+            yield chunk
+            chunk = source.read(chunk_size)
+    else:
+        for chunk in source:
+            if chunk:
+                yield chunk
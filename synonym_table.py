@@ -0,0 +1,171 @@
+import sys
+from array import array
+from functools import lru_cache
+from itertools import chain
+
+from automaton_store import KIND_SYNONYM_TABLE, encode_words, read_sections, write_sections
+from bytes_mode import map_file
+from corpus import nltk_corpus
+from synonyms import get_synonyms
+
+# default file the synonyms of the whole WordNet lemma set are written to
+DEFAULT_TABLE_PATH = 'synonyms.mpsa'
+
+# no of looked up terms whose synonyms are kept decoded in memory
+DEFAULT_CACHE_SIZE = 65536
+
+# suffix substitutions wordnet's morphy reduces a regular inflection with, by part of speech (noun, verb,
+# adjective, adverb), a substitution only gives a lemma that has its part of speech, bit i of a term's
+# part of speech mask is set when it is a lemma of the i-th part of speech
+MORPHY_SUBSTITUTIONS = {
+    'n': (('s', ''), ('ses', 's'), ('ves', 'f'), ('xes', 'x'), ('zes', 'z'), ('ches', 'ch'), ('shes', 'sh'),
+          ('men', 'man'), ('ies', 'y')),
+    'v': (('s', ''), ('ies', 'y'), ('es', 'e'), ('es', ''), ('ed', 'e'), ('ed', ''), ('ing', 'e'), ('ing', '')),
+    'a': (('er', ''), ('est', ''), ('er', 'e'), ('est', 'e')),
+    'r': (),
+}
+
+
+def base_forms(term, part_of_speech_mask):
+    """
+    return the lemmas the suffix rules of wordnet's morphy reduce a lower case term to,
+    part_of_speech_mask returns the part of speech mask of a term, 0 for a term that is no lemma
+    """
+    forms = []
+    for bit, substitutions in enumerate(MORPHY_SUBSTITUTIONS.values()):
+        for suffix, replacement in substitutions:
+            if term.endswith(suffix):
+                form = term[:len(term) - len(suffix)] + replacement
+                if form not in forms and part_of_speech_mask(form) & (1 << bit):
+                    forms.append(form)
+    return forms
+
+
+def save_synonym_table(table, path, parts_of_speech=None):
+    """
+    write a {term: synonyms} table to path, terms and synonyms share one string table sorted by their utf-8 bytes,
+    so a term can be binary searched in the memory-mapped file, parts_of_speech maps a term that is a lemma to
+    its part of speech mask, see MORPHY_SUBSTITUTIONS
+    """
+    parts_of_speech = parts_of_speech or {}
+    strings = sorted(set(table).union(chain.from_iterable(table.values())), key=lambda string: string.encode('utf-8'))
+    string_ids = {string: string_id for string_id, string in enumerate(strings)}
+
+    key_ids = array('q', sorted(string_ids[term] for term in table))
+    synonym_starts = array('q', [0])
+    synonym_ids = array('q')
+    for key_id in key_ids:
+        synonym_ids.extend(sorted({string_ids[synonym] for synonym in table[strings[key_id]]}))
+        synonym_starts.append(len(synonym_ids))
+
+    string_offsets, blob = encode_words(strings, False)
+    key_parts_of_speech = array('q', [parts_of_speech.get(strings[key_id], 0) for key_id in key_ids])
+    write_sections(path, KIND_SYNONYM_TABLE, 0,
+                   [key_ids, synonym_starts, synonym_ids, string_offsets, key_parts_of_speech], blob)
+
+
+def build_synonym_table(path=DEFAULT_TABLE_PATH, lemma_names=None):
+    """
+    precompute the synonyms of every WordNet lemma, or only of lemma_names, and of the irregular forms WordNet
+    reduces to them, and save them to path with the parts of speech of the lemmas, so that SynonymTable
+    reduces regular inflections like WordNet does without loading it
+    """
+    wordnet = nltk_corpus('wordnet')
+    if lemma_names is None:
+        lemma_names = wordnet.all_lemma_names()
+    lemmas = {lemma.lower() for lemma in lemma_names}
+    parts_of_speech = {}
+    for bit, part_of_speech in enumerate(MORPHY_SUBSTITUTIONS):
+        for lemma in wordnet.all_lemma_names(pos=part_of_speech):
+            if lemma.lower() in lemmas:
+                parts_of_speech[lemma.lower()] = parts_of_speech.get(lemma.lower(), 0) | (1 << bit)
+    # irregular forms such as geese follow no suffix rule, wordnet's exception lists reduce them
+    irregular_forms = {form for part_of_speech in MORPHY_SUBSTITUTIONS
+                       for form, bases in wordnet._exception_map[part_of_speech].items() if lemmas.intersection(bases)}
+    save_synonym_table({term: get_synonyms(term) for term in lemmas | irregular_forms}, path, parts_of_speech)
+
+
+class SynonymTable:
+    """
+    Memory-mapped synonym table written by save_synonym_table, fronted by an LRU of decoded lookups
+    """
+
+    def __init__(self, path=DEFAULT_TABLE_PATH, cache_size=DEFAULT_CACHE_SIZE, fallback=False):
+        """
+        map the table at path, a table of every lemma knows every term WordNet does once inflections are reduced,
+        terms missing from a table of some lemmas are looked up in WordNet when fallback is set
+        """
+        kind, _, tables, blob = read_sections(map_file(path))
+        if kind != KIND_SYNONYM_TABLE:
+            raise ValueError(f"{path} does not hold a synonym table")
+        if len(tables) != 5:
+            raise ValueError(f"{path} holds no parts of speech, rebuild it with python synonym_table.py {path}")
+        self.key_ids, self.synonym_starts, self.synonym_ids, self.string_offsets, self.key_parts_of_speech = tables
+        self.blob = blob
+        self.fallback = fallback
+        self.synonyms_of = lru_cache(maxsize=cache_size)(self.read_synonyms)
+
+    def encoded_string(self, string_id):
+        """
+        return the utf-8 bytes of a string of the string table
+        """
+        return bytes(self.blob[self.string_offsets[string_id]: self.string_offsets[string_id + 1]])
+
+    def find_term(self, term):
+        """
+        binary search the sorted terms and return the index of term, -1 if it is not in the table
+        """
+        encoded_term = term.encode('utf-8')
+        low = 0
+        high = len(self.key_ids)
+        while low < high:
+            middle = (low + high) // 2
+            if self.encoded_string(self.key_ids[middle]) < encoded_term:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self.key_ids) and self.encoded_string(self.key_ids[low]) == encoded_term:
+            return low
+        return -1
+
+    def part_of_speech_mask(self, term):
+        """
+        return the part of speech mask of a term, 0 when it is not a lemma of the table
+        """
+        index = self.find_term(term)
+        return 0 if index == -1 else self.key_parts_of_speech[index]
+
+    def read_synonyms(self, term):
+        """
+        return the synonyms of a term as a tuple, decoding them from the table,
+        a term missing from it is reduced to its lemmas like WordNet's morphy does
+        """
+        term = term.lower()
+        index = self.find_term(term)
+        if index != -1:
+            synonym_ids = self.synonym_ids[self.synonym_starts[index]: self.synonym_starts[index + 1]]
+        else:
+            indexes = [self.find_term(form) for form in base_forms(term, self.part_of_speech_mask)]
+            if not indexes and self.fallback:
+                # loads WordNet on the first miss only
+                return tuple(get_synonyms(term))
+            synonym_ids = sorted(set(chain.from_iterable(
+                self.synonym_ids[self.synonym_starts[index]: self.synonym_starts[index + 1]] for index in indexes)))
+        return tuple(self.encoded_string(synonym_id).decode('utf-8') for synonym_id in synonym_ids)
+
+    def expand_terms(self, search_terms):
+        """
+        batch lookup returning {term: synonyms} for every term in search_terms
+        """
+        return {search_term: self.synonyms_of(search_term) for search_term in dict.fromkeys(search_terms)}
+
+    def get_all_patterns(self, search_terms):
+        """
+        get synonyms for each term in search terms, same as synonyms.get_all_patterns
+        """
+        all_patterns = {search_term.lower() for search_term in search_terms}
+        return list(all_patterns.union(*self.expand_terms(search_terms).values()))
+
+
+if __name__ == "__main__":
+    build_synonym_table(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_TABLE_PATH)
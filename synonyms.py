@@ -1,34 +1,28 @@
 from itertools import chain
 
-import nltk
-from nltk.corpus import wordnet
-
+from corpus import nltk_corpus
 from trie import DictTrie
 
-try:
-    nltk.data.find('wordnet')
-except:
-    nltk.download('wordnet')
-
 
 def get_synonyms(word):
     """
     use wordnet to get synonyms for a particular word
     """
-    synonyms = wordnet.synsets(word)
+    synonyms = nltk_corpus('wordnet').synsets(word)
     normal_cased = set(chain.from_iterable([word.lemma_names() for word in synonyms]))
     # print(normal_cased)
     return [pattern.lower().replace('_', ' ') for pattern in normal_cased]
 
 
-def get_all_patterns(search_terms):
+def get_all_patterns(search_terms, synonym_table=None):
     """
-    get synonyms for each term in search terms
+    get synonyms for each term in search terms,
+    from a precomputed synonym_table.SynonymTable instead of WordNet when one is given
     """
-    all_patterns = set([search_term.lower() for search_term in search_terms])
-    for search_term in search_terms:
-        all_patterns = all_patterns.union(get_synonyms(search_term))
-    return list(all_patterns)
+    if synonym_table is not None:
+        return synonym_table.get_all_patterns(search_terms)
+    all_patterns = {search_term.lower() for search_term in search_terms}
+    return list(all_patterns.union(*map(get_synonyms, search_terms)))
 
 
 if __name__ == "__main__":
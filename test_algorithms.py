@@ -1,10 +1,35 @@
+import asyncio
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
 import unittest
 
-from aho_corasick import test_aho_corasick
-from commentz_walter import test_commentz_walter
-from rabin_karp import test_rabin_karp
+from aho_corasick import AhoCorasick, test_aho_corasick
+from automaton_cache import AutomatonCache, build_automaton, build_from_array_trie
+from automaton_store import load_automaton, save_automaton
+from benchmark import run_sweep, seeded_inputs
+from benchmark_history import compare, main as benchmark_history_main, record_samples
+from bytes_mode import encode_patterns, to_char_offsets
+from commentz_walter import CommentzWalter, test_commentz_walter
+from engine_selection import CANDIDATE_ENGINES, DEFAULT_COEFFICIENTS, DEFAULT_MODEL_PATH, AutoEngine, CostModel
+from match_server import MatchClient, MatchServer, _worker_automata, start_background_server
+from match_sinks import CountSink, ExistsSink, IdArraySink, pairs_to_matches
+from parallel import build_search, parallel_find_all_matches, search_many
+from prefilter import Prefilter
+from rabin_karp import string_matching_bytes, test_rabin_karp
+from search_stats import SearchStats
+from synonym_table import SynonymTable, save_synonym_table
 from test_data import expected_matches, patterns, search_str, trie_validation_data
-from trie import NodeTrie
+from trie import ArrayTrie, DictTrie, NodeTrie
+from wu_manber import test_wu_manber
+
+try:
+    from rabin_karp_numpy import string_matching_numpy
+except ImportError:
+    string_matching_numpy = None
 
 
 class TestAlgorithms(unittest.TestCase):
@@ -27,6 +52,53 @@ class TestAlgorithms(unittest.TestCase):
         actual_matches = test_aho_corasick(self.search_str, self.patterns)[1]
         self.assertListEqual(actual_matches, self.expected_matches)
 
+    def test_ahocorasick_compiled(self):
+        """
+        check if the compiled ahocorasick automaton returns the same matches as the node walk
+        """
+        actual_matches = test_aho_corasick(self.search_str, self.patterns, compiled=True)[1]
+        self.assertListEqual(actual_matches, self.expected_matches)
+        overlapping = ['he', 'she', 'his', 'hers']
+        self.assertListEqual(test_aho_corasick('ushers ahishers', overlapping, compiled=True)[1],
+                             test_aho_corasick('ushers ahishers', overlapping)[1])
+
+    def test_ahocorasick_incremental(self):
+        """
+        check if adding and removing patterns on a live automaton matches an automaton built from scratch
+        """
+        aho_corasick = AhoCorasick()
+        for pattern in ['he', 'hers', 'free']:
+            aho_corasick.add(pattern)
+        aho_corasick.create_failure_links()
+        aho_corasick.compile()
+        aho_corasick.add_pattern('she')
+        aho_corasick.add_pattern('his')
+        self.assertTrue(aho_corasick.remove_pattern('free'))
+        self.assertFalse(aho_corasick.remove_pattern('paid'))
+        overlapping = ['he', 'she', 'his', 'hers']
+        self.assertListEqual(list(aho_corasick.find_all_matches('ushers ahishers')),
+                             test_aho_corasick('ushers ahishers', overlapping)[1])
+        self.assertIsNotNone(aho_corasick.transitions)
+
+        for pattern in ['he', 'she', 'his']:
+            aho_corasick.remove_pattern(pattern)
+        self.assertTrue(aho_corasick.pending_rebuild)
+        self.assertListEqual(list(aho_corasick.find_all_matches('ushers')), [('hers', 2)])
+        self.assertFalse(aho_corasick.pending_rebuild)
+
+        # a loaded automaton has no trie nodes, it is rebuilt from its words on the first update
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ac')
+            save_automaton(build_automaton('ac', ['he', 'hers', 'free']), path)
+            loaded = load_automaton(path)
+            loaded.add_pattern('she')
+            loaded.add_pattern('his')
+            self.assertTrue(loaded.remove_pattern('free'))
+            self.assertEqual(len(loaded), 4)
+            self.assertListEqual(list(loaded.find_all_matches('ushers ahishers')),
+                                 test_aho_corasick('ushers ahishers', overlapping)[1])
+            del loaded
+
     def test_rabinkarp(self):
         """
         check if rabinkarp returns right matches in the search string
@@ -34,6 +106,36 @@ class TestAlgorithms(unittest.TestCase):
         actual_matches = test_rabin_karp(self.search_str, self.patterns)[1]
         self.assertListEqual(actual_matches, self.expected_matches)
 
+    @unittest.skipIf(string_matching_numpy is None, "numpy is not installed")
+    def test_rabinkarp_numpy(self):
+        """
+        check if the vectorized rabinkarp returns the same matches as the rolling hash
+        """
+        actual_matches = list(string_matching_numpy(self.search_str, self.patterns))
+        self.assertListEqual(actual_matches, self.expected_matches)
+        mixed_patterns = ['he', 'she', 'his', 'hers', 'ushers']
+        self.assertListEqual(list(string_matching_numpy('Ushers ahishers', mixed_patterns)),
+                             test_rabin_karp('Ushers ahishers', mixed_patterns)[1])
+
+    def test_rabinkarp_mixed_lengths(self):
+        """
+        check if rabinkarp finds patterns whose lengths fall in different hash buckets
+        """
+        actual_matches = test_rabin_karp('Ushers ahishers', ['he', 'she', 'his', 'hers', 'ushers'])[1]
+        self.assertListEqual(actual_matches, [('Ushers', 0), ('she', 1), ('he', 2), ('hers', 2),
+                                              ('his', 8), ('she', 10), ('he', 11), ('hers', 11)])
+
+    def test_wumanber(self):
+        """
+        check if wumanber returns right matches in the search string and the same matches as rabinkarp
+        when patterns of different lengths share blocks
+        """
+        actual_matches = test_wu_manber(self.search_str, self.patterns)[1]
+        self.assertListEqual(actual_matches, self.expected_matches)
+        mixed_patterns = ['he', 'she', 'his', 'hers', 'ushers']
+        self.assertListEqual(test_wu_manber('Ushers ahishers', mixed_patterns)[1],
+                             test_rabin_karp('Ushers ahishers', mixed_patterns)[1])
+
     def test_commentz_waltzer(self):
         """
         check if commentz waltzer returns right matches in the search string
@@ -41,6 +143,445 @@ class TestAlgorithms(unittest.TestCase):
         actual_matches = test_commentz_walter(self.search_str, self.patterns)[1]
         self.assertListEqual(actual_matches, self.expected_matches)
 
+    def test_find_iter(self):
+        """
+        check if streaming a file object in small chunks returns the same matches as a single search
+        """
+        aho_corasick = AhoCorasick()
+        commentz_walter = CommentzWalter()
+        for pattern in self.patterns:
+            aho_corasick.add(pattern)
+            commentz_walter.add_word(pattern)
+        aho_corasick.create_failure_links()
+        commentz_walter.create_failure_links()
+        for chunk_size in (1, 7, 64):
+            ac_matches = list(aho_corasick.find_iter(io.StringIO(self.search_str), chunk_size))
+            cw_matches = list(commentz_walter.find_iter(io.StringIO(self.search_str), chunk_size))
+            self.assertListEqual(ac_matches, self.expected_matches)
+            self.assertListEqual(cw_matches, self.expected_matches)
+
+    def test_bytes_mode(self):
+        """
+        check if searching the encoded search string returns the right matches once mapped back to characters
+        """
+        encoded_patterns = encode_patterns(self.patterns)
+        buffer = memoryview(self.search_str.encode('utf-8'))
+        aho_corasick = AhoCorasick()
+        commentz_walter = CommentzWalter()
+        for pattern in encoded_patterns:
+            aho_corasick.add(pattern)
+            commentz_walter.add_word(pattern)
+        aho_corasick.create_failure_links()
+        commentz_walter.create_failure_links()
+        for matches in (aho_corasick.find_all_matches_bytes(buffer),
+                        commentz_walter.find_all_matches_bytes(buffer),
+                        string_matching_bytes(buffer, encoded_patterns),
+                        build_automaton('wm', encoded_patterns).find_all_matches_bytes(buffer)):
+            self.assertListEqual(list(to_char_offsets(buffer, matches)), self.expected_matches)
+
+    def test_parallel(self):
+        """
+        check if a sharded search returns the same matches in the same order as the serial search
+        """
+        search_str = ' '.join([self.search_str] * 10)
+        for engine in ('ac', 'cw', 'rk', 'wm'):
+            serial_matches = list(build_search(engine, self.patterns)(search_str))
+            actual_matches = parallel_find_all_matches(search_str, self.patterns, engine, shards=7, workers=2)
+            self.assertListEqual(actual_matches, serial_matches)
+
+    def test_search_many(self):
+        """
+        check that batched searches of many documents on process and thread pools keep the input order
+        """
+        documents = [self.search_str[start: start + 40] for start in range(0, len(self.search_str), 7)]
+        search = build_search('ac', self.patterns)
+        expected = [list(search(document)) for document in documents]
+        self.assertEqual(list(search_many(iter(documents), self.patterns, workers=2, batch_size=3)), expected)
+        self.assertEqual(list(search_many(documents, self.patterns, 'cw', workers=2, batch_size=3, sink='count',
+                                          use_threads=True)), [len(matches) for matches in expected])
+        self.assertEqual(list(search_many(documents, self.patterns, 'rk', workers=1, sink='exists')),
+                         [bool(matches) for matches in expected])
+        # every document is counted into a sink of its own
+        self.assertEqual(list(search_many(documents, self.patterns, workers=1, sink=CountSink)),
+                         [len(matches) for matches in expected])
+        with self.assertRaises(TypeError):
+            list(search_many(documents, self.patterns, workers=1, sink=CountSink()))
+
+    def test_match_server(self):
+        """
+        check that pipelined searches of a served automaton return the matches of a local search
+        """
+        port, stop = start_background_server(workers=0)
+        try:
+            with MatchClient(port=port) as client:
+                self.assertNotIn('error', client.call('load', name='terms', engine='cw', patterns=self.patterns))
+                documents = [self.search_str[start: start + 40] for start in range(0, len(self.search_str), 7)]
+                responses = client.call_many([{'op': 'search', 'name': 'terms', 'text': document}
+                                              for document in documents])
+                search = build_search('cw', self.patterns)
+                for document, response in zip(documents, responses):
+                    self.assertEqual([tuple(match) for match in response['result']], list(search(document)))
+                    self.assertGreaterEqual(response['latency_ms'], 0)
+                self.assertEqual(client.call('stats')['result']['terms']['searches'], len(documents))
+                self.assertIn('error', client.call('search', name='missing', text=self.search_str))
+                # a reload replaces the automaton the worker mapped for the name
+                self.assertNotIn('error', client.call('load', name='terms', engine='ac', patterns=['free']))
+                self.assertEqual(client.call('search', name='terms', text="free")['result'], [['free', 0]])
+                self.assertEqual(list(_worker_automata), ['terms'])
+        finally:
+            stop()
+
+        server = MatchServer(workers=0)
+        asyncio.run(server.load('terms', 'ac', self.patterns))
+        server.close()
+        self.assertFalse(os.path.exists(server.directory))
+
+    def test_commentz_walter_shifts(self):
+        """
+        check that commentz walter shifts never skip a match when short and long patterns share suffixes
+        """
+        patterns = ['bcbbb', 'cbab', 'c', 'a', 'baa']
+        search_str = 'AbAbaabcAaaabAcAacAcAcbabcAcbabcccbAbAaabcbbaAccacaccAaaAcbcAbc'
+        by_position = lambda match: (match[1], match[0])
+        expected = sorted(test_aho_corasick(search_str, patterns)[1], key=by_position)
+        actual_matches = sorted(test_commentz_walter(search_str, patterns)[1], key=by_position)
+        self.assertListEqual(actual_matches, expected)
+
+    def test_save_load_automaton(self):
+        """
+        check if automata loaded from a saved file return the right matches without their trie
+        """
+        aho_corasick = AhoCorasick()
+        commentz_walter = CommentzWalter()
+        for pattern in self.patterns:
+            aho_corasick.add(pattern)
+            commentz_walter.add_word(pattern)
+        aho_corasick.create_failure_links()
+        aho_corasick.compile()
+        commentz_walter.create_failure_links()
+        with tempfile.TemporaryDirectory() as directory:
+            for name, automaton in (('ac', aho_corasick), ('cw', commentz_walter)):
+                path = os.path.join(directory, name)
+                save_automaton(automaton, path)
+                loaded = load_automaton(path)
+                self.assertIsInstance(loaded, type(automaton))
+                self.assertListEqual(list(loaded.find_all_matches(self.search_str)), self.expected_matches)
+                del loaded
+
+    def test_minimize(self):
+        """
+        check that minimized automata and tries share suffix states and still find the same matches and words
+        """
+        commentz_walter = CommentzWalter()
+        for pattern in self.patterns:
+            commentz_walter.add_word(pattern)
+        commentz_walter.create_failure_links()
+        expected = sorted(commentz_walter.find_all_matches(self.search_str))
+        before, after = commentz_walter.minimize()
+        self.assertLess(after, before)
+        self.assertListEqual(sorted(commentz_walter.find_all_matches(self.search_str)), expected)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cw')
+            save_automaton(commentz_walter, path)
+            loaded = load_automaton(path)
+            self.assertListEqual(sorted(loaded.find_all_matches(self.search_str)), expected)
+            del loaded
+
+        trie = DictTrie()
+        for word in ['walking', 'talking', 'walked', 'talked']:
+            trie.add(word)
+        before, after = trie.minimize()
+        self.assertLess(after, before)
+        self.assertEqual(trie.memory_usage()[0], after)
+        # adding a word copies the shared nodes on its path, the other words are left as they were
+        trie.add('walkings')
+        self.assertIn('walkings', trie)
+        self.assertNotIn('talkings', trie)
+        for word in ['walking', 'talking', 'walked', 'talked']:
+            self.assertIn(word, trie)
+        self.assertNotIn('walke', trie)
+
+    def test_automaton_cache(self):
+        """
+        check if the cache reuses automata for the same pattern set, evicts over budget and reloads from disk
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            cache = AutomatonCache(directory=directory)
+            for engine_test in (test_aho_corasick, test_commentz_walter, test_rabin_karp):
+                actual_matches = engine_test(self.search_str, self.patterns, cache=cache)[1]
+                self.assertListEqual(actual_matches, self.expected_matches)
+            self.assertIs(cache.get('ac', self.patterns + self.patterns[:1]), cache.get('ac', self.patterns))
+            # the key does not depend on the order or case of the patterns, so it is the same in every process
+            reordered = cache.get('ac', [pattern.upper() for pattern in reversed(self.patterns)])
+            self.assertIs(reordered.transitions, cache.get('ac', self.patterns).transitions)
+            self.assertEqual((cache.hits, cache.misses), (4, 3))
+
+            # putting a cached key again replaces its entry instead of counting its size twice
+            total_bytes = cache.total_bytes
+            key = next(reversed(cache.entries))
+            cache.put(key, cache.entries[key][0])
+            self.assertEqual(cache.total_bytes, total_bytes)
+
+            cache.max_bytes = cache.entries[next(reversed(cache.entries))][1]
+            cache.put('other', cache.get('rk', self.patterns))
+            self.assertLessEqual(cache.total_bytes, cache.max_bytes)
+
+            disk_cache = AutomatonCache(directory=directory)
+            self.assertListEqual(list(disk_cache.get('cw', self.patterns).find_all_matches(self.search_str)),
+                                 self.expected_matches)
+            self.assertEqual(len(os.listdir(directory)), 2)
+
+    def test_synonym_table(self):
+        """
+        check if the memory-mapped synonym table expands terms like the table it was saved from
+        """
+        table = {'free': ['gratis', 'free', 'liberal'], 'render': ['give', 'yield', 'render'], 'paid': []}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'synonyms.mpsa')
+            # free is an adjective and render a verb, see MORPHY_SUBSTITUTIONS
+            save_synonym_table(table, path, {'free': 0b100, 'render': 0b10})
+            synonym_table = SynonymTable(path)
+            self.assertEqual(synonym_table.synonyms_of('Free'), ('free', 'gratis', 'liberal'))
+            self.assertEqual(synonym_table.synonyms_of('advertisements'), ())
+            for inflection in ('renders', 'rendering', 'Rendered'):
+                self.assertEqual(synonym_table.synonyms_of(inflection), ('give', 'render', 'yield'))
+            self.assertEqual(synonym_table.synonyms_of('freest'), ('free', 'gratis', 'liberal'))
+            # free is no noun, so no rule reduces frees
+            self.assertEqual(synonym_table.synonyms_of('frees'), ())
+            self.assertEqual(synonym_table.expand_terms(['paid', 'render'])['render'], ('give', 'render', 'yield'))
+            self.assertEqual(sorted(synonym_table.get_all_patterns(self.patterns)),
+                             sorted({'render', 'open-source', 'free', 'paid', 'advertisements',
+                                     'gratis', 'liberal', 'give', 'yield'}))
+            del synonym_table
+
+    def test_lazy_imports(self):
+        """
+        check that importing the modules does not load nltk, matplotlib or numpy
+        """
+        script = ("import sys, main, corpus, synonyms, synonym_table\n"
+                  "print(sorted(m for m in sys.modules if m.split('.')[0] in ('nltk', 'matplotlib', 'numpy')))")
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(output.stdout.strip(), '[]')
+
+    def test_benchmark(self):
+        """
+        check that seeded inputs repeat and that a sweep reports every engine, size and phase
+        """
+        self.assertEqual(seeded_inputs(7, 50, 5), seeded_inputs(7, 50, 5))
+        report = run_sweep([50, 100], [5], repeat=2, warmup=1, seed=7)
+        self.assertEqual(len(report['runs']), 2 * 4)
+        for run in report['runs']:
+            for phase in ('build', 'search', 'emission'):
+                self.assertEqual(len(run[phase]['samples_ms']), 2)
+                self.assertLessEqual(run[phase]['min_ms'], run[phase]['median_ms'])
+                self.assertLessEqual(run[phase]['median_ms'], run[phase]['p99_ms'])
+        matches = {(run['engine'], run['words']): run['matches'] for run in report['runs']}
+        for n in (50, 100):
+            self.assertEqual(matches[('ac', n)], matches[('cw', n)])
+            self.assertEqual(matches[('ac', n)], matches[('rk', n)])
+            self.assertEqual(matches[('ac', n)], matches[('wm', n)])
+
+    def test_benchmark_history(self):
+        """
+        check that a significant slowdown between two recorded commits is flagged and fails the compare command
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'history.sqlite')
+            # a comparison without two recorded commits is reported as a usage error instead of a traceback
+            with contextlib.redirect_stderr(io.StringIO()) as error, self.assertRaises(SystemExit) as exit:
+                benchmark_history_main(['--history', path, 'compare'])
+            self.assertEqual(exit.exception.code, 2)
+            self.assertIn('two recorded commits', error.getvalue())
+            for engine, slowdown in (('ac', 1.0), ('cw', 1.5)):
+                record_samples(engine, 'random', 1000, 10, 'search', [10.0, 10.2, 9.9, 10.1, 10.0], 'base', path)
+                record_samples(engine, 'random', 1000, 10, 'search',
+                               [sample * slowdown for sample in (10.1, 9.8, 10.0, 10.2, 9.9)], 'head', path)
+            regressions = {comparison['engine']: comparison['regression']
+                           for comparison in compare('base', 'head', path)}
+            self.assertEqual(regressions, {'ac': False, 'cw': True})
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(benchmark_history_main(['--history', path, 'compare', 'base', 'head']), 1)
+                self.assertEqual(benchmark_history_main(['--history', path, 'compare', 'head', 'base']), 0)
+            with self.assertRaisesRegex(ValueError, 'no runs of commit missing'):
+                compare('missing', 'head', path)
+            with contextlib.redirect_stderr(io.StringIO()) as error, self.assertRaises(SystemExit) as exit:
+                benchmark_history_main(['--history', path, 'compare', 'missing', 'head'])
+            self.assertEqual(exit.exception.code, 2)
+            self.assertIn('no runs of commit missing', error.getvalue())
+
+    def test_search_stats(self):
+        """
+        check that counting operations leaves the matches unchanged and counts each engine's hot loop
+        """
+        for engine in ('ac', 'cw', 'rk', 'wm'):
+            automaton = build_automaton(engine, self.patterns)
+            stats = SearchStats()
+            self.assertEqual(list(automaton.find_all_matches(self.search_str, stats)),
+                             list(automaton.find_all_matches(self.search_str)))
+            summary = stats.summary()
+            self.assertEqual(summary['engine'], engine)
+            self.assertGreater(summary['operations'], 0)
+            if engine == 'ac':
+                self.assertEqual(stats['letters'], len(self.search_str))
+                self.assertEqual(stats['outputs'] + stats['dictionary_outputs'], len(self.expected_matches))
+            elif engine == 'cw':
+                self.assertGreaterEqual(summary['average_shift'], 1)
+                self.assertLessEqual(stats['max_depth'], max(len(pattern) for pattern in self.patterns))
+            else:
+                self.assertEqual(stats['verifications'] - stats['false_positives'], len(self.expected_matches))
+
+    def test_auto_engine(self):
+        """
+        check that the auto engine searches with the engine its cost model predicts to be the fastest,
+        records that choice in the stats and can calibrate a model on this host
+        """
+        model = CostModel({
+            'ac': {'build': [1.0, 0.01], 'search': [0.001, 0.0]},
+            'cw': {'build': [0.0, 0.0], 'search': [0.0, 0.0]},
+            'rk': {'build': [0.0, 0.0], 'search': [0.01, 0.0]},
+        })
+        auto_engine = AutoEngine(self.patterns, model)
+        self.assertEqual(auto_engine.words, list(self.patterns))
+        stats = SearchStats()
+        self.assertEqual(sorted(auto_engine.find_all_matches(self.search_str, stats)), sorted(self.expected_matches))
+        summary = stats.summary()
+        self.assertEqual((summary['auto_choice'], summary['engine']), ('cw', 'cw'))
+        self.assertEqual(summary['predicted_ms'], 0)
+
+        # once built, ac is only charged for its search and wins over rk on long texts
+        model.coefficients['cw']['build'] = [10 ** 6, 0.0]
+        self.assertEqual(auto_engine.choose(len(self.search_str))[0], 'cw')
+        auto_engine.automata.pop('cw')
+        auto_engine.automata['ac'] = build_automaton('ac', self.patterns)
+        self.assertEqual(auto_engine.choose(len(self.search_str))[0], 'ac')
+
+        calibrated = CostModel.calibrate(engines=('ac', 'rk'), words=[50, 200], pattern_counts=[3], min_lengths=[2])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cost_model.json')
+            calibrated.save(path)
+            self.assertEqual(CostModel.load(path).coefficients, calibrated.coefficients)
+        self.assertEqual(sorted(AutoEngine(self.patterns, calibrated).find_all_matches(self.search_str)),
+                         sorted(self.expected_matches))
+
+        # without a model calibrated on this host the shipped coefficients are used, nothing is calibrated or written
+        calibrated_before = os.path.exists(DEFAULT_MODEL_PATH)
+        auto_engine = AutoEngine(self.patterns)
+        self.assertEqual(os.path.exists(DEFAULT_MODEL_PATH), calibrated_before)
+        if not calibrated_before:
+            self.assertEqual(auto_engine.model.coefficients, {engine: DEFAULT_COEFFICIENTS[engine]
+                                                              for engine in CANDIDATE_ENGINES})
+
+    def test_prefilter(self):
+        """
+        check that the prefiltered automaton only reads the windows around rare anchors
+        and returns the matches of a search of the whole text, in the same order
+        """
+        search_str = (' lorem ipsum dolor sit amet' * 40).join([self.search_str] * 20)
+        buffer = search_str.encode('utf-8')
+        for engine in ('ac', 'cw', 'wm'):
+            automaton = build_automaton(engine, self.patterns)
+            stats = SearchStats()
+            self.assertEqual(list(Prefilter(automaton).find_all_matches(search_str, stats)),
+                             list(automaton.find_all_matches(search_str)))
+            self.assertLess(stats.summary()['prefilter_letters'], len(search_str) // 4)
+            bytes_automaton = build_automaton(engine, encode_patterns(self.patterns))
+            self.assertEqual(list(Prefilter(bytes_automaton).find_all_matches_bytes(memoryview(buffer))),
+                             list(bytes_automaton.find_all_matches_bytes(buffer)))
+        # an automaton that is not compiled yet and an auto engine before its first search give their patterns too
+        aho_corasick = AhoCorasick()
+        for pattern in self.patterns:
+            aho_corasick.add(pattern)
+        aho_corasick.create_failure_links()
+        auto_engine = AutoEngine(self.patterns, CostModel({'ac': {'build': [0.0, 0.0], 'search': [0.0, 0.0]}}))
+        for automaton in (aho_corasick, auto_engine):
+            self.assertEqual(list(Prefilter(automaton).find_all_matches(search_str)),
+                             list(automaton.find_all_matches(search_str)))
+        # frequent anchors fall back to searching the whole text
+        automaton = build_automaton('ac', ['e', 'a'])
+        stats = SearchStats()
+        self.assertEqual(len(Prefilter(automaton).find_all_matches(search_str, stats)),
+                         search_str.lower().count('e') + search_str.lower().count('a'))
+        self.assertIsNone(stats.summary()['prefilter_regions'])
+
+    def test_case_folding(self):
+        """
+        check that mixed case text is matched in place, reporting offsets of the original text
+        even after a letter whose lower case form is two letters long
+        """
+        text = "İ " + self.search_str.upper()
+        for engine in ('ac', 'cw', 'rk', 'wm'):
+            matches = build_automaton(engine, self.patterns).find_all_matches(text)
+            self.assertEqual(sorted((word.lower(), position - 2) for word, position in matches),
+                             sorted(self.expected_matches))
+            for word, position in matches:
+                self.assertEqual(text[position: position + len(word)].lower(), word.lower())
+
+        # mixed case patterns are folded like the text, compiled or not every engine finds them in any case
+        expected = [('free', 0), ('free', 5), ('free', 10)]
+        for engine in ('ac', 'cw', 'rk', 'wm'):
+            automaton = build_automaton(engine, ['Free'])
+            self.assertEqual(sorted((word.lower(), position) for word, position in
+                                    automaton.find_all_matches('Free free FREE')), expected)
+        # windows are folded letter by letter like the patterns, so a capital sigma never becomes a final sigma
+        for engine in ('ac', 'cw', 'rk', 'wm') + (('rk-numpy',) if string_matching_numpy is not None else ()):
+            matches = build_automaton(engine, ['ασ']).find_all_matches('ΑΣ')
+            self.assertEqual([position for word, position in matches], [0])
+        aho_corasick = AhoCorasick()
+        aho_corasick.add('Free')
+        aho_corasick.create_failure_links()
+        self.assertEqual(list(aho_corasick.find_all_matches('Free free FREE')), expected)
+        aho_corasick.compile()
+        self.assertEqual(list(aho_corasick.find_all_matches('Free free FREE')), expected)
+
+    def test_match_sinks(self):
+        """
+        check that the id array, count and exists sinks agree with the matches of each engine
+        """
+        for engine in ('ac', 'cw', 'rk', 'wm'):
+            automaton = build_automaton(engine, self.patterns)
+            pairs = automaton.search(self.search_str, IdArraySink())
+            self.assertEqual(sorted(pairs_to_matches(pairs, automaton.words)), sorted(self.expected_matches))
+            self.assertEqual(automaton.search(self.search_str, CountSink()), len(self.expected_matches))
+            self.assertTrue(automaton.search(self.search_str, ExistsSink()))
+            self.assertFalse(automaton.search("zzz qqq", ExistsSink()))
+
+    def test_match_semantics(self):
+        """
+        check whole word, leftmost-longest and leftmost-first matches of each engine
+        """
+        text = "Freedom is free, freedoms"
+        word_patterns = ["free", "freedom", "dom", "do"]
+        expected = {
+            ('overlapping', True): [('freedom', 0), ('free', 11)],
+            ('leftmost-longest', False): [('freedom', 0), ('free', 11), ('freedom', 17)],
+            ('leftmost-first', False): [('free', 0), ('dom', 4), ('free', 11), ('free', 17), ('dom', 21)],
+            ('leftmost-first', True): [('freedom', 0), ('free', 11)],
+        }
+        for engine in ('ac', 'cw', 'rk', 'wm'):
+            automaton = build_automaton(engine, word_patterns)
+            for (match_kind, whole_words), matches in expected.items():
+                found = automaton.find_matches(text, match_kind, whole_words)
+                self.assertEqual(sorted((word.lower(), position) for word, position in found), sorted(matches))
+            with self.assertRaises(ValueError):
+                automaton.find_matches(text, 'longest')
+
+        # the insertion order still decides leftmost-first matches once an automaton is saved, loaded or cached
+        with tempfile.TemporaryDirectory() as directory:
+            cache = AutomatonCache(directory=directory)
+            for engine in ('ac', 'cw'):
+                for patterns in (['abcd', 'ab'], ['ab', 'abcd']):
+                    path = os.path.join(directory, engine)
+                    save_automaton(build_automaton(engine, patterns), path)
+                    loaded = load_automaton(path)
+                    for automaton in (loaded, cache.get(engine, patterns)):
+                        self.assertEqual(list(automaton.find_matches('abcd', 'leftmost-first')), [(patterns[0], 0)])
+                    del loaded
+            cache.clear()
+            for engine in ('ac', 'cw'):
+                self.assertEqual(list(cache.get(engine, ['abcd', 'ab']).find_matches('abcd', 'leftmost-first')),
+                                 [('abcd', 0)])
+
     def test_trie(self):
         """
         check the validity of a trie node's construction
@@ -53,6 +594,36 @@ class TestAlgorithms(unittest.TestCase):
             print('testing', word)
             self.assertEqual(trie.has_word(word), is_valid)
 
+    def test_array_trie(self):
+        """
+        check that the array backed trie answers lookups like the node trie in fewer bytes per node
+        """
+        trie = NodeTrie()
+        array_trie = ArrayTrie()
+        for pattern in self.patterns:
+            trie.add(pattern)
+            array_trie.add(pattern)
+        for word, is_valid in trie_validation_data:
+            self.assertEqual(array_trie.has_word(word), is_valid)
+        self.assertIn('free', array_trie)
+        self.assertNotIn('fre', array_trie)
+        self.assertEqual(len(array_trie), len(self.patterns))
+        self.assertLess(array_trie.bytes_per_node(), trie.bytes_per_node())
+
+        # both automata compile the same tables from an array trie without creating trie nodes
+        text = "Free " + self.search_str
+        for engine in ('ac', 'cw'):
+            automaton = build_from_array_trie(engine, self.patterns + ['Free', 'fre'])
+            expected = build_automaton(engine, self.patterns + ['Free', 'fre'])
+            self.assertFalse(automaton.children)
+            self.assertListEqual(list(automaton.find_all_matches(text)), list(expected.find_all_matches(text)))
+            self.assertListEqual(list(automaton.find_matches(text, 'leftmost-first')),
+                                 list(expected.find_matches(text, 'leftmost-first')))
+            buffer = text.encode()
+            byte_patterns = encode_patterns(self.patterns)
+            self.assertListEqual(list(build_from_array_trie(engine, byte_patterns).find_all_matches_bytes(buffer)),
+                                 list(build_automaton(engine, byte_patterns).find_all_matches_bytes(buffer)))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,4 +1,19 @@
 import pprint
+import sys
+from array import array
+
+from case_fold import fold_word
+
+# bits reserved for a letter's code point in an ArrayTrie edge key
+LETTER_BITS = 21
+LETTER_MASK = (1 << LETTER_BITS) - 1
+
+
+def letter_code(letter):
+    """
+    return the code point of a letter of a str, or the byte itself for a letter of a bytes word
+    """
+    return letter if isinstance(letter, int) else ord(letter)
 
 
 class NodeTrie:
@@ -7,6 +22,12 @@ class NodeTrie:
     where each node stores a letter and also has a dictionary of its child nodes
     """
 
+    # slots keep every node free of a per-instance __dict__
+    __slots__ = ('letter', 'parent', 'word', 'children',
+                 'failure_link', 'dictionary_link',
+                 'size', 'depth', 'failure_link_cw', 'dictionary_link_cw',
+                 'min_diff_s1', 'min_diff_s2', 'min_depth', 'letter_lookup_table', 's1', 's2')
+
     def __init__(self, letter=None, parent=None, depth=0):
         """Constructor for a root trie node"""
         # variables needed for trie node
@@ -25,7 +46,10 @@ class NodeTrie:
         self.min_diff_s1 = -1
         self.min_diff_s2 = -1
         self.min_depth = None
-        self.letter_lookup_table = {}
+        self.s1 = None
+        self.s2 = None
+        # only the root keeps a letter table
+        self.letter_lookup_table = {} if parent is None else None
 
     def add(self, word):
         """
@@ -53,7 +77,7 @@ class NodeTrie:
         Check if a word exists in the trie by traversing through its children from the root
         """
         cur_trie_node = self
-        word = word.lower()
+        word = fold_word(word)
         for letter in word:
             if letter not in cur_trie_node.children:
                 return False
@@ -90,6 +114,27 @@ class NodeTrie:
         """
         return self.size
 
+    def memory_usage(self):
+        """
+        return (no of nodes, bytes used by the nodes and their child dictionaries) of the trie
+        """
+        node_count = 0
+        total_bytes = 0
+        nodes = [self]
+        while nodes:
+            trie_node = nodes.pop()
+            node_count += 1
+            total_bytes += sys.getsizeof(trie_node) + sys.getsizeof(trie_node.children)
+            nodes.extend(trie_node.children.values())
+        return node_count, total_bytes
+
+    def bytes_per_node(self):
+        """
+        return the average no of bytes used by a node of the trie
+        """
+        node_count, total_bytes = self.memory_usage()
+        return total_bytes / node_count
+
     def get_failure_link(self):
         """
         get longest suffix match of the current node
@@ -117,18 +162,59 @@ class DictTrie:
         Constructor for Trie with a dictionary as its root node
         """
         self.root = {'*': '*'}
+        # set once minimize has merged equivalent subtrees, nodes may then be shared by several parents
+        self.minimized = False
 
     def add(self, word):
         """
-        Add a word to the trie
+        Add a word to the trie, once minimized the nodes on its path are copied before they are changed
+        as they may be shared with other words
         """
         current_node = self.root
         for letter in word:
             if letter not in current_node:
                 current_node[letter] = {}
+            elif self.minimized:
+                current_node[letter] = dict(current_node[letter])
             current_node = current_node[letter]
         current_node['*'] = '*'
 
+    def minimize(self):
+        """
+        merge equivalent subtrees, those holding the same suffixes, so words sharing suffixes also share nodes
+        like a directed acyclic word graph, return (no of nodes before, no of nodes after)
+        """
+        node_count = self.memory_usage()[0]
+        # signature of a subtree -> the node kept for it, children are merged before their parents
+        register = {}
+
+        def merge(node):
+            for letter, child in node.items():
+                if letter != '*':
+                    node[letter] = merge(child)
+            signature = tuple(sorted((letter, child if letter == '*' else id(child)) for letter, child in node.items()))
+            return register.setdefault(signature, node)
+
+        self.root = merge(self.root)
+        self.minimized = True
+        return node_count, len(register)
+
+    def memory_usage(self):
+        """
+        return (no of nodes, bytes used by the node dictionaries) of the trie, a shared node is counted once
+        """
+        seen = {id(self.root)}
+        nodes = [self.root]
+        total_bytes = 0
+        while nodes:
+            node = nodes.pop()
+            total_bytes += sys.getsizeof(node)
+            for letter, child in node.items():
+                if letter != '*' and id(child) not in seen:
+                    seen.add(id(child))
+                    nodes.append(child)
+        return len(seen), total_bytes
+
     def __contains__(self, word):
         """
         check if a node exists in the trie
@@ -147,6 +233,116 @@ class DictTrie:
         return pprint.pformat(self.root, indent=1, compact=True)
 
 
+class ArrayTrie:
+    """
+    Compact trie implementation using parallel integer arrays,
+    where node i is described by the i-th entry of each array and all edges share one dictionary,
+    AhoCorasick and CommentzWalter can compile their tables from it instead of their trie nodes
+    """
+
+    def __init__(self):
+        """
+        Constructor for Trie with node 0 as its root
+        """
+        self.parents = array('l', [-1])
+        self.letters = array('l', [-1])
+        self.depths = array('l', [0])
+        # index into self.words for nodes that end a word, -1 otherwise
+        self.word_ids = array('l', [-1])
+        # edges are keyed by (node << LETTER_BITS | code point of letter)
+        self.edges = {}
+        self.words = []
+
+    def child(self, node, letter):
+        """
+        return the child of node for letter, -1 if it does not exist
+        """
+        return self.edges.get(node << LETTER_BITS | letter_code(letter), -1)
+
+    def add(self, word):
+        """
+        Add a str or bytes word to the trie
+        """
+        node = 0
+        for letter in word:
+            key = node << LETTER_BITS | letter_code(letter)
+            nxt_node = self.edges.get(key)
+            if nxt_node is None:
+                nxt_node = len(self.parents)
+                self.edges[key] = nxt_node
+                self.parents.append(node)
+                self.letters.append(letter_code(letter))
+                self.depths.append(self.depths[node] + 1)
+                self.word_ids.append(-1)
+            node = nxt_node
+
+        if self.word_ids[node] != -1:
+            return
+
+        self.word_ids[node] = len(self.words)
+        self.words.append(word)
+
+    def find_node(self, word):
+        """
+        return the node reached by traversing the letters of word from the root, -1 if it does not exist
+        """
+        node = 0
+        for letter in word:
+            node = self.edges.get(node << LETTER_BITS | letter_code(letter), -1)
+            if node == -1:
+                return -1
+        return node
+
+    def has_word(self, word):
+        """
+        Check if a word exists in the trie by traversing through its children from the root,
+        same as NodeTrie.has_word
+        """
+        return self.find_node(fold_word(word)) != -1
+
+    def __contains__(self, word):
+        """
+        check if a word was added to the trie, same as DictTrie
+        """
+        node = self.find_node(word)
+        return node != -1 and self.word_ids[node] != -1
+
+    def __len__(self):
+        """
+        return no of word|patterns in the trie
+        """
+        return len(self.words)
+
+    def __str__(self):
+        """
+        string representation of the words stored in the trie
+        """
+        return pprint.pformat(self.words, indent=1, compact=True)
+
+    def memory_usage(self):
+        """
+        return (no of nodes, bytes used by the node arrays and the edge dictionary) of the trie
+        """
+        node_count = len(self.parents)
+        total_bytes = sys.getsizeof(self.edges)
+        for node_array in (self.parents, self.letters, self.depths, self.word_ids):
+            total_bytes += node_array.itemsize * len(node_array)
+        return node_count, total_bytes
+
+    def bytes_per_node(self):
+        """
+        return the average no of bytes used by a node of the trie
+        """
+        node_count, total_bytes = self.memory_usage()
+        return total_bytes / node_count
+
+    def depth_order(self):
+        """
+        return the nodes sorted by depth, so every node comes after its parent and the nodes of its suffixes
+        """
+        return sorted(range(len(self.parents)), key=self.depths.__getitem__)
+
+
 def trie_test():
     """
     Simple checks if words belong to tries
@@ -181,6 +377,17 @@ def trie_test():
 
     print(node_trie)
 
+    print("Array Trie:Test")
+    array_trie = ArrayTrie()
+    for word in ["Hi", "Hit", "Hitler", "Yes", "Yes'nt"]:
+        array_trie.add(word)
+
+    print("Hi" in array_trie)
+    print("No" in array_trie)
+    print(array_trie.has_word("Hit"))
+
+    print(f"Bytes per node: NodeTrie {node_trie.bytes_per_node():0.1f}, ArrayTrie {array_trie.bytes_per_node():0.1f}")
+
 
 if __name__ == "__main__":
     trie_test()
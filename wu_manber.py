@@ -0,0 +1,315 @@
+import math
+import time
+from collections import deque
+
+from bytes_mode import ASCII_LOWER, as_byte_view
+from case_fold import CASE_FOLD, fold_word
+from match_semantics import check_match_kind, ends_word, match_ranks, starts_word
+from match_sinks import StopSearch
+
+# longest block the shift and hash tables are keyed by
+MAX_BLOCK_SIZE = 3
+
+
+class FoldedBlocks(dict):
+    """
+    block of a text -> its lower case form, filled the first time a block is read during a search
+    """
+
+    def __missing__(self, block):
+        folded = ''.join(map(CASE_FOLD.__getitem__, block))
+        self[block] = folded
+        return folded
+
+
+def block_size(patterns, min_length):
+    """
+    return the block size B = log_c(2 * M * min_length) for M patterns over an alphabet of c letters,
+    which keeps the blocks of the patterns a small part of every possible block
+    """
+    alphabet = max(len(set().union(*patterns)), 2)
+    size = math.ceil(math.log(2 * len(patterns) * min_length) / math.log(alphabet))
+    return max(1, min(size, MAX_BLOCK_SIZE, min_length))
+
+
+class WuManber:
+    """
+    class to implement the Wu-Manber Algorithm, a window of the length of the shortest pattern is moved
+    over the text and its last block of B letters decides how far the window can shift (SHIFT table),
+    a block with shift 0 ends the prefix of some patterns (HASH table), whose first B letters (PREFIX table)
+    are compared before a candidate is verified
+    """
+
+    def __init__(self):
+        self.patterns = []
+        self.pattern_ids = {}
+        # order the patterns were added in, decides between matches of leftmost-first searches
+        self.priorities = {}
+        self.min_length = 0
+        self.block_size = 0
+        # block -> shift of the window, shift_default for blocks in no pattern, None until create_index is called
+        self.shift = None
+        self.shift_default = 0
+        # block -> {prefix: [(length, {pattern: pattern id})]} of the patterns whose first min_length letters
+        # end with the block, grouped by length so a candidate window is verified with one lookup per length
+        self.hash = None
+
+    def add(self, pattern):
+        """
+        Add the lower case form of a str pattern,
+        or a bytes pattern from bytes_mode.encode_patterns when searching bytes
+        """
+        pattern = fold_word(pattern)
+        if not pattern or pattern in self.pattern_ids:
+            return
+        self.pattern_ids[pattern] = len(self.patterns)
+        self.priorities[pattern] = len(self.priorities)
+        self.patterns.append(pattern)
+        self.shift = None
+
+    def create_index(self):
+        """
+        build the SHIFT, HASH and PREFIX tables from the first min_length letters of every pattern
+        """
+        self.shift = {}
+        self.hash = {}
+        if not self.patterns:
+            return
+        self.min_length = min(len(pattern) for pattern in self.patterns)
+        self.block_size = block_size(self.patterns, self.min_length)
+        size = self.block_size
+        self.shift_default = self.min_length - size + 1
+        for pattern_id, pattern in enumerate(self.patterns):
+            for end in range(size, self.min_length + 1):
+                block = pattern[end - size: end]
+                self.shift[block] = min(self.shift.get(block, self.shift_default), self.min_length - end)
+            block = pattern[self.min_length - size: self.min_length]
+            lengths = self.hash.setdefault(block, {}).setdefault(pattern[:size], {})
+            lengths.setdefault(len(pattern), {})[pattern] = pattern_id
+        for prefixes in self.hash.values():
+            for prefix, lengths in prefixes.items():
+                prefixes[prefix] = sorted(lengths.items())
+
+    def block_folders(self, is_bytes):
+        """
+        return the functions folding a block and a candidate window of a str, or of a memoryview of bytes
+        when is_bytes is set
+        """
+        if is_bytes:
+            def fold(block):
+                return block.tobytes().translate(ASCII_LOWER)
+
+            return fold, fold
+        # forcing matches to be case insensitive, blocks are folded once per distinct block of the text
+        return FoldedBlocks().__getitem__, fold_word
+
+    def scan(self, letters, is_bytes=False):
+        """
+        yield the (position, pattern id) matches of a str, or of a memoryview of bytes when is_bytes is set,
+        ordered by the position they end at
+        """
+        if self.shift is None:
+            self.create_index()
+        if not self.patterns:
+            return
+        size = self.block_size
+        min_length = self.min_length
+        get_shift = self.shift.get
+        shift_default = self.shift_default
+        hash_table = self.hash
+        fold, fold_window = self.block_folders(is_bytes)
+
+        position = min_length - 1
+        while position < len(letters):
+            block = fold(letters[position - size + 1: position + 1])
+            shift = get_shift(block, shift_default)
+            if shift:
+                position += shift
+                continue
+            start = position - min_length + 1
+            candidates = hash_table[block].get(fold(letters[start: start + size]))
+            if candidates is not None:
+                for length, pattern_ids in candidates:
+                    if start + length > len(letters):
+                        break
+                    pattern_id = pattern_ids.get(fold_window(letters[start: start + length]))
+                    if pattern_id is not None:
+                        yield start, pattern_id
+            position += 1
+
+    def scan_with_stats(self, letters, is_bytes, stats):
+        """
+        Same as scan returning the matches in a list while counting the windows, hash hits, verifications
+        and false positives, and the sum of the shifts
+        """
+        if self.shift is None:
+            self.create_index()
+        found = []
+        if not self.patterns:
+            return found
+        size = self.block_size
+        min_length = self.min_length
+        get_shift = self.shift.get
+        shift_default = self.shift_default
+        hash_table = self.hash
+        fold, fold_window = self.block_folders(is_bytes)
+
+        windows = hash_hits = verifications = 0
+        position = min_length - 1
+        while position < len(letters):
+            block = fold(letters[position - size + 1: position + 1])
+            shift = get_shift(block, shift_default)
+            windows += 1
+            if shift:
+                position += shift
+                continue
+            hash_hits += 1
+            start = position - min_length + 1
+            candidates = hash_table[block].get(fold(letters[start: start + size]))
+            if candidates is not None:
+                for length, pattern_ids in candidates:
+                    if start + length > len(letters):
+                        break
+                    verifications += 1
+                    pattern_id = pattern_ids.get(fold_window(letters[start: start + length]))
+                    if pattern_id is not None:
+                        found.append((start, pattern_id))
+            position += 1
+
+        stats.add('wm', windows=windows, hash_hits=hash_hits, verifications=verifications,
+                  false_positives=verifications - len(found), shift_total=position - min_length + 1)
+        return found
+
+    def find_all_matches(self, text, stats=None):
+        """
+        finds and returns the (matched text, position) substring_matches ordered by position and pattern,
+        operations are counted into stats when a search_stats.SearchStats is given
+        """
+        patterns = self.patterns
+        found = sorted(self.scan(text) if stats is None else self.scan_with_stats(text, False, stats))
+        return deque((text[i: i + len(patterns[pattern_id])], i) for i, pattern_id in found)
+
+    def find_all_matches_bytes(self, buffer, stats=None):
+        """
+        finds and returns the (pattern, byte offset) matches in a bytes-like buffer such as an mmap,
+        the patterns must be encoded with bytes_mode.encode_patterns
+        """
+        patterns = self.patterns
+        letters = as_byte_view(buffer)
+        found = sorted(self.scan(letters, True) if stats is None else self.scan_with_stats(letters, True, stats))
+        return deque((patterns[pattern_id], i) for i, pattern_id in found)
+
+    @property
+    def words(self):
+        """
+        patterns indexed by the pattern ids handed to a sink
+        """
+        return self.patterns
+
+    def search(self, text, sink):
+        """
+        Hand every (pattern id, offset) match of the text to a match_sinks sink and return its result
+        """
+        return self.search_letters(text, False, sink)
+
+    def search_bytes(self, buffer, sink):
+        """
+        Same as search over a bytes-like buffer, reporting byte offsets
+        """
+        return self.search_letters(as_byte_view(buffer), True, sink)
+
+    def search_letters(self, letters, is_bytes, sink):
+        """
+        Run scan over a str or the bytes of a buffer handing each match to the sink without building a tuple per match
+        """
+        add = sink.add
+        try:
+            for position, pattern_id in self.scan(letters, is_bytes):
+                add(pattern_id, position)
+        except StopSearch:
+            pass
+        return sink.result()
+
+    def find_matches(self, text, match_kind='overlapping', whole_words=False):
+        """
+        finds and returns the (matched text, position) matches of a match_semantics match kind ordered by position,
+        only matches bounded by non word letters on both sides are considered when whole_words is set
+        """
+        check_match_kind(match_kind)
+        if self.shift is None:
+            self.create_index()
+        substring_matches = deque()
+        if not self.patterns:
+            return substring_matches
+        patterns = self.patterns
+        size = self.block_size
+        min_length = self.min_length
+        get_shift = self.shift.get
+        shift_default = self.shift_default
+        hash_table = self.hash
+        fold = FoldedBlocks().__getitem__
+        leftmost = match_kind != 'overlapping'
+        ranks = match_ranks(patterns, match_kind, self.priorities) if leftmost else None
+
+        position = min_length - 1
+        while position < len(text):
+            block = fold(text[position - size + 1: position + 1])
+            shift = get_shift(block, shift_default)
+            if shift:
+                position += shift
+                continue
+            # every candidate of a window starts at its first letter, so the leftmost match is known once it is verified
+            start = position - min_length + 1
+            candidates = None
+            if not whole_words or starts_word(text, start):
+                candidates = hash_table[block].get(fold(text[start: start + size]))
+            best_id = -1
+            if candidates is not None:
+                for length, pattern_ids in candidates:
+                    end = start + length
+                    if end > len(text):
+                        break
+                    if whole_words and not ends_word(text, end):
+                        continue
+                    pattern_id = pattern_ids.get(fold_word(text[start: end]))
+                    if pattern_id is None:
+                        continue
+                    if not leftmost:
+                        substring_matches.append((text[start: end], start))
+                    elif best_id == -1 or ranks[pattern_id] > ranks[best_id]:
+                        best_id = pattern_id
+            if best_id == -1:
+                position += 1
+                continue
+            end = start + len(patterns[best_id])
+            substring_matches.append((text[start: end], start))
+            # the next match starts at the end of this one at the earliest
+            position = end + min_length - 1
+        return substring_matches
+
+
+def string_matching(text, matcher):
+    """
+    finds and returns the substring_matches given a text document and list of patterns to match
+    """
+    wu_manber = WuManber()
+    for pat in matcher:
+        wu_manber.add(pat)
+    return wu_manber.find_all_matches(text)
+
+
+def test_wu_manber(search_str, patterns, cache=None):
+    """
+    runs wu manber on the search string, reusing the indexed patterns from cache when it is given
+    """
+    start_time = time.perf_counter()
+    if cache is not None:
+        match_tuples = cache.get('wm', patterns).find_all_matches(search_str)
+    else:
+        match_tuples = string_matching(search_str, patterns)
+    end_time = time.perf_counter()
+    print(f'\nSearch for multi-patterns in a string of length {len(search_str)}')
+    print(f"Matches: {len(match_tuples)} found in {end_time - start_time:0.8f} second(s)")
+    for match_tuple in match_tuples:
+        print(match_tuple)
+    return (end_time - start_time) * 10 ** 3, list(match_tuples)